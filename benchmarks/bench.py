@@ -0,0 +1,200 @@
+"""
+性能基准测试
+
+生成不同行数、不同版式的模拟成绩工作簿，分别计时各处理阶段以及完整的提取流程，
+记录耗时、峰值内存（RSS）和工作簿加载、保存次数，结果写入JSON文件，便于比较不同版本。
+
+用法：
+    python benchmarks/bench.py                         # 默认 1k、10k 行，所有版式
+    python benchmarks/bench.py --sizes 1000 10000 100000 500000 --variants title title_sub
+    python benchmarks/bench.py --output results.json --data-dir /tmp/gradebooks
+"""
+import argparse, concurrent.futures, contextlib, io, json, multiprocessing, os, platform, random, resource, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openpyxl
+from openpyxl.utils import get_column_letter
+import CommandLineExtractTool as tool
+import extract_pipeline as pipeline
+from extract_workbook import RowIndex, WorkbookSession, read_data_rows
+
+
+HEADERS = ["考号", "姓名", "学校", "班级", "物理", "化学", "生物", "数学", "语文", "英语", "总分"]
+SUBJECTS = HEADERS[4:10]
+SCHOOLS = [f"第{number}中学" for number in range(1, 31)]
+SHEET = "物理成绩"
+
+# 版式：标题是否存在、次表头是否存在、内容起始单元格
+VARIANTS = {
+    "title": (True, False, "A1"),
+    "title_sub": (True, True, "A1"),
+    "plain": (False, False, "A1"),
+    "plain_sub": (False, True, "A1"),
+    "b1": (True, False, "B1"),
+    "a2": (False, False, "A2"),
+}
+
+
+def generate_gradebook(path: str, rows: int, variant: str, seed: int = 2024) -> None:
+    """
+    生成模拟成绩工作簿，部分成绩以字符串数字保存
+
+    :param path: 保存路径
+    :param rows: 学生人数
+    :param variant: 版式，VARIANTS中的键
+    :param seed: 随机数种子
+    :return: 返回值为None
+    """
+    title_exist, sub_exist, start_cell = VARIANTS[variant]
+    offset = 1 if start_cell == "B1" else 0
+    rnd = random.Random(seed)
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(SHEET)
+    pad = [None] * offset
+
+    if start_cell == "A2":
+        ws.append([])
+    if title_exist:
+        ws.merged_cells.add(f"{get_column_letter(1 + offset)}1:{get_column_letter(len(HEADERS) + offset)}1")
+        ws.append(pad + ["期末考试成绩"])
+    ws.append(pad + HEADERS)
+    if sub_exist:
+        ws.append(pad + ["" if name not in SUBJECTS else "卷面" for name in HEADERS[:-1]] + ["合计"])
+
+    for number in range(rows):
+        scores = [rnd.randint(0, 100) for _ in SUBJECTS]
+        # 物理、化学两科以字符串数字保存，模拟从其他系统导出的成绩
+        written = [str(score) if index < 2 else score for index, score in enumerate(scores)]
+        ws.append(pad + [f"2024{number:07d}", f"学生{number}", rnd.choice(SCHOOLS), f"{rnd.randint(1, 20)}班"]
+                  + written + [sum(scores)])
+
+    wb.save(path)
+
+
+def _peak_rss_mb() -> float:
+    # Linux下ru_maxrss以KB为单位，macOS下以字节为单位
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _args(path: str, output: str, *extra: str) -> argparse.Namespace:
+    return tool.build_parser().parse_args(["物理", output, "期末成绩", "-d", os.path.dirname(path),
+                                           "-sc", "第1中学", "-cn", "E", "F", "差值", "-rn", "True",
+                                           "-ctac", "E", "F", "-mn", "E", "F", *extra])
+
+
+def run_stages(path: str, output: str) -> dict:
+    """
+    在单独的进程中依次计时各阶段，峰值内存为到该阶段结束时的进程峰值
+    """
+    args = _args(path, output)
+    stages = {}
+
+    def timed(name, func):
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        result = func()
+        stages[name] = {"wall": round(time.perf_counter() - start_wall, 4),
+                        "cpu": round(time.process_time() - start_cpu, 4),
+                        "peak_rss_mb": _peak_rss_mb()}
+        return result
+
+    with WorkbookSession(path, output + ".xlsx") as session:
+        timed("load", lambda: session.source)
+        sheet, layout = timed("layout", lambda: pipeline._parse_source(session, args, False))
+        data_rows = timed("read_rows", lambda: list(read_data_rows(session.source, sheet, layout)))
+        selected = timed("filter", lambda: RowIndex.build(data_rows, layout).select(args.school, args.classr))
+        rows = [data_rows[row] for row in sorted(selected)]
+        table = timed("table", lambda: pipeline.ScoreTable.from_rows(rows, list(layout.sub_title_dict.values()), layout.heading_three))
+        timed("post_process", lambda: pipeline.post_process(table, args))
+        session.output = timed("build_output", lambda: table.to_workbook(args.title, args.title, layout.title_exist, args.mark_color))
+        timed("save", session.save)
+
+        return {"stages": stages, "loads": session.load_count, "saves": session.save_count,
+                "layout": layout._asdict(), "selected_rows": len(rows)}
+
+
+def run_flow(path: str, output: str, *extra: str) -> dict:
+    """
+    在单独的进程中计时完整的run_extract流程
+    """
+    args = _args(path, output, *extra)
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    summary = pipeline.run_extract(path, output + ".xlsx", args, interactive=False)
+    return {"wall": round(time.perf_counter() - start_wall, 4), "cpu": round(time.process_time() - start_cpu, 4),
+            "peak_rss_mb": _peak_rss_mb(), "loads": summary["loads"], "saves": summary["saves"], "rows": summary["rows"]}
+
+
+def _quiet(func, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args)
+
+
+def _in_fresh_process(func, *args):
+    """
+    每项测试都在新进程中运行，峰值内存互不影响
+    """
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(_quiet, func, *args).result()
+
+
+def layout_matches(variant: str, layout: dict) -> bool:
+    """
+    检查版式判断是否与生成时的版式一致
+    """
+    title_exist, sub_exist, start_cell = VARIANTS[variant]
+    return (layout["start_cell"] == start_cell and layout["title_exist"] == title_exist
+            and layout["heading_three_exist"] == sub_exist
+            and list(layout["sub_title_dict"].values())[:len(HEADERS)] == HEADERS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CommandLineExtractTool性能基准测试")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000], help="学生人数，如 1000 10000 100000 500000")
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=list(VARIANTS), help="工作簿版式")
+    parser.add_argument("--data-dir", default=os.path.join("benchmarks", "data"), help="生成的工作簿存放目录，已存在的工作簿会被复用")
+    parser.add_argument("--output", default="bench_results.json", help="结果文件（JSON）")
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "openpyxl": openpyxl.__version__,
+        "numpy": pipeline.np.__version__ if pipeline.np is not None else None,
+        "cases": [],
+    }
+
+    for size in args.sizes:
+        for variant in args.variants:
+            case_dir = os.path.join(args.data_dir, f"{variant}_{size}")
+            os.makedirs(case_dir, exist_ok=True)
+            path = os.path.join(case_dir, "物理成绩.xlsx")
+            if not os.path.exists(path):
+                print(f"生成 {variant} {size}行 ...")
+                generate_gradebook(path, size, variant)
+
+            output = os.path.join(case_dir, "out")
+            case = {"variant": variant, "rows": size, "file_bytes": os.path.getsize(path)}
+            case.update(_in_fresh_process(run_stages, path, output))
+            case["layout_ok"] = layout_matches(variant, case.pop("layout"))
+            case["main"] = _in_fresh_process(run_flow, path, output)
+            case["main_stream"] = _in_fresh_process(run_flow, path, output, "--stream")
+            case["main_fast"] = _in_fresh_process(run_flow, path, output, "--fast-reader")
+            results["cases"].append(case)
+
+            print(f"{variant:>10} {size:>7}行  main {case['main']['wall']:>8.3f}s {case['main']['peak_rss_mb']:>7.1f}MB  "
+                  f"stream {case['main_stream']['wall']:>8.3f}s {case['main_stream']['peak_rss_mb']:>7.1f}MB  "
+                  f"fast {case['main_fast']['wall']:>8.3f}s {case['main_fast']['peak_rss_mb']:>7.1f}MB  "
+                  f"加载{case['main']['loads']}次 保存{case['main']['saves']}次  版式{'正确' if case['layout_ok'] else '有误'}")
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(results, file, ensure_ascii=False, indent=2)
+    print(f"结果已写入{args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+启动时间检查
+
+命令行前端在解析参数之前不应导入openpyxl、NumPy及提取流程。分别计时--help、缺少参数两种情况
+（各运行多次取最短时间，减去空的Python解释器启动时间），并检查是否导入了这些模块，超出预算时以非零状态退出。
+
+用法：
+    python benchmarks/startup.py                  # 默认预算50ms
+    python benchmarks/startup.py --budget 30 --repeat 20
+"""
+import argparse, os, subprocess, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOOL = os.path.join(ROOT, "CommandLineExtractTool.py")
+
+# 默认的启动时间预算（毫秒，不含解释器启动），tests/test_startup.py使用同一预算
+DEFAULT_BUDGET = 50
+
+# 前端不应导入的模块
+HEAVY_MODULES = ("openpyxl", "numpy", "extract_pipeline")
+
+CASES = {
+    "--help": ["--help"],
+    "缺少参数": ["物理"],
+}
+
+
+def best_time(command: list, repeat: int) -> float:
+    """
+    多次运行命令，返回最短的耗时（秒）
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=ROOT)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def imported_modules(argv: list) -> set:
+    """
+    用-X importtime运行命令，返回导入的顶层模块名
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", TOOL, *argv],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, cwd=ROOT)
+    modules = set()
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            modules.add(line.rsplit("|", 1)[1].strip().split(".")[0])
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CommandLineExtractTool启动时间检查")
+    parser.add_argument("--budget", default=DEFAULT_BUDGET, type=float, help="允许的启动时间（毫秒，不含解释器启动）")
+    parser.add_argument("--repeat", default=10, type=int, help="每种情况运行的次数")
+    args = parser.parse_args()
+
+    baseline = best_time([sys.executable, "-c", "pass"], args.repeat)
+    print(f"Python解释器启动 {baseline * 1000:.1f}ms")
+
+    failed = False
+    for name, argv in CASES.items():
+        elapsed = best_time([sys.executable, TOOL, *argv], args.repeat) - baseline
+        heavy = sorted(set(HEAVY_MODULES) & imported_modules(argv))
+        ok = elapsed * 1000 <= args.budget and not heavy
+        failed = failed or not ok
+        note = f"  导入了{'、'.join(heavy)}" if heavy else ""
+        print(f"{name:>8}  {elapsed * 1000:6.1f}ms  预算{args.budget:.0f}ms  {'通过' if ok else '超出'}{note}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+一次处理多个输出：批量处理目录中的工作簿（--batch）、按学校班级等分组输出（--split-by）、
+提取工作簿中的所有工作表（--all-sheets）。每个输出一个文件时在进程池中并行处理，
+-ss写入同一工作簿时在本进程中依次处理
+"""
+from __future__ import annotations
+import argparse, concurrent.futures, contextlib, glob, io, json, os, re, time
+from typing import Iterable
+from sheetml_reader import column_index as column_index_from_string
+from extract_formats import output_file
+from extract_profile import NULL_PROFILER, StageProfiler, make_profiler, report_profile
+from extract_workbook import RowIndex, SheetLayout, WorkbookSession, create_workbook, header_column, matching_sheets, safe_name
+from extract_pipeline import build_output, extract_rows, run_extract
+
+
+def partition_rows(rows: Iterable[list], layout: SheetLayout, names: list) -> dict:
+    """
+    一次遍历将学生成绩按指定表头列的值分组
+
+    :param rows: 学生成绩
+    :param layout: 源工作表版式信息
+    :param names: 分组依据的表头名称，如["学校"]、["学校", "班级"]
+    :return: 分组名到该组学生成绩列表的字典，保持原有顺序
+    """
+    start_col = column_index_from_string(re.match(r"^([A-Za-z]+)", layout.start_cell).group(1).upper())
+    positions = []
+    for name in names:
+        column = header_column(layout.sub_title_dict, RowIndex.SCHOOL if name in RowIndex.SCHOOL else (name,))
+        if not column:
+            raise ValueError(f"表头没有\"{name}\"")
+        positions.append(column - start_col)
+
+    groups = {}
+    for row in rows:
+        key = "_".join("未填写" if row[position] is None else str(row[position]).strip() for position in positions)
+        groups.setdefault(key, []).append(row)
+
+    return groups
+
+
+def _split_worker(new_workbook: str, layout: SheetLayout, rows: list, args: argparse.Namespace) -> dict:
+    """
+    在进程池中生成并保存一个分组的输出工作簿
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        wb, row_count = build_output(layout, rows, args)
+        wb.save(new_workbook)
+    return {"output": new_workbook, "rows": row_count}
+
+
+def run_split(input_workbook: str, args: argparse.Namespace) -> list:
+    """
+    分组输出：源工作簿只解析一次，按学校或班级分组后每组输出一个工作簿（或同一工作簿中的一个工作表）
+
+    每组一个工作簿时在进程池中并行生成并保存，结果放在以filename命名的目录下
+
+    :param input_workbook: 源工作簿路径
+    :param args: 命令行参数
+    :return: 每组输出的摘要
+    """
+    profiler = make_profiler(args)
+
+    with WorkbookSession(input_workbook, args.filename + ".xlsx", read_only=args.stream, profiler=profiler,
+                         fast_reader=args.fast_reader) as session:
+        input_sheet, layout, rows = extract_rows(session, args)
+        with profiler.stage("partition"):
+            groups = partition_rows(rows, layout, args.split_by)
+        print(f"按{'、'.join(args.split_by)}共分为{len(groups)}组")
+        summaries = write_parts(session, {key: (layout, group_rows) for key, group_rows in groups.items()}, args, profiler)
+
+    report_profile(profiler, args)
+    return summaries
+
+
+def write_parts(session: WorkbookSession, parts: dict, args: argparse.Namespace, profiler: StageProfiler = NULL_PROFILER,
+                key_name: str = "group") -> list:
+    """
+    写出分组或各工作表的学生成绩：-ss时写入同一工作簿，每部分一个工作表，只保存一次；
+    否则在进程池中每部分并行生成并保存一个文件，放在以filename命名的目录下
+
+    :param session: 工作簿会话，输出写入同一工作簿时由其保存
+    :param parts: 名称到（版式，学生成绩）的字典
+    :param args: 命令行参数
+    :param profiler: 各阶段的性能统计
+    :param key_name: 摘要中名称的键，如group、sheet
+    :return: 每部分输出的摘要
+    """
+    summaries = []
+    if args.split_sheets and args.output_format != "xlsx":
+        print(f"{args.output_format}格式没有工作表，改为每组输出一个文件")
+    elif args.split_sheets:
+        # 所有部分写入同一个工作簿，每部分一个工作表，只保存一次
+        wb = create_workbook(write_only=True)
+        for key, (layout, rows) in parts.items():
+            wb, row_count = build_output(layout, rows, args, sheet=safe_name(key, 31), wb=wb, profiler=profiler)
+            summaries.append({key_name: key, "output": session.output_path, "rows": row_count})
+        session.output = wb
+        with profiler.stage("save"):
+            session.save()
+        print(session.report())
+        return summaries
+
+    os.makedirs(args.filename, exist_ok=True)
+    workers = args.workers or os.cpu_count() or 1
+    with profiler.stage("write_groups"), concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_split_worker, os.path.join(args.filename, output_file(safe_name(key), args.output_format)), layout, rows, args): key
+                   for key, (layout, rows) in parts.items()}
+        for future in concurrent.futures.as_completed(futures):
+            summary = future.result()
+            summary[key_name] = futures[future]
+            summaries.append(summary)
+            profiler.add(saves=1, rows=summary["rows"], bytes_written=os.path.getsize(summary["output"]))
+    # 摘要按部分原有的顺序排列，与完成的先后无关
+    order = {key: position for position, key in enumerate(parts)}
+    summaries.sort(key=lambda summary: order[summary[key_name]])
+
+    print(f"源工作簿加载{session.load_count}次，共生成{len(summaries)}个文件，保存在{args.filename}目录下")
+    return summaries
+
+
+def _sheet_worker(input_workbook: str, sheet: str, new_workbook: str, args: argparse.Namespace) -> dict:
+    """
+    在进程池中完成一个工作表的提取、处理及保存，快速读取器只解析该工作表
+    """
+    sheet_args = argparse.Namespace(**vars(args))
+    sheet_args.sheet = sheet
+    summary = batch_worker(input_workbook, new_workbook, sheet_args)
+    summary["sheet"] = sheet
+    return summary
+
+
+def run_all_sheets(input_workbook: str, args: argparse.Namespace) -> list:
+    """
+    对工作簿中所有匹配的工作表分别确定版式并提取，每个工作表输出为一个文件，或（-ss）同一工作簿中的一个工作表
+
+    源工作簿只加载一次，依次读取各工作表的数据行：分别输出时再在进程池中并行处理及保存（见write_parts），
+    -ss时依次写入同一工作簿，全部在本进程中完成。使用--fast-reader并分别输出时，读取也并行：
+    每个工作表在进程池中单独解析和处理，用时接近最大的工作表。无法确定版式的工作表跳过
+
+    :param input_workbook: 源工作簿路径
+    :param args: 命令行参数
+    :return: 每个工作表输出的摘要
+    """
+    profiler = make_profiler(args)
+    start_time = time.perf_counter()
+
+    with WorkbookSession(input_workbook, output_file(args.filename, "xlsx"), read_only=args.stream, profiler=profiler,
+                         fast_reader=args.fast_reader) as session:
+        with profiler.stage("load"):
+            sheets = matching_sheets(session.source, args.subject)
+        print(f"共{len(sheets)}个工作表：{'、'.join(sheets)}")
+
+        if args.fast_reader and not args.split_sheets:
+            os.makedirs(args.filename, exist_ok=True)
+            workers = min(args.workers or os.cpu_count() or 1, len(sheets))
+            summaries = []
+            with profiler.stage("sheets"), concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(_sheet_worker, input_workbook, sheet,
+                                           os.path.join(args.filename, output_file(safe_name(sheet), args.output_format)), args)
+                           for sheet in sheets]
+                for future in concurrent.futures.as_completed(futures):
+                    summary = future.result()
+                    summaries.append(summary)
+                    if summary["status"] != "ok":
+                        print(f"处理工作表{summary['sheet']}失败：{summary['error']}")
+            summaries.sort(key=lambda summary: sheets.index(summary["sheet"]))
+            succeeded = sum(1 for summary in summaries if summary["status"] == "ok")
+            print(f"共生成{succeeded}个文件，保存在{args.filename}目录下，用时{time.perf_counter() - start_time:.3f}秒")
+            report_profile(profiler, args)
+            return summaries
+
+        parts = {}
+        for sheet in sheets:
+            sheet_args = argparse.Namespace(**vars(args))
+            sheet_args.sheet = sheet
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    _, layout, rows = extract_rows(session, sheet_args, interactive=False)
+                    parts[sheet] = (layout, list(rows))
+            except (ValueError, IndexError, KeyError, AttributeError) as e:
+                print(f"无法确定工作表{sheet}的版式，跳过：{e}")
+        summaries = write_parts(session, parts, args, profiler, key_name="sheet")
+
+    print(f"用时{time.perf_counter() - start_time:.3f}秒")
+    report_profile(profiler, args)
+    return summaries
+
+
+def find_batch_workbooks(pattern: str, subject: str) -> list:
+    """
+    批量模式下找出需要处理的工作簿
+
+    :param pattern: 目录或通配符（如 scores/*.xlsx）
+    :param subject: 目录模式下工作簿名称中需含有的科目名称
+    :return: 工作簿路径列表
+    """
+    if os.path.isdir(pattern):
+        paths = [os.path.join(pattern, name) for name in os.listdir(pattern)
+                 if name.endswith(".xlsx") and subject in name]
+    else:
+        paths = [path for path in glob.glob(pattern) if path.endswith(".xlsx")]
+
+    # 跳过Excel打开文件时留下的临时文件
+    return sorted(path for path in paths if not os.path.basename(path).startswith("~$"))
+
+
+def batch_worker(input_workbook: str, new_workbook: str, args: argparse.Namespace, row_cache: dict = None) -> dict:
+    """
+    处理一个工作簿（批量模式在进程池中，监视模式在本进程中），过程中的输出收集起来，失败时记录原因而不是中断整个批次
+    """
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            summary = run_extract(input_workbook, new_workbook, args, interactive=False, row_cache=row_cache)
+        summary["status"] = "ok"
+    except (Exception, SystemExit) as e:
+        summary = {"source": input_workbook, "output": new_workbook, "status": "failed",
+                   "error": str(e) or "".join(log.getvalue().strip().splitlines()[-1:])}
+    return summary
+
+
+def run_batch(args: argparse.Namespace) -> list:
+    """
+    批量模式：在进程池中对目录或通配符匹配到的所有工作簿执行完整的提取流程
+
+    每个工作簿的结果保存在以filename命名的目录下，同时写入summary.json；使用--sketch时每个工作簿保存一个摘要文件，
+    全部完成后合并保存为--sketch并写出“统计”表
+
+    :param args: 命令行参数
+    :return: 每个工作簿的处理摘要
+    """
+    from extract_sketch import merge_sketch_files, save_sketch_report, sketch_worker
+    workbooks = find_batch_workbooks(args.batch, args.subject)
+    if not workbooks:
+        print(f"没有找到{args.subject}类工作簿")
+        return []
+
+    output_dir = args.filename
+    os.makedirs(output_dir, exist_ok=True)
+    workers = args.workers or os.cpu_count() or 1
+    print(f"共{len(workbooks)}个工作簿，使用{workers}个进程处理")
+
+    start_time = time.perf_counter()
+    summaries = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for path in workbooks:
+            name = os.path.splitext(os.path.basename(path))[0]
+            if args.sketch:
+                futures[executor.submit(sketch_worker, path, os.path.join(output_dir, name + ".sketch.json"), args)] = path
+            else:
+                new_workbook = os.path.join(output_dir, output_file(name, args.output_format))
+                futures[executor.submit(batch_worker, path, new_workbook, args)] = path
+
+        for future in concurrent.futures.as_completed(futures):
+            summary = future.result()
+            summaries.append(summary)
+            if summary["status"] == "ok":
+                print(f"已完成{summary['source']}，{summary['rows']}行，用时{summary['seconds']}秒")
+            else:
+                print(f"处理{summary['source']}失败：{summary['error']}")
+
+    summaries.sort(key=lambda summary: summary["source"])
+    elapsed = round(time.perf_counter() - start_time, 3)
+    with open(os.path.join(output_dir, "summary.json"), "w", encoding="utf-8") as file:
+        json.dump({"workers": workers, "seconds": elapsed, "files": summaries}, file, ensure_ascii=False, indent=2)
+
+    succeeded = sum(1 for summary in summaries if summary["status"] == "ok")
+    print(f"批量处理完成：成功{succeeded}个，失败{len(summaries) - succeeded}个，共用时{elapsed}秒")
+
+    if args.sketch and succeeded:
+        sketches = merge_sketch_files([summary["output"] for summary in summaries if summary["status"] == "ok"])
+        sketches.save(args.sketch)
+        print(f"合并后的摘要已保存为{args.sketch}")
+        save_sketch_report(sketches, os.path.join(output_dir, output_file("统计", args.output_format)), args)
+
+    return summaries
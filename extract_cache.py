@@ -0,0 +1,316 @@
+"""
+解析结果的磁盘缓存
+
+同一个源工作簿往往会用不同的学校、班级及后续处理参数反复运行，每次都要用openpyxl完整解析一遍。
+这里把解析得到的版式信息和数据行按列保存到磁盘：纯数字列保存为.npy文件，读取时以内存映射方式打开；
+其余列保存为JSON（日期时间等JSON没有的类型带标记保存），读取缓存不会执行任何代码。
+读取时仍要还原为数据行，省去的是openpyxl解析XML及构建单元格对象的时间。缓存以文件路径、大小、修改时间及内容哈希为键，文件未改变时再次运行可以完全跳过openpyxl的解析。
+"""
+import contextlib, datetime, hashlib, json, os, shutil, tempfile, time
+from typing import Optional, Tuple
+from extract_options import DEFAULT_CACHE_DIR
+
+try:
+    import numpy as np
+except ImportError:
+    # 没有NumPy时所有列都保存为JSON
+    np = None
+
+
+CACHE_VERSION = 3
+DEFAULT_CACHE_SIZE = 512 * 1024 * 1024
+INDEX_FILE = "index.json"
+# int64/float64能精确表示的整数范围
+_EXACT_INT = 2 ** 53
+
+
+def content_hash(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    计算文件内容的SHA-256
+
+    :param path: 文件路径
+    :param chunk_size: 每次读取的字节数
+    :return: 十六进制哈希值
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# JSON中没有的单元格值类型，保存为{类型名: ISO格式字符串}
+_TAGGED_TYPES = {"datetime": datetime.datetime, "date": datetime.date, "time": datetime.time}
+
+
+def _encode_value(value):
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    for name, value_type in _TAGGED_TYPES.items():
+        if type(value) is value_type:
+            return {name: value.isoformat()}
+    if isinstance(value, datetime.timedelta):
+        return {"timedelta": value.total_seconds()}
+    raise TypeError(f"无法缓存{type(value).__name__}类型的值")
+
+
+def _decode_value(value):
+    if not isinstance(value, dict):
+        return value
+    (name, text), = value.items()
+    if name == "timedelta":
+        return datetime.timedelta(seconds=text)
+    return _TAGGED_TYPES[name].fromisoformat(text)
+
+
+def _column_kind(column: list) -> str:
+    """
+    判断一列能否以数字数组保存：全为整数（或空）为int，全为数字（或空）为float，其余为object
+    """
+    if np is None:
+        return "object"
+
+    kind = "int"
+    for value in column:
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return "object"
+        if isinstance(value, float):
+            kind = "float"
+        elif abs(value) >= _EXACT_INT:
+            return "object"
+    return kind
+
+
+class ParsedSheetCache:
+    """
+    解析结果的磁盘缓存，每个条目是缓存目录下的一个子目录：
+
+    meta.json  版式信息、工作表名称、每列的保存方式
+    N.npy      第N列为数字列时的值（int列另有N.mask.npy记录空单元格）
+    N.json     第N列为其他类型时的值
+
+    index.json记录源文件（路径、大小、修改时间）到内容哈希的对应，淘汰条目时一并删除不再需要的记录
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_SIZE):
+        """
+        :param directory: 缓存目录
+        :param max_bytes: 缓存总大小上限，超出时删除最久未使用的条目
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self._index_path(), encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self, index: dict) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(index, file, ensure_ascii=False)
+        os.replace(temp_path, self._index_path())
+
+    def fingerprint(self, path: str) -> str:
+        """
+        文件指纹：路径、大小、修改时间不变时沿用记录的内容哈希，否则重新计算
+
+        :param path: 源工作簿路径
+        :return: 文件内容的哈希值
+        """
+        stat = os.stat(path)
+        stat_key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        index = self._load_index()
+        if stat_key not in index:
+            index[stat_key] = content_hash(path)
+            self._save_index(index)
+        return index[stat_key]
+
+    def _entry_path(self, digest: str, sheet_key: str, mode: str) -> str:
+        suffix = hashlib.sha1(f"{sheet_key}|{mode}|{CACHE_VERSION}".encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.directory, f"{digest[:32]}_{suffix}")
+
+    def get(self, path: str, sheet_key: str, mode: str) -> Optional[Tuple[str, dict, list]]:
+        """
+        读取缓存
+
+        :param path: 源工作簿路径
+        :param sheet_key: 工作表的确定方式（指定的工作表名称或科目关键词）
+        :param mode: 解析方式（full或stream），两种方式的版式判断略有不同
+        :return: 工作表名称、版式信息字典、数据行列表；未命中时为None
+        """
+        entry = self._entry_path(self.fingerprint(path), sheet_key, mode)
+        try:
+            with open(os.path.join(entry, "meta.json"), encoding="utf-8") as file:
+                meta = json.load(file)
+
+            columns = []
+            for number, kind in enumerate(meta["kinds"]):
+                columns.append(self._read_column(entry, number, kind))
+        except (OSError, ValueError, KeyError, TypeError):
+            self.misses += 1
+            return None
+
+        # 更新使用时间，供淘汰时参考
+        os.utime(os.path.join(entry, "meta.json"))
+        self.hits += 1
+
+        rows = [list(row) for row in zip(*columns)] if columns else [[] for _ in range(meta["row_count"])]
+        return meta["sheet"], meta["layout"], rows
+
+    @staticmethod
+    def _read_column(entry: str, number: int, kind: str) -> list:
+        if kind == "object":
+            with open(os.path.join(entry, f"{number}.json"), encoding="utf-8") as file:
+                return [_decode_value(value) for value in json.load(file)]
+
+        if np is None:
+            raise ValueError("读取数字列需要NumPy")
+
+        # 内存映射只把用到的页读入内存，转为列表后不再引用映射的文件
+        values = np.load(os.path.join(entry, f"{number}.npy"), mmap_mode="r", allow_pickle=False)
+        if kind == "float":
+            return [None if value != value else value for value in values.tolist()]
+
+        mask = np.load(os.path.join(entry, f"{number}.mask.npy"), mmap_mode="r", allow_pickle=False)
+        return [None if empty else value for value, empty in zip(values.tolist(), mask.tolist())]
+
+    def put(self, path: str, sheet_key: str, mode: str, sheet: str, layout: dict, rows: list) -> None:
+        """
+        写入缓存，先写入临时目录再整体替换，写入后按大小上限淘汰旧条目；
+        含有无法保存的值时不写入
+
+        :param path: 源工作簿路径
+        :param sheet_key: 工作表的确定方式
+        :param mode: 解析方式
+        :param sheet: 工作表名称
+        :param layout: 版式信息字典
+        :param rows: 数据行列表
+        :return: 返回值为None
+        """
+        entry = self._entry_path(self.fingerprint(path), sheet_key, mode)
+        os.makedirs(self.directory, exist_ok=True)
+        temp_entry = tempfile.mkdtemp(dir=self.directory, suffix=".tmp")
+
+        width = len(layout["sub_title_dict"])
+        columns = [[row[number] if number < len(row) else None for row in rows] for number in range(width)]
+        kinds = []
+        for number, column in enumerate(columns):
+            kind = _column_kind(column)
+            kinds.append(kind)
+            if kind == "object":
+                try:
+                    values = [_encode_value(value) for value in column]
+                except TypeError as e:
+                    print(f"{e}，不写入缓存")
+                    shutil.rmtree(temp_entry, ignore_errors=True)
+                    return
+                with open(os.path.join(temp_entry, f"{number}.json"), "w", encoding="utf-8") as file:
+                    json.dump(values, file, ensure_ascii=False)
+            elif kind == "float":
+                np.save(os.path.join(temp_entry, f"{number}.npy"),
+                        np.array([np.nan if value is None else value for value in column], dtype=np.float64))
+            else:
+                np.save(os.path.join(temp_entry, f"{number}.npy"),
+                        np.array([0 if value is None else value for value in column], dtype=np.int64))
+                np.save(os.path.join(temp_entry, f"{number}.mask.npy"),
+                        np.array([value is None for value in column], dtype=bool))
+
+        meta = {"version": CACHE_VERSION, "source": os.path.abspath(path), "sheet": sheet,
+                "layout": layout, "kinds": kinds, "row_count": len(rows), "created": time.time()}
+        with open(os.path.join(temp_entry, "meta.json"), "w", encoding="utf-8") as file:
+            json.dump(meta, file, ensure_ascii=False, default=str)
+
+        shutil.rmtree(entry, ignore_errors=True)
+        try:
+            os.replace(temp_entry, entry)
+        except OSError:
+            # 其他进程已写入同一条目
+            shutil.rmtree(temp_entry, ignore_errors=True)
+
+        self.evict()
+
+    def _entries(self) -> list:
+        """
+        缓存条目列表，每项为（最近使用时间，占用字节数，目录）
+        """
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for name in os.listdir(self.directory):
+            entry = os.path.join(self.directory, name)
+            meta_path = os.path.join(entry, "meta.json")
+            if name.endswith(".tmp") or not os.path.isfile(meta_path):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry, file_name)) for file_name in os.listdir(entry))
+            entries.append((os.path.getmtime(meta_path), size, entry))
+        return entries
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> int:
+        """
+        缓存超出大小上限时，从最久未使用的条目开始删除；之后从index.json中删除源文件已改变或已删除的记录，
+        以及没有任何条目的内容哈希，index.json不会随源文件的修改无限增长
+
+        :return: 删除的条目数
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed += 1
+        self._prune_index({os.path.basename(entry).split("_")[0] for _, _, entry in entries[removed:]})
+        return removed
+
+    def _prune_index(self, digests: set) -> None:
+        """
+        :param digests: 仍有缓存条目的内容哈希（前32位）
+        """
+        index = self._load_index()
+        kept = {}
+        for stat_key, digest in index.items():
+            path = stat_key.rsplit("|", 2)[0]
+            if digest[:32] not in digests:
+                continue
+            try:
+                source = os.stat(path)
+            except OSError:
+                continue
+            if stat_key == f"{path}|{source.st_size}|{source.st_mtime_ns}":
+                kept[stat_key] = digest
+        if len(kept) != len(index):
+            self._save_index(kept)
+
+    def clear(self) -> int:
+        """
+        清空缓存：只删除含有meta.json的条目目录及index.json，目录中的其他文件保持不变，
+        目录为空时再删除目录本身，因此--cache-dir误指向其他目录时不会删除其中的文件
+
+        :return: 释放的字节数
+        """
+        freed = 0
+        for _, size, entry in self._entries():
+            shutil.rmtree(entry, ignore_errors=True)
+            freed += size
+        with contextlib.suppress(OSError):
+            freed += os.path.getsize(self._index_path())
+            os.remove(self._index_path())
+        with contextlib.suppress(OSError):
+            os.rmdir(self.directory)
+        return freed
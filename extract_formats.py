@@ -0,0 +1,282 @@
+"""
+非Excel的输出格式：CSV、JSON Lines及Parquet
+
+很多使用者把提取结果载入脚本或数据库，而不是在Excel中打开，生成.xlsx再转换是他们流程中最慢的一步。
+这里把筛选、转化后的学生成绩直接逐行写入文本或列式文件：表头（及次表头）合成为列名，
+对比、排序等新增列作为普通列写出，标题、平均值及最大值标记等不适合放在数据行里的内容作为元数据保存
+（CSV、JSON Lines写入同名的.meta.json文件，Parquet写入文件自身的schema元数据）。
+
+与openpyxl的只写模式一样，数据在生成输出时就写入临时文件，save只是把临时文件移动到目标路径，
+因此可以直接作为WorkbookSession的输出。
+"""
+import csv, datetime, itertools, json, os, shutil, tempfile
+from typing import Iterable
+from extract_options import OUTPUT_FORMATS
+from sheetml_reader import column_letter
+
+# pyarrow为可选依赖，输出parquet时才导入，没有安装时不能输出parquet
+pa = None
+pq = None
+
+
+METADATA_SUFFIX = ".meta.json"
+PARQUET_METADATA_KEY = b"CommandLineExtractTool"
+# Parquet每批写入的行数，列类型由第一批确定，之后的批次中有不符的值时放宽
+PARQUET_BATCH_ROWS = 65536
+# float64能精确表示的整数范围，超出的整数列写为string
+_EXACT_INT = 2 ** 53
+
+
+def _load_pyarrow() -> bool:
+    """
+    导入pyarrow，返回是否可用
+    """
+    global pa, pq
+    if pa is None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            return False
+        pa, pq = pyarrow, pyarrow.parquet
+    return True
+
+
+def check_format(output_format: str) -> None:
+    """
+    检查输出格式是否可用
+
+    :param output_format: 输出格式，OUTPUT_FORMATS之一
+    :return: 返回值为None，不可用时抛出ValueError
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"未知的输出格式{output_format}")
+    if output_format == "parquet" and not _load_pyarrow():
+        raise ValueError("输出parquet需要安装pyarrow（pip install pyarrow）")
+
+
+def output_file(filename: str, output_format: str) -> str:
+    """
+    按输出格式给文件名加上后缀
+    """
+    return f"{filename}.{output_format}"
+
+
+def column_names(headers: list, heading_three: list = None) -> list:
+    """
+    由表头及次表头合成列名
+
+    有次表头且与表头不同时列名为“表头_次表头”，如“物理_卷面”；表头为空时用次表头，
+    两者都为空时用输出工作表中的列字母，如“列K”；重复的列名依次加上_2、_3
+
+    :param headers: 表头列表
+    :param heading_three: 次表头列表，不存在时为空
+    :return: 列名列表
+    """
+    heading_three = heading_three or []
+    names = []
+    seen = {}
+    for index, header in enumerate(headers):
+        sub = heading_three[index] if index < len(heading_three) else None
+        header = "" if header is None else str(header).strip()
+        sub = "" if sub is None else str(sub).strip()
+
+        if header and sub and sub != header:
+            name = f"{header}_{sub}"
+        else:
+            name = header or sub or f"列{column_letter(index + 1)}"
+
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}_{seen[name]}"
+        else:
+            seen[name] = 1
+        names.append(name)
+    return names
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+class TabularExport:
+    """
+    以CSV、JSON Lines或Parquet格式写出的提取结果，接口与openpyxl的工作簿相同（save、close），
+    可以直接作为WorkbookSession的输出
+    """
+
+    def __init__(self, output_format: str, columns: list, rows: Iterable[list], metadata: dict = None):
+        """
+        :param output_format: 输出格式，csv、jsonl或parquet
+        :param columns: 列名列表
+        :param rows: 逐行产出数据的可迭代对象（可以是生成器），在此一次写入临时文件
+        :param metadata: 标题、平均值等元数据
+        """
+        check_format(output_format)
+        if output_format == "xlsx":
+            raise ValueError("xlsx格式由openpyxl写出")
+
+        self.output_format = output_format
+        self.columns = list(columns)
+        self.metadata = dict(metadata or {})
+        self.metadata["columns"] = self.columns
+        self.row_count = 0
+
+        fd, self._temp_path = tempfile.mkstemp(suffix="." + output_format)
+        os.close(fd)
+        writer = getattr(self, f"_write_{output_format}")
+        try:
+            writer(rows)
+        except BaseException:
+            self.close()
+            raise
+        self.metadata["rows"] = self.row_count
+
+    def _write_csv(self, rows: Iterable[list]) -> None:
+        width = len(self.columns)
+        with open(self._temp_path, "w", encoding="utf-8", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(self.columns)
+            for row in rows:
+                writer.writerow(row[:width])
+                self.row_count += 1
+
+    def _write_jsonl(self, rows: Iterable[list]) -> None:
+        columns = self.columns
+        encode = json.JSONEncoder(ensure_ascii=False, default=_json_default).encode
+        rows = iter(rows)
+        with open(self._temp_path, "w", encoding="utf-8") as file:
+            # 每次编码一批行再一起写入，减少逐行调用write的开销
+            while True:
+                lines = [encode(dict(zip(columns, row))) for row in itertools.islice(rows, 1024)]
+                if not lines:
+                    break
+                file.write("\n".join(lines))
+                file.write("\n")
+                self.row_count += len(lines)
+
+    def _write_parquet(self, rows: Iterable[list]) -> None:
+        width = len(self.columns)
+        writer = None
+        schema = None
+        batch = []
+
+        def flush():
+            nonlocal writer, schema
+            columns = [[row[index] if index < len(row) else None for row in batch] for index in range(width)]
+            types = [_arrow_type(values) for values in columns]
+            if schema is None:
+                schema = self._parquet_schema([arrow_type or pa.string() for arrow_type in types])
+                writer = pq.ParquetWriter(self._temp_path, schema)
+            else:
+                widened = [_widen_type(field.type, arrow_type) for field, arrow_type in zip(schema, types)]
+                if widened != schema.types:
+                    writer.close()
+                    writer = None
+                    changed = [name for name, old, new in zip(self.columns, schema.types, widened) if old != new]
+                    schema = self._parquet_schema(widened)
+                    writer = self._rewrite_parquet(schema)
+                    print(f"{'、'.join(changed)}列中有与前{self.row_count - len(batch)}行类型不符的值，已放宽该列的类型")
+            arrays = [self._arrow_array(values, field.type) for values, field in zip(columns, schema)]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            batch.clear()
+
+        try:
+            for row in rows:
+                batch.append(row)
+                self.row_count += 1
+                if len(batch) >= PARQUET_BATCH_ROWS:
+                    flush()
+            if batch or schema is None:
+                flush()
+        finally:
+            if writer is not None:
+                writer.close()
+
+    def _parquet_schema(self, types: list):
+        return pa.schema([pa.field(name, arrow_type) for name, arrow_type in zip(self.columns, types)],
+                         metadata={PARQUET_METADATA_KEY: json.dumps(self.metadata, ensure_ascii=False, default=_json_default)})
+
+    def _rewrite_parquet(self, schema):
+        """
+        列类型放宽后，已写入的行逐批按新的类型重写到新的临时文件，返回继续写入该文件的ParquetWriter
+        """
+        fd, temp_path = tempfile.mkstemp(suffix=".parquet")
+        os.close(fd)
+        writer = pq.ParquetWriter(temp_path, schema)
+        try:
+            for written in pq.ParquetFile(self._temp_path).iter_batches(batch_size=PARQUET_BATCH_ROWS):
+                arrays = [self._arrow_array(column.to_pylist(), field.type) for column, field in zip(written.columns, schema)]
+                writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        except BaseException:
+            writer.close()
+            os.remove(temp_path)
+            raise
+        os.remove(self._temp_path)
+        self._temp_path = temp_path
+        return writer
+
+    @staticmethod
+    def _arrow_array(values: list, arrow_type):
+        """
+        按列类型转化一列，字符串列中的其他值转为字符串
+        """
+        if pa.types.is_string(arrow_type):
+            values = [None if value is None else value if isinstance(value, str) else str(value) for value in values]
+        return pa.array(values, type=arrow_type)
+
+    def save(self, path: str) -> None:
+        """
+        将临时文件移动到目标路径，CSV及JSON Lines同时写出元数据文件
+        """
+        if self.output_format != "parquet":
+            with open(path + METADATA_SUFFIX, "w", encoding="utf-8") as file:
+                json.dump(self.metadata, file, ensure_ascii=False, indent=2, default=_json_default)
+        shutil.move(self._temp_path, path)
+        self._temp_path = None
+        # 临时文件只有所有者可读写，改为与普通新建文件相同的权限
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(path, 0o666 & ~umask)
+
+    def close(self) -> None:
+        if self._temp_path is not None and os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+        self._temp_path = None
+
+
+def _arrow_type(values: list):
+    """
+    由一批的值确定列类型：全为布尔型为bool，全为整数为int64，整数及浮点数为float64，
+    全为日期时间为timestamp，其余为string（整数超出float64能精确表示的范围时也为string）；全为空值时为None
+    """
+    kinds = {type(value) for value in values if value is not None}
+    if not kinds:
+        return None
+    if kinds - {bool, int, float, datetime.datetime}:
+        return pa.string()
+    if kinds == {bool}:
+        return pa.bool_()
+    if int in kinds and any(type(value) is int and not -_EXACT_INT < value < _EXACT_INT for value in values):
+        return pa.string()
+    if kinds == {int}:
+        return pa.int64()
+    if kinds <= {int, float}:
+        return pa.float64()
+    if kinds == {datetime.datetime}:
+        return pa.timestamp("us")
+    return pa.string()
+
+
+def _widen_type(current, arrow_type):
+    """
+    已写入的列类型与新一批的类型合并：相同或新一批全为空值时不变，int64与float64合并为float64，其余为string
+    """
+    if arrow_type is None or arrow_type == current:
+        return current
+    if {str(current), str(arrow_type)} == {"int64", "double"}:
+        return pa.float64()
+    return pa.string()
+
@@ -0,0 +1,150 @@
+"""
+高亮规则：列最大值、每列前k名、分数段及不及格
+
+原来的标记逐个读取单元格并为每个标记的单元格新建字体，标记越多文件越大、保存越慢。
+默认（static）由static_rows算出需要标记的行，与原来一样设置单元格字体，同一颜色的所有单元格共用StyleCache中的一个字体对象；
+使用--highlight-mode conditional时，每条规则写为Excel的条件格式，作用于整列的数据区域，由Excel在打开时计算，
+文件大小和保存时间与标记的单元格数无关，但不支持条件格式的软件不会显示标记。
+"""
+from typing import NamedTuple, Optional
+from extract_options import HIGHLIGHT_KINDS
+
+try:
+    import numpy as np
+except ImportError:
+    # 没有NumPy时逐个比较
+    np = None
+
+
+class HighlightRule(NamedTuple):
+    """
+    一条高亮规则
+
+    kind为HIGHLIGHT_KINDS之一；top的low为k；band的low、high为分数段的上下限（含）；
+    below_pass的high为及格线，解析时为空，由满分及及格比例确定；color为空时使用-mr的颜色
+    """
+    kind: str
+    column: str
+    low: Optional[float] = None
+    high: Optional[float] = None
+    color: Optional[str] = None
+
+
+def parse_highlights(items: list) -> list:
+    """
+    解析命令行中的高亮规则，如 ["max:E", "top:总分:10", "band:物理:60-80@00B050", "below_pass:E"]
+
+    :param items: “类型:列[:参数][@颜色]”的列表
+    :return: 高亮规则列表，格式错误时抛出ValueError
+    """
+    rules = []
+    for item in items or []:
+        text, _, color = item.partition("@")
+        kind, _, rest = text.partition(":")
+        column, _, value = rest.partition(":")
+        if kind not in HIGHLIGHT_KINDS or not column:
+            raise ValueError(f"无法解析高亮规则{item}，请使用“类型:列[:参数][@颜色]”，类型为{'、'.join(HIGHLIGHT_KINDS)}")
+        if color and not _is_color(color):
+            raise ValueError(f"高亮规则{item}中的颜色应为6位十六进制数，如FF0000")
+
+        low = high = None
+        try:
+            if kind == "top":
+                low = int(value)
+                if low < 1:
+                    raise ValueError
+            elif kind == "band":
+                first, _, second = value.partition("-")
+                low, high = sorted((float(first), float(second)))
+            elif value:
+                raise ValueError
+        except ValueError:
+            raise ValueError(f"无法解析高亮规则{item}：top需要正整数，如top:E:10；band需要分数段，如band:E:60-80")
+        rules.append(HighlightRule(kind, column, low, high, color.upper() or None))
+    return rules
+
+
+def _is_color(text: str) -> bool:
+    return len(text) == 6 and all(char in "0123456789abcdefABCDEF" for char in text)
+
+
+def _number_text(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class StyleCache:
+    """
+    按颜色缓存的字体及条件格式样式，同一颜色只创建一个对象（openpyxl在第一次使用时导入）
+    """
+
+    def __init__(self):
+        self._fonts = {}
+        self._differential = {}
+
+    def font(self, color: str):
+        if color not in self._fonts:
+            from openpyxl.styles import Font
+            self._fonts[color] = Font(color=color, bold=True)
+        return self._fonts[color]
+
+    def differential(self, color: str):
+        if color not in self._differential:
+            from openpyxl.styles.differential import DifferentialStyle
+            self._differential[color] = DifferentialStyle(font=self.font(color))
+        return self._differential[color]
+
+
+def conditional_rule(rule: HighlightRule, color: str, styles: StyleCache):
+    """
+    将高亮规则转化为条件格式规则
+
+    :param rule: 高亮规则，below_pass的及格线已确定
+    :param color: 规则没有指定颜色时使用的颜色
+    :param styles: 样式缓存
+    :return: openpyxl的条件格式规则
+    """
+    from openpyxl.formatting.rule import Rule
+
+    dxf = styles.differential(rule.color or color)
+    if rule.kind == "max":
+        # 前1名即与最大值相等的所有单元格
+        return Rule(type="top10", rank=1, dxf=dxf)
+    if rule.kind == "top":
+        return Rule(type="top10", rank=int(rule.low), dxf=dxf)
+    if rule.kind == "band":
+        return Rule(type="cellIs", operator="between", formula=[_number_text(rule.low), _number_text(rule.high)], dxf=dxf)
+    return Rule(type="cellIs", operator="lessThan", formula=[_number_text(rule.high)], dxf=dxf)
+
+
+def static_rows(rule: HighlightRule, view) -> set:
+    """
+    按规则找出一列中需要标记的行
+
+    :param rule: 高亮规则，below_pass的及格线已确定
+    :param view: 该列的数值视图，非数字为NaN（无NumPy时为None）
+    :return: 行号集合
+    """
+    if np is not None:
+        valid = view[~np.isnan(view)]
+        if not valid.size:
+            return set()
+        if rule.kind in ("max", "top"):
+            k = 1 if rule.kind == "max" else min(int(rule.low), valid.size)
+            # 第k大的值为门槛，与之并列的一并标记
+            threshold = np.partition(valid, valid.size - k)[valid.size - k]
+            selected = view >= threshold
+        elif rule.kind == "band":
+            selected = (view >= rule.low) & (view <= rule.high)
+        else:
+            selected = view < rule.high
+        return set(np.flatnonzero(selected).tolist())
+
+    valid = sorted((value for value in view if value is not None), reverse=True)
+    if not valid:
+        return set()
+    if rule.kind in ("max", "top"):
+        threshold = valid[min(1 if rule.kind == "max" else int(rule.low), len(valid)) - 1]
+        return {row for row, value in enumerate(view) if value is not None and value >= threshold}
+    if rule.kind == "band":
+        return {row for row, value in enumerate(view) if value is not None and rule.low <= value <= rule.high}
+    return {row for row, value in enumerate(view) if value is not None and value < rule.high}
@@ -0,0 +1,402 @@
+"""
+跨工作簿的哈希连接
+
+每次考试是一个单独的工作簿，比较同一学生在不同考试中的成绩需要按学生匹配行，而不是按行号。
+本次考试已读入列式成绩表，另一次考试的工作簿以只读模式逐行读取，只取连接键（如姓名、学校、班级，或考号）及需要比较的科目成绩。
+哈希表建在较小的一侧：
+    另一次考试较小时（由其工作表的行数可知），收集其连接键及成绩（紧凑的浮点数组），本次的行逐行查找，见ExamScores、join_collected；
+    否则在本次的连接键上建立哈希表，另一次考试的行边读边查找，只保留匹配到的成绩及未匹配的连接键，见join_streamed，
+    另一次考试的内存占用与其行数无关。
+另一次考试中的名次由各分数出现的次数得到（RankCounter），同样不需要保留整列成绩。
+连接键在任一侧重复的学生无法确定对应关系，不参与匹配，与未匹配的学生一起报告。
+"""
+from __future__ import annotations
+
+import argparse, os
+from array import array
+from typing import TYPE_CHECKING, Iterable, NamedTuple, Optional
+
+from extract_profile import NULL_PROFILER, StageProfiler
+
+if TYPE_CHECKING:
+    from extract_pipeline import ScoreTable
+
+NAN = float("nan")
+
+
+def normalize_key(values: Iterable) -> Optional[tuple]:
+    """
+    连接键的规范形式：去掉首尾空白的字符串，整数值的浮点数写为整数，使数字和文本保存的考号相同
+
+    :param values: 一行中各连接字段的值
+    :return: 连接键，各字段都为空时返回None
+    """
+    parts = []
+    for value in values:
+        if value is None:
+            parts.append("")
+        elif isinstance(value, float) and value.is_integer():
+            parts.append(str(int(value)))
+        else:
+            parts.append(str(value).strip())
+    return tuple(parts) if any(parts) else None
+
+
+def _score(value) -> float:
+    """
+    成绩转化为浮点数，字符串数字同样转化，不是数字的（如“缺考”）记为NaN
+    """
+    if isinstance(value, bool) or value is None:
+        return NAN
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).strip())
+    except ValueError:
+        return NAN
+
+
+class ExamScores:
+    """
+    一次考试中参与连接的列：每行的连接键及各科成绩
+    """
+
+    def __init__(self, label: str, subjects: list):
+        """
+        :param label: 考试名称（工作簿文件名），用于新列的列名及报告
+        :param subjects: 科目列表
+        """
+        self.label = label
+        self.subjects = list(subjects)
+        self.keys = []
+        self._scores = {subject: array("d") for subject in self.subjects}
+
+    @classmethod
+    def collect(cls, label: str, rows: Iterable[list], key_positions: list, subject_positions: dict) -> "ExamScores":
+        """
+        逐行读取，只保留连接键及科目成绩
+
+        :param label: 考试名称
+        :param rows: 逐行产出的学生成绩（可以是生成器）
+        :param key_positions: 连接字段在行中的位置
+        :param subject_positions: 科目名到在行中位置的字典
+        :return: 收集到的连接键及成绩
+        """
+        exam = cls(label, list(subject_positions))
+        targets = [(exam._scores[subject], position) for subject, position in subject_positions.items()]
+        for row in rows:
+            exam.keys.append(normalize_key(row[position] if position < len(row) else None for position in key_positions))
+            for scores, position in targets:
+                scores.append(_score(row[position] if position < len(row) else None))
+        return exam
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+class JoinResult(NamedTuple):
+    """
+    positions为左侧每行匹配到的右侧行号（没有匹配为-1）；
+    unmatched_left、unmatched_right为有连接键但没有匹配的行号；duplicates为重复而不参与匹配的连接键
+    """
+    positions: list
+    unmatched_left: list
+    unmatched_right: list
+    duplicates: list
+
+
+def _build_index(keys: list) -> tuple:
+    index = {}
+    duplicates = set()
+    for position, key in enumerate(keys):
+        if key is None:
+            continue
+        if key in index:
+            duplicates.add(key)
+        else:
+            index[key] = position
+    for key in duplicates:
+        del index[key]
+    return index, duplicates
+
+
+def hash_join(left_keys: list, right_keys: list) -> JoinResult:
+    """
+    按连接键匹配两侧的行，在较小的一侧建立哈希表，较大的一侧逐行查找
+
+    :param left_keys: 左侧（本次考试）每行的连接键
+    :param right_keys: 右侧（另一次考试）每行的连接键
+    :return: 匹配结果
+    """
+    swap = len(left_keys) <= len(right_keys)
+    small, large = (left_keys, right_keys) if swap else (right_keys, left_keys)
+    index, duplicates = _build_index(small)
+
+    # 较小一侧的行号到较大一侧的行号
+    matched = {}
+    for position, key in enumerate(large):
+        hit = index.get(key)
+        if hit is None:
+            continue
+        if hit in matched:
+            duplicates.add(key)
+        else:
+            matched[hit] = position
+    for key in duplicates:
+        hit = index.get(key)
+        if hit is not None:
+            matched.pop(hit, None)
+
+    positions = [-1] * len(left_keys)
+    if swap:
+        for left, right in matched.items():
+            positions[left] = right
+        matched_right = set(matched.values())
+    else:
+        for right, left in matched.items():
+            positions[left] = right
+        matched_right = set(matched)
+
+    unmatched_left = [row for row, key in enumerate(left_keys) if positions[row] < 0 and key is not None]
+    unmatched_right = [row for row, key in enumerate(right_keys) if row not in matched_right and key is not None]
+    return JoinResult(positions, unmatched_left, unmatched_right, sorted(duplicates))
+
+
+class RankCounter:
+    """
+    一科成绩中各分数出现的次数，读完所有行后由此得到任一分数在全部学生中的名次，
+    占用的内存与不同分数的个数有关，与行数无关
+    """
+
+    def __init__(self):
+        self.counts = {}
+
+    def add(self, score: float) -> None:
+        if score == score:
+            self.counts[score] = self.counts.get(score, 0) + 1
+
+    def ranks(self, method: str) -> dict:
+        """
+        分数到名次的字典，与_rank_numpy在全部学生中的排名相同
+
+        :param method: competition（并列占用名次）或dense
+        """
+        ranks = {}
+        higher = 0
+        for distinct, score in enumerate(sorted(self.counts, reverse=True)):
+            ranks[score] = higher + 1 if method == "competition" else distinct + 1
+            higher += self.counts[score]
+        return ranks
+
+
+class ExamJoin(NamedTuple):
+    """
+    与另一次考试的连接结果：scores、ranks为每科按本次各行对齐的该次成绩及名次（未匹配或缺考为NaN），
+    matched为匹配的人数，unmatched_left为本次有连接键但未匹配的行号，unmatched_right为该次考试中未匹配的连接键，
+    duplicates为重复而不参与匹配的连接键，rows为该次考试读取的行数
+    """
+    label: str
+    subjects: list
+    scores: dict
+    ranks: dict
+    matched: int
+    unmatched_left: list
+    unmatched_right: list
+    duplicates: list
+    rows: int
+
+
+def _aligned(row_count: int, matched: dict, counters: list, method: str) -> tuple:
+    """
+    由本次行号到该次各科成绩的字典，得到每科按本次各行对齐的成绩及名次
+    """
+    scores, ranks = [], []
+    for number, counter in enumerate(counters):
+        lookup = counter.ranks(method)
+        aligned_score = array("d", [NAN]) * row_count
+        aligned_rank = array("d", [NAN]) * row_count
+        for row, values in matched.items():
+            score = values[number]
+            if score == score:
+                aligned_score[row] = score
+                aligned_rank[row] = lookup[score]
+        scores.append(aligned_score)
+        ranks.append(aligned_rank)
+    return scores, ranks
+
+
+def join_collected(left_keys: list, exam: ExamScores, method: str = "competition") -> ExamJoin:
+    """
+    另一次考试较小时：收集好的连接键及成绩与本次的行匹配，哈希表建在较小的一侧（见hash_join）
+
+    :param left_keys: 本次考试每行的连接键
+    :param exam: 另一次考试的连接键及成绩
+    :param method: 排名方式
+    :return: 连接结果
+    """
+    result = hash_join(left_keys, exam.keys)
+    columns = [exam._scores[subject] for subject in exam.subjects]
+    counters = []
+    for column in columns:
+        counter = RankCounter()
+        for score in column:
+            counter.add(score)
+        counters.append(counter)
+
+    matched = {row: [column[position] for column in columns]
+               for row, position in enumerate(result.positions) if position >= 0}
+    scores, ranks = _aligned(len(left_keys), matched, counters, method)
+    return ExamJoin(exam.label, exam.subjects, dict(zip(exam.subjects, scores)), dict(zip(exam.subjects, ranks)),
+                    len(matched), result.unmatched_left, [exam.keys[row] for row in result.unmatched_right],
+                    result.duplicates, len(exam))
+
+
+def join_streamed(left_keys: list, label: str, rows: Iterable[list], key_positions: list, subject_positions: dict,
+                  method: str = "competition") -> ExamJoin:
+    """
+    另一次考试较大（或行数未知）时：在本次的连接键上建立哈希表，另一次考试的行边读边查找，
+    只保留匹配到的成绩、未匹配的连接键及各分数出现的次数
+
+    :param left_keys: 本次考试每行的连接键
+    :param label: 另一次考试的名称
+    :param rows: 另一次考试逐行产出的学生成绩（生成器）
+    :param key_positions: 连接字段在行中的位置
+    :param subject_positions: 科目名到在行中位置的字典
+    :param method: 排名方式
+    :return: 连接结果
+    """
+    index, duplicates = _build_index(left_keys)
+    subjects = list(subject_positions)
+    targets = list(subject_positions.values())
+    counters = [RankCounter() for _ in subjects]
+
+    # 本次行号到（该次行号，各科成绩）
+    matched = {}
+    unmatched_right = []
+    row_count = 0
+    for row_no, row in enumerate(rows):
+        row_count += 1
+        scores = [_score(row[position] if position < len(row) else None) for position in targets]
+        for counter, score in zip(counters, scores):
+            counter.add(score)
+
+        key = normalize_key(row[position] if position < len(row) else None for position in key_positions)
+        if key is None:
+            continue
+        hit = index.get(key)
+        if hit is None:
+            unmatched_right.append((row_no, key))
+        elif hit in matched:
+            # 该次考试中重复的连接键，所有这些行都不参与匹配
+            duplicates.add(key)
+            unmatched_right.append((row_no, key))
+        else:
+            matched[hit] = (row_no, scores)
+
+    for key in duplicates:
+        hit = index.get(key)
+        if hit in matched:
+            unmatched_right.append((matched.pop(hit)[0], key))
+
+    unmatched_left = [row for row, key in enumerate(left_keys) if key is not None and row not in matched]
+    scores, ranks = _aligned(len(left_keys), {row: values for row, (_, values) in matched.items()}, counters, method)
+    return ExamJoin(label, subjects, dict(zip(subjects, scores)), dict(zip(subjects, ranks)), len(matched),
+                    unmatched_left, [key for _, key in sorted(unmatched_right)], sorted(duplicates), row_count)
+
+
+def resolve_join_source(item: str, subject: str, directory: str = ".") -> str:
+    """
+    确定需要连接的考试工作簿：存在的文件直接使用，否则与get_workbook一样在目录中按名称所含关键词查找
+
+    :param item: 工作簿路径或名称中的关键词，如“期中”
+    :param subject: 科目名称，有多个匹配时优先选名称中同时含有科目的工作簿
+    :param directory: 查找的目录，返回的路径相对于该目录
+    :return: 工作簿路径，找不到或无法确定时抛出ValueError
+    """
+    if os.path.isfile(os.path.join(directory, item)):
+        return item
+    candidates = sorted(name for name in os.listdir(directory)
+                        if name.endswith(".xlsx") and item in name and not name.startswith("~$"))
+    if len(candidates) > 1:
+        candidates = [name for name in candidates if subject in name] or candidates
+    if not candidates:
+        raise ValueError(f"没有找到名称中含有{item}的工作簿")
+    if len(candidates) > 1:
+        raise ValueError(f"名称中含有{item}的工作簿有多个（{'、'.join(candidates)}），请给出文件路径")
+    return candidates[0]
+
+
+def join_exam(table: ScoreTable, keys: list, path: str, args: argparse.Namespace, key_fields: list, subjects: list) -> ExamJoin:
+    """
+    以只读模式逐行读取另一次考试的工作簿，按与本次相同的学校、班级条件筛选，与本次考试按学生连接
+
+    工作表的行数（<dimension>）不多于本次学生数时，另一次考试较小，收集其连接键及成绩后由本次的行查找；
+    否则（或行数未知时）在本次的连接键上建立哈希表，另一次考试的行边读边查找，不保留整张工作表
+
+    :param table: 列式成绩表（本次考试）
+    :param keys: 本次每行的连接键
+    :param path: 工作簿路径
+    :param args: 命令行参数（工作表、科目及筛选条件）
+    :param key_fields: 连接字段
+    :param subjects: 需要比较的科目，该次考试中没有的科目跳过
+    :return: 连接结果
+    """
+    from extract_workbook import RowIndex, WorkbookSession, data_start_row, detect_layout_streaming, get_sheet, stream_personal_scores
+    label = os.path.splitext(os.path.basename(path))[0]
+    with WorkbookSession(path, read_only=True, fast_reader=args.fast_reader) as session:
+        source = session.source
+        sheet = get_sheet(source, args.sheet, args.subject, interactive=False)
+        if not sheet:
+            raise ValueError(f"{path}中没有可以确定的{args.subject}类工作表")
+        layout = detect_layout_streaming(source, sheet)
+        positions = {str(header).strip(): position for position, header in enumerate(layout.sub_title_dict.values())
+                     if header is not None}
+
+        key_positions = []
+        for field in key_fields:
+            names = RowIndex.SCHOOL if field in RowIndex.SCHOOL else (field,)
+            position = next((positions[name] for name in names if name in positions), None)
+            if position is None:
+                raise ValueError(f"{label}的表头中没有连接字段{field}")
+            key_positions.append(position)
+
+        missing = [subject for subject in subjects if subject not in positions]
+        if missing:
+            print(f"{label}中没有{'、'.join(missing)}，不比较这些科目")
+        subject_positions = {subject: positions[subject] for subject in subjects if subject in positions}
+
+        rows = stream_personal_scores(source, sheet, layout, args.school, args.classr)
+        size_hint = layout.max_row - data_start_row(layout) + 1 if layout.max_row else 0
+        if 0 < size_hint <= table.row_count:
+            return join_collected(keys, ExamScores.collect(label, rows, key_positions, subject_positions), args.rank_method)
+        return join_streamed(keys, label, rows, key_positions, subject_positions, args.rank_method)
+
+
+def join_exams(table: ScoreTable, args: argparse.Namespace, profiler: StageProfiler = NULL_PROFILER) -> None:
+    """
+    与--join给出的每次考试按学生连接，追加各科的分差及名次变化，并报告未匹配的学生
+
+    :param table: 列式成绩表（本次考试）
+    :param args: 命令行参数
+    :param profiler: 各阶段的性能统计
+    :return: 返回值为None
+    """
+    key_fields = args.join_key
+    subjects = args.join_subjects or table.score_columns(exclude=key_fields)
+    for item in args.join:
+        try:
+            path = resolve_join_source(item, args.subject)
+            with profiler.stage("join"):
+                keys = table.join_keys(key_fields)
+                joined = join_exam(table, keys, path, args, key_fields, subjects)
+                table.join(joined, keys, key_fields, args.rank_method)
+                profiler.add(loads=1, rows=table.row_count + joined.rows,
+                             cells=joined.rows * (len(key_fields) + len(joined.subjects)) + table.row_count * 2 * len(joined.subjects))
+        except (ValueError, IndexError) as e:
+            print(f"与{item}连接失败：{e}")
+            continue
+
+        print(f"与{joined.label}按{'、'.join(key_fields)}匹配{joined.matched}人，比较{len(joined.subjects)}科；"
+              f"本次未匹配{len(joined.unmatched_left)}人，{joined.label}中未匹配{len(joined.unmatched_right)}人")
+        if joined.duplicates:
+            print(f"有{len(joined.duplicates)}个连接键重复，如{'、'.join(joined.duplicates[0])}，这些学生不参与匹配")
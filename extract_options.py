@@ -0,0 +1,34 @@
+"""
+命令行选项用到的取值范围及默认值
+
+命令行前端在解析参数时就需要这些常量（choices、默认值及帮助信息），而定义它们的模块都依赖openpyxl或NumPy，
+因此集中放在这个不依赖第三方库的模块中，各模块从这里导入，--help及参数错误时不必导入openpyxl、NumPy。
+"""
+import os
+
+
+# 输出格式（extract_formats）
+OUTPUT_FORMATS = ("xlsx", "csv", "jsonl", "parquet")
+
+# 分组统计量（extract_stats）
+METRICS = ("count", "mean", "median", "max", "min", "std", "pass_rate", "excellent_rate")
+
+# 流式统计默认输出的分位数（百分数，extract_sketch）
+DEFAULT_QUANTILES = (10, 25, 50, 75, 90)
+
+# 高亮规则的类型及写出方式（extract_highlight）
+HIGHLIGHT_KINDS = ("max", "top", "band", "below_pass")
+HIGHLIGHT_MODES = ("conditional", "static")
+
+# 排名的分组范围及其在新列名中的简称
+RANK_SCOPES = {"全部": "", "学校": "校", "班级": "班"}
+
+# 解析结果的磁盘缓存目录（extract_cache）
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+                                 "CommandLineExtractTool")
+
+# 成绩库的默认路径（extract_warehouse）
+DEFAULT_WAREHOUSE = "scores.sqlite"
+
+# 守护进程的默认监听地址（extract_service）
+DEFAULT_ADDRESS = "127.0.0.1:8765"
@@ -0,0 +1,1340 @@
+"""
+提取流程：确定工作表及版式、读取并筛选学生成绩、列式处理，再写出工作簿或其他格式
+
+命令行前端（CommandLineExtractTool.py）解析参数之后才导入本模块；openpyxl只在读写工作簿时才导入，
+使用--fast-reader读取并输出csv等格式时不会导入。
+
+读取工作簿及判断版式在extract_workbook中，列类型推断在extract_types中；批量、拆分及所有工作表（extract_batch）、
+监视（extract_watch）、守护进程（extract_service）、连接（extract_join）、流式统计（extract_sketch）及成绩库（extract_warehouse）
+各自在相应模块中，由run_cli在用到时导入
+"""
+from __future__ import annotations
+import os, argparse, re, heapq, time
+from typing import TYPE_CHECKING, Iterable, Iterator, NamedTuple, Optional, Tuple, Union
+from extract_options import RANK_SCOPES
+from sheetml_reader import column_index as column_index_from_string, column_letter as get_column_letter
+from extract_formats import TabularExport, check_format, column_names, output_file
+from extract_profile import NULL_PROFILER, StageProfiler, make_profiler, report_profile
+from extract_workbook import (RowIndex, SheetLayout, WorkbookSession, create_streaming_workbook, create_workbook,
+                              detect_layout_streaming, get_data_place, get_sheet, get_sub_title, get_workbook,
+                              read_data_rows, safe_name, stream_personal_scores, title_rows, verify_heading_three, verify_title)
+from extract_types import ColumnTypes, is_number, parse_column_types, plain_number, sample_column_types
+
+if TYPE_CHECKING:
+    # 以下模块只在用到相应功能的函数中导入，普通的提取不会导入缓存、仓库、草图等模块及其依赖（sqlite3等）
+    from openpyxl.workbook.workbook import Workbook
+    from extract_join import ExamJoin
+    from extract_plan import PostProcessPlan
+    from extract_service import SheetLRU
+    from extract_stats import GroupStatistics
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy为可选依赖，没有安装时列式运算退回到纯Python列表
+    np = None
+
+
+def _rank_numpy(scores, codes, method: str) -> list:
+    """
+    分组排名：按（分组，分数降序）排序一次，再由并列及分组的边界累积出名次
+    """
+    count = len(scores)
+    if not count:
+        return []
+    codes = np.asarray(codes, dtype=np.int64)
+    order = np.lexsort((-scores, codes))
+    sorted_scores = scores[order]
+    sorted_codes = codes[order]
+
+    positions = np.arange(count)
+    new_group = np.ones(count, dtype=bool)
+    new_group[1:] = sorted_codes[1:] != sorted_codes[:-1]
+    new_value = new_group.copy()
+    new_value[1:] |= sorted_scores[1:] != sorted_scores[:-1]
+    group_start = np.maximum.accumulate(np.where(new_group, positions, 0))
+
+    if method == "dense":
+        distinct = np.cumsum(new_value)
+        ranks = distinct - distinct[group_start] + 1
+    else:
+        # 并列的行取并列开始处的位置
+        ranks = np.maximum.accumulate(np.where(new_value, positions, 0)) - group_start + 1
+
+    result = np.empty(count, dtype=np.int64)
+    result[order] = ranks
+    return [None if missing else rank for rank, missing in zip(result.tolist(), np.isnan(scores).tolist())]
+
+
+def _rank_python(scores: list, codes: list, method: str) -> list:
+    ranks = [None] * len(scores)
+    order = sorted((row for row, score in enumerate(scores) if score is not None), key=lambda row: (codes[row], -scores[row]))
+    previous_code = previous_score = None
+    rank = position = 0
+    for row in order:
+        if codes[row] != previous_code:
+            previous_code, previous_score, rank, position = codes[row], None, 0, 0
+        position += 1
+        if scores[row] != previous_score:
+            rank = position if method == "competition" else rank + 1
+            previous_score = scores[row]
+        ranks[row] = rank
+    return ranks
+
+
+class ColumnSummary(NamedTuple):
+    """
+    一列数值的汇总：非空数字的个数及总和（含0与不含0），最大值（没有数字时为None）
+    """
+    count: int
+    total: float
+    nonzero_count: int
+    nonzero_total: float
+    maximum: Optional[float]
+
+
+def _summarize(view) -> ColumnSummary:
+    valid = ~np.isnan(view)
+    nonzero = valid & (view != 0)
+    maximum = float(np.nanmax(view)) if valid.any() else None
+    return ColumnSummary(int(valid.sum()), float(view[valid].sum()), int(nonzero.sum()), float(view[nonzero].sum()), maximum)
+
+
+def _summarize_python(view: list) -> ColumnSummary:
+    numbers = [value for value in view if value is not None]
+    nonzero = [value for value in numbers if value != 0]
+    return ColumnSummary(len(numbers), sum(numbers), len(nonzero), sum(nonzero), max(numbers, default=None))
+
+
+def _difference(first, second) -> list:
+    """
+    两列数值数组的差（第二列减去第一列），与plain_number相同：NaN写为空值，整数值写为整型，一次求出整列哪些是整数
+    """
+    difference = second - first
+    integral = np.isfinite(difference) & (difference == np.floor(difference))
+    return [int(value) if is_int else (None if value != value else value)
+            for value, is_int in zip(difference.tolist(), integral.tolist())]
+
+
+def _scan_python(columns: list, positions: list) -> tuple:
+    """
+    没有NumPy时的合并扫描：逐行遍历一次，同时得到各列的数值视图、计数、求和、最大值及各对比的差值
+
+    :param columns: 需要扫描的各列
+    :param positions: 对比的两列在columns中的位置
+    :return: 数值视图列表，汇总列表，差值列表
+    """
+    width = len(columns)
+    views = [[] for _ in range(width)]
+    counts, totals, nonzero_counts, nonzero_totals = [0] * width, [0] * width, [0] * width, [0] * width
+    maxima = [None] * width
+    differences = [[] for _ in positions]
+    for row in zip(*columns):
+        row = [value if type(value) is int or type(value) is float or is_number(value) else None for value in row]
+        for position, value in enumerate(row):
+            views[position].append(value)
+            if value is None:
+                continue
+            counts[position] += 1
+            totals[position] += value
+            if value != 0:
+                nonzero_counts[position] += 1
+                nonzero_totals[position] += value
+            if maxima[position] is None or value > maxima[position]:
+                maxima[position] = value
+        for values, (first, second) in zip(differences, positions):
+            a, b = row[first], row[second]
+            values.append(b - a if a is not None and b is not None else None)
+    summaries = [ColumnSummary(*fields) for fields in zip(counts, totals, nonzero_counts, nonzero_totals, maxima)]
+    return views, summaries, differences
+
+
+class ScoreTable:
+    """
+    列式存储的成绩表，每个表头对应一列
+
+    对比、排序、平均值、最大值标记及字符串数字转化都按整列进行（安装了NumPy时使用向量化运算），
+    运算过程中不接触单元格，最后由to_workbook一次写回
+    """
+
+    def __init__(self, headers: list, heading_three: list, columns: list):
+        """
+        :param headers: 表头列表（get_sub_title得到的字典的值）
+        :param heading_three: 次表头列表，不存在时为空列表
+        :param columns: 每个表头对应的一列值
+        """
+        self.headers = list(headers)
+        self.heading_three = list(heading_three) if heading_three else []
+        self.columns = [list(column) for column in columns]
+        self.row_count = len(self.columns[0]) if self.columns else 0
+        self.source_width = len(self.headers)
+        # 追加在数据之后的一行（平均值），列号到值的字典
+        self.footer = {}
+        # 需要标记的单元格，列号到{行号: 颜色}的字典，行号等于row_count时表示footer，颜色为None时使用默认颜色
+        self.marks = {}
+        # 写为条件格式的高亮规则，（列号，规则）的列表
+        self.highlights = []
+        # 分组统计结果，写入单独的统计工作表
+        self.stats = None
+        # 推断的列类型，convert_types时记录
+        self.types = None
+        # 与其他考试连接时未匹配的学生，每项为[考试, 所在, 连接键...]，写入单独的工作表
+        self.unmatched = []
+        self.join_fields = []
+        self._numeric_cache = {}
+        self._summaries = {}
+        # 扫描时与其他列一起求出的对比差值，（第一列，第二列）到新列值的字典
+        self._differences = {}
+        # 逐行读取整列的次数：求数值视图、求汇总、求差值各算一次，一次合并扫描无论多少列也只算一次
+        self.passes = 0
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[list], headers: list, heading_three: list) -> "ScoreTable":
+        """
+        由逐行的学生成绩构建列式表
+
+        :param rows: 学生个人成绩信息的可迭代对象
+        :param headers: 表头列表
+        :param heading_three: 次表头列表
+        :return: 列式成绩表
+        """
+        width = len(headers)
+        columns = [[] for _ in range(width)]
+        for row in rows:
+            for index in range(width):
+                columns[index].append(row[index] if index < len(row) else None)
+        return cls(headers, heading_three, columns)
+
+    def column_index(self, column: str) -> int:
+        """
+        将输出工作表中的列字母转化为表内列号（从0开始）
+        """
+        if not re.fullmatch(r"[A-Za-z]{1,3}", column):
+            raise ValueError(f"{column}不是列字母")
+        index = column_index_from_string(column.upper()) - 1
+        if index >= len(self.columns):
+            raise IndexError(f"列{column}超出工作表范围")
+        return index
+
+    def numeric(self, index: int):
+        """
+        第index列的数值视图，非数字记为NaN（无NumPy时为None）
+        """
+        if index not in self._numeric_cache:
+            self.passes += 1
+            missing = np.nan if np is not None else None
+            # 先按类型判断，只有其他类型的值才调用is_number
+            view = [value if type(value) is int or type(value) is float or is_number(value) else missing
+                    for value in self.columns[index]]
+            self._numeric_cache[index] = np.array(view, dtype=float) if np is not None else view
+        return self._numeric_cache[index]
+
+    def summary(self, index: int) -> ColumnSummary:
+        """
+        第index列的计数、求和及最大值，由数值视图求出并缓存，平均值及最大值标记共用
+        """
+        if index not in self._summaries:
+            view = self.numeric(index)
+            self.passes += 1
+            self._summaries[index] = _summarize(view) if np is not None else _summarize_python(view)
+        return self._summaries[index]
+
+    def scan(self, keys: Iterable[str], pairs: Iterable[tuple] = ()) -> list:
+        """
+        按执行计划合并扫描：逐行遍历一次，同时求出各列的数值视图（排名、前k名及高亮的输入）、
+        计数、求和及最大值（平均值及最大值标记使用），以及对比的差值；还不存在的列（如之后才新增的列）跳过，用到时再求
+
+        没有NumPy时计数、求和及最大值在同一次遍历中累计；有NumPy时遍历只转化数值，
+        汇总及差值再由各列的数值数组向量化求出，不再逐行读取
+
+        :param keys: 表头名称或列字母
+        :param pairs: 对比的（第一列，第二列）列字母
+        :return: 扫描的列号
+        """
+        indexes = []
+        for key in keys:
+            try:
+                index = self.find_column(key)
+            except (IndexError, ValueError):
+                continue
+            if index not in indexes:
+                indexes.append(index)
+        positions = []
+        for first, second in pairs:
+            try:
+                positions.append((indexes.index(self.column_index(first)), indexes.index(self.column_index(second))))
+            except (IndexError, ValueError):
+                continue
+        if not indexes:
+            return indexes
+
+        self.passes += 1
+        columns = [self.columns[index] for index in indexes]
+        if np is not None:
+            block = np.array([[value if type(value) is int or type(value) is float or is_number(value) else np.nan
+                               for value in row] for row in zip(*columns)], dtype=float)
+            views = list(np.ascontiguousarray(block.reshape(self.row_count, len(indexes)).T))
+            summaries = [_summarize(view) for view in views]
+            differences = [_difference(views[first], views[second]) for first, second in positions]
+        else:
+            views, summaries, differences = _scan_python(columns, positions)
+
+        for index, view, summary in zip(indexes, views, summaries):
+            self._numeric_cache[index] = view
+            self._summaries[index] = summary
+        for (first, second), values in zip(positions, differences):
+            self._differences[indexes[first], indexes[second]] = values
+        return indexes
+
+    def _set_column(self, index: int, values: list) -> None:
+        self.columns[index] = values
+        self._numeric_cache.pop(index, None)
+        self._summaries.pop(index, None)
+        self._differences.clear()
+
+    def add_column(self, header: str, values: list) -> int:
+        """
+        在最后追加一列，返回新列的列号
+        """
+        self.columns.append(values)
+        self.headers.append(header)
+        if self.heading_three:
+            self.heading_three.append(header)
+        return len(self.columns) - 1
+
+    def convert_types(self, types: ColumnTypes) -> int:
+        """
+        按推断的列类型整列转化字符串数字
+
+        :param types: 各列类型
+        :return: 转化的单元格数
+        """
+        self.types = types
+        before = sum(types.converted)
+        for index in range(min(len(self.columns), len(types.kinds))):
+            column = types.convert_column(index, self.columns[index])
+            if column is not self.columns[index]:
+                self._set_column(index, column)
+        return sum(types.converted) - before
+
+    def find_column(self, key: str, aliases: Tuple[str, ...] = ()) -> int:
+        """
+        按表头名称（或其别名）或输出工作表中的列字母查找列，返回表内列号（从0开始）
+        """
+        for index, header in enumerate(self.headers):
+            if header is not None and (str(header).strip() == key or header in aliases):
+                return index
+        if re.fullmatch(r"[A-Za-z]{1,3}", key):
+            return self.column_index(key)
+        raise IndexError(f"表头中没有{key}")
+
+    def group_statistics(self, subjects: list, fields: list, metrics: list, full_scores: dict,
+                         pass_ratio: float, excellent_ratio: float, skip_zero: bool) -> GroupStatistics:
+        """
+        按全部、第一个分组字段、前两个分组字段……逐级分组，一次计算各科的统计量
+
+        :param subjects: 科目列（表头名称或列字母）
+        :param fields: 分组字段，如["学校", "班级"]，表头中没有的字段跳过
+        :param metrics: 统计量，extract_stats.METRICS中的若干项
+        :param full_scores: 科目名到满分的字典，None键为默认满分
+        :param pass_ratio: 及格线占满分的比例
+        :param excellent_ratio: 优秀线占满分的比例
+        :param skip_zero: 是否把0分当作缺考
+        :return: 统计结果
+        """
+        from extract_stats import compute_statistics
+        subject_columns = {}
+        for key in subjects:
+            index = self.find_column(key)
+            name = self.headers[index] if self.headers[index] is not None else get_column_letter(index + 1)
+            subject_columns[str(name)] = self.columns[index]
+
+        group_columns = {}
+        for field in fields:
+            try:
+                group_columns[field] = self.columns[self.find_column(field, RowIndex.SCHOOL if field in RowIndex.SCHOOL else ())]
+            except IndexError:
+                print(f"表头中没有{field}，不按{field}分组")
+        levels = [[]] + [list(group_columns)[:depth] for depth in range(1, len(group_columns) + 1)]
+
+        full = {name: full_scores.get(name, full_scores.get(None)) for name in subject_columns}
+        return compute_statistics(group_columns, subject_columns, levels, metrics,
+                                  pass_lines={name: score * pass_ratio for name, score in full.items() if score},
+                                  excellent_lines={name: score * excellent_ratio for name, score in full.items() if score},
+                                  skip_zero=skip_zero)
+
+    def compare(self, first_column: str, second_column: str, column_name: str) -> int:
+        """
+        第二列减去第一列，结果作为新的最后一列，只有两列都是数字的行才有值
+
+        :return: 新列的列号
+        """
+        key = (self.column_index(first_column), self.column_index(second_column))
+        values = self._differences.pop(key, None)
+        if values is None:
+            first, second = self.numeric(key[0]), self.numeric(key[1])
+            self.passes += 1
+            if np is not None:
+                values = _difference(first, second)
+            else:
+                values = [b - a if a is not None and b is not None else None for a, b in zip(first, second)]
+
+        return self.add_column(column_name, values)
+
+    def score_columns(self, exclude: list = ()) -> list:
+        """
+        源表中推断为整型或浮点型的列的表头，用作默认的比较科目
+        """
+        if self.types is None:
+            return []
+        return [str(header).strip() for header, kind in zip(self.headers[:self.source_width], self.types.kinds)
+                if header is not None and kind in (ColumnTypes.INT, ColumnTypes.FLOAT) and str(header).strip() not in exclude]
+
+    def join_keys(self, key_fields: list) -> list:
+        """
+        每行的连接键（见normalize_key）
+
+        :param key_fields: 连接字段（表头名称或列字母）
+        """
+        from extract_join import normalize_key
+        key_columns = [self.columns[self.find_column(field, RowIndex.SCHOOL if field in RowIndex.SCHOOL else ())]
+                       for field in key_fields]
+        return [normalize_key(values) for values in zip(*key_columns)]
+
+    def join(self, joined: ExamJoin, keys: list, key_fields: list, method: str = "competition") -> None:
+        """
+        追加与另一次考试的比较：每科追加分差及名次变化两列
+
+        分差为本次减去该次考试的成绩，名次变化为该次考试的名次减去本次名次（正数为进步），
+        两次考试的名次分别在各自的全部学生中计算；未匹配的学生两列为空，记入unmatched
+
+        :param joined: 与该次考试的连接结果，成绩及名次已按本表的行对齐
+        :param keys: 本表每行的连接键
+        :param key_fields: 连接字段
+        :param method: 排名方式，competition或dense
+        :return: 返回值为None
+        """
+        for subject in joined.subjects:
+            current = self.numeric(self.find_column(subject))
+            previous_score, previous_rank = joined.scores[subject], joined.ranks[subject]
+            if np is not None:
+                current_rank = np.array(_rank_numpy(current, np.zeros(len(current), dtype=np.int64), method), dtype=float)
+                previous_score = np.frombuffer(previous_score, dtype=float) if len(previous_score) else np.empty(0)
+                previous_rank = np.frombuffer(previous_rank, dtype=float) if len(previous_rank) else np.empty(0)
+                deltas = [plain_number(value) for value in (current - previous_score).tolist()]
+                changes = [plain_number(value) for value in (previous_rank - current_rank).tolist()]
+            else:
+                current_rank = _rank_python(current, [0] * len(current), method)
+                deltas, changes = [], []
+                for row, (score, rank) in enumerate(zip(previous_score, previous_rank)):
+                    if current[row] is None or score != score:
+                        deltas.append(None)
+                        changes.append(None)
+                    else:
+                        deltas.append(plain_number(current[row] - score))
+                        changes.append(plain_number(rank - current_rank[row]))
+            self.add_column(f"{subject}较{joined.label}", deltas)
+            self.add_column(f"{subject}名次较{joined.label}", changes)
+
+        self.join_fields = list(key_fields)
+        self.unmatched += [[joined.label, "仅本次", *keys[row]] for row in joined.unmatched_left]
+        self.unmatched += [[joined.label, f"仅{joined.label}", *key] for key in joined.unmatched_right]
+
+    def add_rank(self) -> int:
+        """
+        追加按行填充的序号列
+
+        :return: 新列的列号
+        """
+        return self.add_column(None, list(range(1, self.row_count + 1)))
+
+    # 排名的分组范围及其在新列名中的简称
+    RANK_SCOPES = RANK_SCOPES
+
+    def group_codes(self, scope: str):
+        """
+        每行所在分组的编号：全部学生为一组，学校按学校分组，班级按（学校，班级）分组，因为不同学校的班级名称会重复
+
+        :param scope: 分组范围，RANK_SCOPES中的键
+        :return: 分组编号（NumPy数组或列表）
+        """
+        from extract_stats import factorize_field
+        fields = {"全部": [], "学校": ["学校"], "班级": ["学校", "班级"]}[scope]
+        columns = []
+        for field in fields:
+            try:
+                columns.append(self.columns[self.find_column(field, RowIndex.SCHOOL if field == "学校" else ())])
+            except IndexError:
+                if field == scope:
+                    raise
+        if not columns:
+            return np.zeros(self.row_count, dtype=np.int64) if np is not None else [0] * self.row_count
+        if len(columns) == 1:
+            return factorize_field(columns[0])[0]
+        return factorize_field(list(zip(*columns)))[0]
+
+    def rank(self, column: str, method: str = "competition", scope: str = "全部") -> int:
+        """
+        按指定列的分数从高到低排名，追加为新列，每个分组只排序一次
+
+        competition为竞争排名（并列占用名次，如1、2、2、4），dense为密集排名（如1、2、2、3），
+        不是数字的分数（如“缺考”）没有名次
+
+        :param column: 排名依据的列（表头名称或列字母）
+        :param method: 排名方式，competition或dense
+        :param scope: 在全部、学校或班级内排名
+        :return: 新列的列号
+        """
+        index = self.find_column(column)
+        scores = self.numeric(index)
+        codes = self.group_codes(scope)
+        ranks = _rank_numpy(scores, codes, method) if np is not None else _rank_python(scores, codes, method)
+        name = self.headers[index] if self.headers[index] is not None else get_column_letter(index + 1)
+        return self.add_column(f"{name}{self.RANK_SCOPES[scope]}排名", ranks)
+
+    def top_k(self, column: str, k: int, scope: str = "全部") -> list:
+        """
+        用大小为k的堆找出每个分组中分数最高的k行（与第k名并列的行一并保留），不对整表排序
+
+        :param column: 依据的列（表头名称或列字母）
+        :param k: 每组保留的名次
+        :param scope: 在全部、学校或班级内取前k名
+        :return: 选中的行号，按分组首次出现的顺序、组内分数从高到低排列
+        """
+        scores = self.numeric(self.find_column(column))
+        scores = scores.tolist() if np is not None else scores
+        codes = self.group_codes(scope)
+        codes = codes.tolist() if np is not None else codes
+
+        heaps = {}
+        for row, (code, score) in enumerate(zip(codes, scores)):
+            if score is None or score != score:
+                continue
+            heap = heaps.setdefault(code, [])
+            if len(heap) < k:
+                heapq.heappush(heap, score)
+            elif score > heap[0]:
+                heapq.heapreplace(heap, score)
+
+        # 每组第k高的分数为门槛，与之并列的行也保留
+        thresholds = {code: heap[0] for code, heap in heaps.items()}
+        selected = [row for row, (code, score) in enumerate(zip(codes, scores))
+                    if code in thresholds and score is not None and score >= thresholds[code]]
+        first_seen = {}
+        for code in codes:
+            first_seen.setdefault(code, len(first_seen))
+        selected.sort(key=lambda row: (first_seen[codes[row]], -scores[row], row))
+        return selected
+
+    def sort_order(self, column: str) -> list:
+        """
+        按指定列分数从高到低的稳定排序，不是数字的排在最后
+        """
+        scores = self.numeric(self.find_column(column))
+        if np is not None:
+            # 取负后升序的稳定排序即降序，NaN排在最后
+            return np.argsort(-scores, kind="stable").tolist()
+        return sorted(range(self.row_count), key=lambda row: (scores[row] is None, -(scores[row] or 0)))
+
+    def take(self, rows: list) -> None:
+        """
+        按给定的行号重新排列（或筛选）所有列，需在计算平均值和标记之前调用
+        """
+        for index, column in enumerate(self.columns):
+            self.columns[index] = [column[row] for row in rows]
+        self.row_count = len(rows)
+        self._numeric_cache.clear()
+        self._summaries.clear()
+        self._differences.clear()
+
+    def average(self, column_list: list, mode: str) -> dict:
+        """
+        计算指定列的平均值，放在数据之后的新行
+
+        :param column_list: 指定的要进行计算列的列表
+        :param mode: 计算模式，normal模式不去零，反之去零
+        :return: 列字母到平均值的字典，没有数值的列为None且不写入平均值行
+        """
+        if mode not in ("normal", "normal no zero"):
+            raise ValueError(f"未知的计算模式{mode}")
+
+        averages = {}
+        for column in column_list:
+            index = self.column_index(column)
+            summary = self.summary(index)
+            if mode == "normal":
+                count, total = summary.count, summary.total
+            else:
+                count, total = summary.nonzero_count, summary.nonzero_total
+
+            if count == 0:
+                print(f"{column}列没有数值，不计算平均值")
+                averages[column] = None
+                continue
+            average_score = total / count
+            self.footer[index] = average_score
+            averages[column] = average_score
+
+        return averages
+
+    def mark_max(self, column_list: list, color: str = None) -> int:
+        """
+        标记指定列（为空时为所有列）中与该列最大值相等的单元格，平均值行也参与比较
+
+        :param column_list: 需要标记的列表
+        :param color: 标记的颜色，为None时使用to_workbook的默认颜色
+        :return: 标记次数
+        """
+        if column_list:
+            indexes = [self.column_index(column) for column in column_list]
+        else:
+            indexes = list(range(len(self.columns)))
+
+        targeted_num = 0
+        for index in indexes:
+            targeted_num += self._mark(index, self._max_rows(index), color)
+        return targeted_num
+
+    def _max_rows(self, index: int) -> set:
+        footer = self.footer.get(index)
+
+        # 最大值从第一个数字开始比较，与条件格式的前1名相同，全为负数的列也能标记
+        max_num = self.summary(index).maximum
+        if max_num is None:
+            return set() if footer is None else {self.row_count}
+        view = self.numeric(index)
+        if np is not None:
+            rows = set(np.flatnonzero(view == max_num).tolist())
+        else:
+            rows = {row for row, value in enumerate(view) if value is not None and value == max_num}
+        if footer is not None and footer >= max_num:
+            if footer > max_num:
+                rows = set()
+            rows.add(self.row_count)
+        return rows
+
+    def _mark(self, index: int, rows: set, color: str = None) -> int:
+        if rows:
+            self.marks.setdefault(index, {}).update(dict.fromkeys(rows, color))
+        return len(rows)
+
+    def highlight(self, rules: list, mode: str, full_scores: dict, pass_ratio: float) -> int:
+        """
+        按高亮规则标记，conditional模式只记录规则，由to_workbook写为条件格式；static模式算出需要标记的单元格
+
+        :param rules: 高亮规则列表
+        :param mode: conditional或static
+        :param full_scores: 科目名到满分的字典，None键为默认满分，用于确定及格线
+        :param pass_ratio: 及格线占满分的比例
+        :return: conditional模式为规则数，static模式为标记的单元格数
+        """
+        from extract_highlight import static_rows
+        resolved = []
+        for rule in rules:
+            index = self.find_column(rule.column)
+            if rule.kind == "below_pass":
+                name = self.headers[index] if self.headers[index] is not None else get_column_letter(index + 1)
+                full_score = full_scores.get(str(name), full_scores.get(None))
+                if not full_score:
+                    raise ValueError(f"没有{name}的满分，无法确定及格线")
+                rule = rule._replace(high=full_score * pass_ratio)
+            resolved.append((index, rule))
+
+        if mode == "conditional":
+            self.highlights.extend(resolved)
+            return len(resolved)
+
+        targeted_num = 0
+        for index, rule in resolved:
+            rows = self._max_rows(index) if rule.kind == "max" else static_rows(rule, self.numeric(index))
+            targeted_num += self._mark(index, rows, rule.color)
+        return targeted_num
+
+    def rows(self) -> Iterator[list]:
+        """
+        逐行产出表中的值，包括最后的平均值行
+        """
+        for row in zip(*self.columns):
+            yield list(row)
+        if self.footer:
+            yield [self.footer.get(index) for index in range(len(self.columns))]
+
+    def to_export(self, output_format: str, metadata: dict) -> TabularExport:
+        """
+        将表写为CSV、JSON Lines或Parquet，新增列作为普通列写出，平均值及最大值标记写入元数据
+
+        :param output_format: 输出格式
+        :param metadata: 标题等元数据，在此补充新增列、平均值及最大值标记
+        :return: 待保存的输出
+        """
+        names = column_names(self.headers, self.heading_three)
+        metadata = dict(metadata)
+        metadata["derived_columns"] = names[self.source_width:]
+        metadata["averages"] = {names[index]: value for index, value in sorted(self.footer.items())}
+        # 标记所在的数据行（从1开始），平均值行记为"average"
+        metadata["marks"] = {names[index]: [row + 1 if row < self.row_count else "average" for row in sorted(rows)]
+                             for index, rows in sorted(self.marks.items())}
+        if self.stats is not None:
+            metadata["statistics"] = self.stats.to_dict()
+        if self.unmatched:
+            metadata["unmatched"] = [dict(zip(["exam", "side"] + self.join_fields, row)) for row in self.unmatched]
+        return TabularExport(output_format, names, (list(row) for row in zip(*self.columns)), metadata)
+
+    def to_workbook(self, sheet: str, title: str, title_exist: bool, color: str = "FF0000", wb: Workbook = None) -> Workbook:
+        """
+        将表一次写回到只写模式的新工作簿，保存交由WorkbookSession完成
+
+        :param sheet: 新命名的工作表
+        :param title: 工作表内容的标题
+        :param title_exist: 标题是否存在
+        :param color: 标记单元格的颜色
+        :param wb: 已有的只写模式工作簿，给出时在其中新建工作表
+        :return: 只写模式的新工作簿
+        """
+        from extract_highlight import StyleCache, conditional_rule
+        if wb is None:
+            wb = create_workbook(write_only=True)
+        ws = wb.create_sheet(sheet)
+
+        if title_exist:
+            ws.merged_cells.add(f"A1:{get_column_letter(max(self.source_width, 1))}1")
+
+        header_rows = list(title_rows(title, self.headers, self.heading_three, title_exist, bool(self.heading_three)))
+        for row in header_rows:
+            ws.append(row)
+
+        from openpyxl.cell import WriteOnlyCell
+
+        # 同一颜色的标记共用一个字体对象
+        styles = StyleCache()
+        marked_rows = {}
+        for index, rows in self.marks.items():
+            for row, row_color in rows.items():
+                marked_rows.setdefault(row, []).append((index, styles.font(row_color or color)))
+
+        for row_idx, row in enumerate(self.rows()):
+            if row_idx in marked_rows:
+                row = list(row)
+                for index, font in marked_rows[row_idx]:
+                    cell = WriteOnlyCell(ws, value=row[index])
+                    cell.font = font
+                    row[index] = cell
+            ws.append(row)
+
+        # 条件格式作用于整列的数据区域，列最大值与平均值行一起比较
+        first_row = len(header_rows) + 1
+        for index, rule in self.highlights:
+            last_row = first_row + self.row_count - 1 + (1 if rule.kind == "max" and index in self.footer else 0)
+            if last_row >= first_row:
+                letter = get_column_letter(index + 1)
+                ws.conditional_formatting.add(f"{letter}{first_row}:{letter}{last_row}", conditional_rule(rule, color, styles))
+
+        if self.stats is not None:
+            write_statistics_sheet(wb, safe_name(f"{sheet}统计", 31), self.stats)
+        if self.unmatched:
+            ws = wb.create_sheet(safe_name(f"{sheet}未匹配", 31))
+            ws.append(["考试", "所在"] + self.join_fields)
+            for row in self.unmatched:
+                ws.append(row)
+
+        return wb
+
+
+def write_statistics_sheet(wb: Workbook, sheet: str, stats: GroupStatistics) -> None:
+    """
+    在只写模式的工作簿中新建统计工作表，平均分等保留两位小数，及格率、优秀率显示为百分数
+
+    :param wb: 只写模式的工作簿
+    :param sheet: 统计工作表名称
+    :param stats: 分组统计结果
+    :return: 返回值为None
+    """
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    ws = wb.create_sheet(sheet)
+    bold = Font(bold=True)
+    header = []
+    for name in stats.header():
+        cell = WriteOnlyCell(ws, value=name)
+        cell.font = bold
+        header.append(cell)
+    ws.append(header)
+
+    offset = len(stats.header()) - len(stats.metrics)
+    formats = {"mean": "0.00", "median": "0.0", "std": "0.00", "pass_rate": "0.0%", "excellent_rate": "0.0%"}
+    formatted = [(offset + number, formats[metric]) for number, metric in enumerate(stats.metrics) if metric in formats]
+    for row in stats.rows():
+        for index, number_format in formatted:
+            if row[index] is not None:
+                cell = WriteOnlyCell(ws, value=row[index])
+                cell.number_format = number_format
+                row[index] = cell
+        ws.append(row)
+
+
+def _parse_source(session: WorkbookSession, args: argparse.Namespace, interactive: bool) -> Tuple[str, SheetLayout]:
+    """
+    解析源工作簿，确定工作表及其版式
+    """
+    with session.profiler.stage("load"):
+        source = session.source
+
+    with session.profiler.stage("layout"):
+        return _detect_layout(session, source, args, interactive)
+
+
+def _detect_layout(session: WorkbookSession, source: Workbook, args: argparse.Namespace, interactive: bool) -> Tuple[str, SheetLayout]:
+    input_sheet = get_sheet(source, args.sheet, args.subject, interactive)
+    if not input_sheet:
+        raise ValueError(f"{session.source_path}中没有可以确定的{args.subject}类工作表")
+
+    if args.stream:
+        # 只读流式模式：前几行判断版式
+        return input_sheet, detect_layout_streaming(source, input_sheet)
+
+    max_row, max_column, data_place = get_data_place(source, input_sheet)
+    title_row_size, title_col_size, title, title_exist = verify_title(source, input_sheet, data_place)
+    sub_title_place, sub_title_dict = get_sub_title(source, input_sheet, data_place, title_row_size, title_col_size, max_column)
+    heading_three_list, heading_three_exist = verify_heading_three(source, input_sheet, sub_title_place, max_column)
+    layout = SheetLayout(max_row, max_column, data_place, title_row_size, title_col_size, title, title_exist,
+                         sub_title_place, sub_title_dict, heading_three_list, heading_three_exist)
+
+    return input_sheet, layout
+
+
+def extract_rows(session: WorkbookSession, args: argparse.Namespace, interactive: bool = True,
+                 sheet_cache: SheetLRU = None) -> Tuple[str, SheetLayout, Iterable[list]]:
+    """
+    从会话中的源工作簿确定工作表及版式，并按学校、班级筛选出学生成绩
+
+    启用缓存时，源工作簿未改变则直接从缓存读取版式和数据行，完全不用openpyxl解析
+
+    :param session: 工作簿会话
+    :param args: 命令行参数
+    :param interactive: 有多个候选工作表时是否询问用户
+    :param sheet_cache: 守护进程中的内存缓存，给出时优先于磁盘缓存
+    :return: 工作表名称，版式信息，学生成绩（流式模式下为生成器）；使用--from-warehouse时从成绩库读取
+    """
+    profiler = session.profiler
+    row_index = None
+    where = None
+
+    if getattr(args, "from_warehouse", None):
+        from extract_warehouse import Warehouse
+        with profiler.stage("warehouse"), Warehouse(args.warehouse) as warehouse:
+            info, layout_dict, data_rows = warehouse.load(args.from_warehouse, args.subject, args.sheet)
+        input_sheet, layout = info.sheet, SheetLayout(**layout_dict)
+        print(f"已从成绩库读取{info.exam}的{input_sheet}，共{len(data_rows)}行")
+
+    elif sheet_cache is not None:
+        sheet_key = f"sheet:{args.sheet}" if args.sheet is not None else f"subject:{args.subject}"
+        mode = "stream" if args.stream else "full"
+
+        def load():
+            # 学校、班级索引与数据行一起缓存，之后的请求只需查询
+            input_sheet, layout = _parse_source(session, args, interactive)
+            data_rows = _read_rows(session, input_sheet, layout)
+            return input_sheet, layout, data_rows, RowIndex.build(data_rows, layout)
+
+        (input_sheet, layout, data_rows, row_index), hit = sheet_cache.get_or_load(session.source_path, (sheet_key, mode), load)
+        if hit:
+            print(f"已从内存缓存读取{input_sheet}，共{len(data_rows)}行")
+
+    elif getattr(args, "cache", False):
+        from extract_cache import ParsedSheetCache
+        cache = ParsedSheetCache(args.cache_dir, args.cache_size * 1024 * 1024)
+        sheet_key = f"sheet:{args.sheet}" if args.sheet is not None else f"subject:{args.subject}"
+        mode = "stream" if args.stream else "full"
+        with profiler.stage("cache_get"):
+            cached = cache.get(session.source_path, sheet_key, mode)
+
+        if cached is not None:
+            input_sheet, layout_dict, data_rows = cached
+            layout = SheetLayout(**layout_dict)
+            print(f"已从缓存读取{input_sheet}，共{len(data_rows)}行")
+        else:
+            input_sheet, layout = _parse_source(session, args, interactive)
+            data_rows = _read_rows(session, input_sheet, layout)
+            with profiler.stage("cache_put"):
+                cache.put(session.source_path, sheet_key, mode, input_sheet, layout._asdict(), data_rows)
+
+    else:
+        input_sheet, layout = _parse_source(session, args, interactive)
+
+        if args.stream:
+            # 数据行边读边筛选，读取的耗时计入之后写入输出的阶段
+            rows = stream_personal_scores(session.source, input_sheet, layout, args.school, args.classr)
+            if getattr(args, "where", None):
+                from extract_where import WhereFilter
+                rows = WhereFilter(args.where, list(layout.sub_title_dict.values())).filter(rows)
+            return input_sheet, layout, rows
+
+        data_rows = _read_rows(session, input_sheet, layout)
+
+    if getattr(args, "where", None):
+        from extract_where import WhereFilter
+        where = WhereFilter(args.where, list(layout.sub_title_dict.values()))
+
+    # 一次遍历建立学校、班级索引，再按行号集合取出学生成绩
+    with profiler.stage("filter"):
+        if row_index is None:
+            row_index = RowIndex.build(data_rows, layout)
+        selected = sorted(row_index.select(args.school, args.classr))
+        if where is not None:
+            # 学校、班级上的条件在索引上求值，其余条件只对剩下的行求值
+            selected = where.select(data_rows, selected, row_index.by_position())
+        main_content_list = [data_rows[row] for row in selected]
+        profiler.add(rows=len(data_rows), cells=len(data_rows) * len(row_index.fields))
+
+    return input_sheet, layout, main_content_list
+
+
+def _read_rows(session: WorkbookSession, input_sheet: str, layout: SheetLayout) -> list:
+    with session.profiler.stage("read_rows"):
+        data_rows = list(read_data_rows(session.source, input_sheet, layout))
+        session.profiler.add(rows=len(data_rows), cells=len(data_rows) * len(layout.sub_title_dict))
+    return data_rows
+
+
+def needs_post_processing(args: argparse.Namespace) -> bool:
+    return bool(args.compare_nums or args.rank_number or args.calc_total_average_column or args.mark_column
+                or getattr(args, "highlight", None) or getattr(args, "group_stats", None) or getattr(args, "join", None) or getattr(args, "rank_by", None) or getattr(args, "top_k", None))
+
+
+def parse_full_scores(items: list) -> dict:
+    """
+    解析命令行中的满分，如 ["100", "总分=600"]
+
+    :param items: 默认满分或“科目=满分”的列表
+    :return: 科目名到满分的字典，None键为默认满分
+    """
+    full_scores = {}
+    for item in items or []:
+        key, sep, score = item.rpartition("=")
+        try:
+            full_scores[key.strip() if sep else None] = float(score)
+        except ValueError:
+            raise ValueError(f"无法解析满分{item}，请使用“满分”或“科目=满分”")
+    return full_scores
+
+
+def rank_rows(table: ScoreTable, args: argparse.Namespace, profiler: StageProfiler = NULL_PROFILER) -> None:
+    """
+    按分数排名，再取每组前k名或按第一个排名列排序输出，在计算平均值及标记之前进行
+
+    :param table: 列式成绩表
+    :param args: 命令行参数
+    :param profiler: 各阶段的性能统计
+    :return: 返回值为None
+    """
+    rank_by = args.rank_by or []
+    if rank_by:
+        try:
+            with profiler.stage("rank"):
+                for column in rank_by:
+                    table.rank(column, args.rank_method, args.rank_within)
+                profiler.add(rows=table.row_count, cells=table.row_count * len(rank_by))
+        except IndexError as e:
+            print(f"排名失败：{e}")
+            return
+        print(f"已完成{len(rank_by)}列排名（{args.rank_within}内，{args.rank_method}）")
+
+    key = rank_by[0] if rank_by else args.top_k_by
+    try:
+        if args.top_k:
+            with profiler.stage("top_k"):
+                before = table.row_count
+                table.take(table.top_k(key, args.top_k, args.rank_within))
+                profiler.add(rows=before, cells=before)
+            print(f"已按{key}保留每组前{args.top_k}名（含并列），共{table.row_count}行")
+        elif args.sort_by_rank and rank_by:
+            with profiler.stage("sort"):
+                table.take(table.sort_order(key))
+                profiler.add(rows=table.row_count, cells=table.row_count * len(table.columns))
+            print(f"已按{key}从高到低排序输出")
+    except IndexError as e:
+        print(f"选取前{args.top_k}名失败：{e}")
+
+
+def scan_table(table: ScoreTable, plan: PostProcessPlan, phase: int, profiler: StageProfiler = NULL_PROFILER) -> None:
+    """
+    执行计划中一个阶段的合并扫描
+    """
+    with profiler.stage("scan"):
+        scanned = table.scan(plan.scan_columns(phase), plan.compare_pairs(phase))
+        profiler.add(rows=table.row_count, cells=table.row_count * len(scanned))
+
+
+def post_process(table: ScoreTable, args: argparse.Namespace, profiler: StageProfiler = NULL_PROFILER) -> None:
+    """
+    按列推断类型并整列转化字符串数字，再按命令行参数对列式表依次进行对比、排序、平均值及最大值标记
+
+    各操作先收集为执行计划（extract_plan），需要读取的列在类型转化之后合并扫描一次，同时求出数值视图、汇总及对比的差值，
+    之后的操作逐个执行，直接使用扫描结果；--explain及--profile时打印计划及实际遍历列的次数
+
+    :param table: 列式成绩表
+    :param args: 命令行参数
+    :param profiler: 各阶段的性能统计
+    :return: 返回值为None
+    """
+    from extract_highlight import HighlightRule, parse_highlights
+    from extract_plan import AFTER_REORDER, BEFORE_REORDER, PostProcessPlan
+    highlights = parse_highlights(getattr(args, "highlight", None))
+    # 只有xlsx能写条件格式，其他格式的标记写入元数据
+    mode = getattr(args, "highlight_mode", "static") if getattr(args, "output_format", "xlsx") == "xlsx" else "static"
+    if args.mark_column and mode == "conditional":
+        highlights = [HighlightRule("max", column) for column in args.mark_column] + highlights
+
+    plan = PostProcessPlan.build(args, mode, highlights)
+    explain = getattr(args, "explain", False) or profiler.enabled
+    if explain:
+        print(plan.explain())
+
+    with profiler.stage("infer_types"):
+        types = ColumnTypes.infer(table.headers, table.columns, parse_column_types(getattr(args, "column_type", None)))
+        table.convert_types(types)
+        profiler.add(rows=table.row_count, cells=table.row_count * len(table.columns))
+    print(types.summary())
+    scan_table(table, plan, BEFORE_REORDER, profiler)
+
+    if args.compare_nums:
+        try:
+            first_column = str(args.compare_nums[0])
+            second_column = str(args.compare_nums[1])
+            column_name = str(args.compare_nums[2])
+
+            with profiler.stage("compare_nums"):
+                table.compare(first_column, second_column, column_name)
+                profiler.add(rows=table.row_count, cells=table.row_count * 3)
+
+        except(ValueError, IndexError) as e:
+            print(f"参数错误：{str(e)}")
+            print("请使用格式：-cn <字符串> <字符串> <字符串>")
+
+    else:
+        print("已关闭对比")
+
+    if getattr(args, "join", None):
+        from extract_join import join_exams
+        join_exams(table, args, profiler)
+
+    if getattr(args, "rank_by", None) or getattr(args, "top_k", None):
+        rank_rows(table, args, profiler)
+    if AFTER_REORDER in plan.scans():
+        scan_table(table, plan, AFTER_REORDER, profiler)
+
+    if args.rank_number:
+        with profiler.stage("range_by_num"):
+            table.add_rank()
+            profiler.add(rows=table.row_count, cells=table.row_count)
+        print("已启用排序，排序放置在新的最后一列")
+    else:
+        print("已关闭排序")
+
+    if args.calc_total_average_column:
+        try:
+            with profiler.stage("calc_average"):
+                table.average(args.calc_total_average_column, args.calc_total_average_mode)
+                profiler.add(rows=table.row_count, cells=table.row_count * len(args.calc_total_average_column))
+        except (ValueError, IndexError):
+            print("计算平均值时，列或者模式输入错误！请您重新输入！")
+        else:
+            print(f"已完成计算平均值，进行了{len(args.calc_total_average_column)}计算")
+
+    if args.mark_column and mode == "static":
+        try:
+            with profiler.stage("mark_scores"):
+                marked_times = table.mark_max(args.mark_column)
+                profiler.add(rows=table.row_count, cells=table.row_count * len(args.mark_column))
+
+        except (ValueError, IndexError):
+            print("在标记过程中，您的输入有误！请确认后重新输入")
+
+        else:
+
+            print(f"工作表中有{marked_times}次标记")
+
+    if highlights:
+        try:
+            with profiler.stage("mark_scores"):
+                marked_times = table.highlight(highlights, mode, parse_full_scores(args.full_score), args.pass_ratio)
+                profiler.add(rows=table.row_count, cells=table.row_count * len(highlights))
+        except (ValueError, IndexError) as e:
+            print(f"高亮失败：{e}")
+        else:
+            if mode == "conditional":
+                print(f"已添加{marked_times}条条件格式规则，由Excel打开时标记")
+            else:
+                print(f"工作表中有{marked_times}次标记")
+
+    if getattr(args, "group_stats", None):
+        try:
+            with profiler.stage("group_stats"):
+                table.stats = table.group_statistics(args.group_stats, args.stats_by, args.stats_metrics,
+                                                     parse_full_scores(args.full_score), args.pass_ratio,
+                                                     args.excellent_ratio, args.calc_total_average_mode == "normal no zero")
+                profiler.add(rows=table.row_count, cells=table.row_count * (len(args.group_stats) + len(args.stats_by)))
+        except (ValueError, IndexError) as e:
+            print(f"分组统计失败：{e}")
+        else:
+            print(f"已完成分组统计，共{len(table.stats.records)}条统计结果")
+
+    if explain:
+        # 实际的遍历次数包括扫描时还不存在、用到时才读取的列（如对比新增的列）及连接读取的科目
+        print(f"后续处理实际遍历列{table.passes}次（逐个操作需{plan.operation_passes()}次）")
+
+
+def build_output(layout: SheetLayout, rows: Iterable[list], args: argparse.Namespace, sheet: str = None, wb: Workbook = None, profiler: StageProfiler = NULL_PROFILER) -> Tuple[Union[Workbook, TabularExport], int]:
+    """
+    由筛选出的学生成绩生成输出工作簿（尚未保存）
+
+    输出格式为csv、jsonl或parquet时生成TabularExport，同样交由WorkbookSession保存
+
+    :param layout: 源工作表版式信息
+    :param rows: 学生成绩
+    :param args: 命令行参数
+    :param sheet: 输出工作表名称，默认与标题相同
+    :param wb: 已有的只写模式工作簿，给出时在其中新建工作表
+    :param profiler: 各阶段的性能统计
+    :return: 输出工作簿，数据行数
+    """
+    sheet = sheet or args.title
+    width = len(layout.sub_title_dict)
+    output_format = getattr(args, "output_format", "xlsx")
+
+    if not needs_post_processing(args):
+        # 无需后续处理时，抽样前几行推断列类型，之后边转化边以只写模式追加整行
+        if getattr(args, "explain", False):
+            print("后续处理计划：无需后续处理，数据行边转化边写出")
+        with profiler.stage("infer_types"):
+            types, rows = sample_column_types(list(layout.sub_title_dict.values()), rows, getattr(args, "column_type", None))
+        with profiler.stage("write_rows"):
+            if output_format != "xlsx":
+                wb = TabularExport(output_format, column_names(list(layout.sub_title_dict.values()), layout.heading_three),
+                                   types.convert_rows(rows), _export_metadata(layout, args))
+                row_count = wb.row_count
+            else:
+                wb, row_count = create_streaming_workbook(sheet, layout.max_column, layout.start_cell, args.title, layout.sub_title_dict, layout.heading_three, layout.title_exist, layout.heading_three_exist, types.convert_rows(rows), wb)
+            profiler.add(rows=row_count, cells=row_count * width)
+        print(types.summary())
+        return wb, row_count
+
+    # 需要后续处理时，先将提取的数据载入列式表，整列运算后一次写回
+    with profiler.stage("load_table"):
+        table = ScoreTable.from_rows(rows, list(layout.sub_title_dict.values()), layout.heading_three)
+        profiler.add(rows=table.row_count, cells=table.row_count * width)
+    post_process(table, args, profiler)
+    with profiler.stage("write_rows"):
+        if output_format != "xlsx":
+            wb = table.to_export(output_format, _export_metadata(layout, args))
+        else:
+            wb = table.to_workbook(sheet, args.title, layout.title_exist, args.mark_color, wb)
+        profiler.add(rows=table.row_count, cells=table.row_count * len(table.columns))
+    return wb, table.row_count
+
+
+def _export_metadata(layout: SheetLayout, args: argparse.Namespace) -> dict:
+    """
+    非Excel输出格式的元数据：标题、源表头及次表头、筛选条件
+    """
+    return {
+        "title": args.title,
+        "title_exist": layout.title_exist,
+        "source_title": layout.title,
+        "headers": list(layout.sub_title_dict.values()),
+        "heading_three": list(layout.heading_three) if layout.heading_three_exist else [],
+        "school": args.school,
+        "class": args.classr,
+    }
+
+
+def run_extract(input_workbook: str, new_workbook: str, args: argparse.Namespace, interactive: bool = True,
+                sheet_cache: SheetLRU = None, row_cache: dict = None) -> dict:
+    """
+    对一个工作簿完成提取、处理及保存的全过程
+
+    :param input_workbook: 源工作簿路径
+    :param new_workbook: 输出工作簿路径
+    :param args: 命令行参数
+    :param interactive: 有多个候选工作表时是否询问用户
+    :param sheet_cache: 守护进程中的内存缓存
+    :param row_cache: 监视模式中输出路径到上次提取的行哈希的字典，数据行全部未改变且输出仍存在时不再处理及写出，
+        否则重新处理并写出整个输出
+    :return: 本次处理的摘要
+    """
+    start_time = time.perf_counter()
+    profiler = make_profiler(args)
+
+    # 源工作簿只解析一次，输出工作簿只保存一次，各阶段共用内存中的工作簿
+    with WorkbookSession(input_workbook, new_workbook, read_only=args.stream, profiler=profiler,
+                         fast_reader=args.fast_reader) as session:
+        input_sheet, layout, rows = extract_rows(session, args, interactive, sheet_cache)
+        summary = {"source": input_workbook, "sheet": input_sheet, "output": new_workbook}
+
+        hashes = None
+        if row_cache is not None:
+            from extract_watch import compare_rows, row_hashes
+            with profiler.stage("compare_rows"):
+                rows = list(rows)
+                hashes = row_hashes(rows)
+                changes = compare_rows(row_cache.get(new_workbook), hashes)
+            if changes.unchanged and os.path.exists(new_workbook):
+                print(f"{input_sheet}的{len(rows)}行学生成绩与上次提取相同，不再处理及写出")
+                summary.update(rows=len(rows), loads=session.load_count, saves=0, skipped=True,
+                               seconds=round(time.perf_counter() - start_time, 3))
+                return summary
+            print(f"与上次提取相比新增或改变{changes.added}行，删除{changes.removed}行，重新处理并写出整个输出")
+
+        session.output, row_count = build_output(layout, rows, args, profiler=profiler)
+        with profiler.stage("save"):
+            session.save()
+        if hashes is not None:
+            row_cache[new_workbook] = hashes
+        print("已成功创建新文件")
+        print(session.report())
+        report_profile(profiler, args)
+
+        summary.update(rows=row_count, loads=session.load_count, saves=session.save_count,
+                       seconds=round(time.perf_counter() - start_time, 3))
+        return summary
+
+
+def table_layout(title: str, headers: list, row_count: int) -> SheetLayout:
+    """
+    不来自工作表的数据（如成绩库的历史查询）的版式：第1行为标题，第2行为表头，之后为数据行
+    """
+    return SheetLayout(max_row=row_count + 2, max_column=len(headers), start_cell="A1", title_row_size=1,
+                       title_col_size=len(headers), title=title, title_exist=True, sub_title_place="A2",
+                       sub_title_dict={f"{get_column_letter(index + 1)}2": header for index, header in enumerate(headers)},
+                       heading_three=[], heading_three_exist=False)
+
+
+def validate_args(args: argparse.Namespace) -> None:
+    """
+    检查输出格式、列类型、满分及高亮规则等参数，有误时抛出ValueError
+    """
+    from extract_highlight import parse_highlights
+    from extract_where import parse_where
+    check_format(args.output_format)
+    parse_column_types(args.column_type)
+    parse_full_scores(args.full_score)
+    parse_highlights(args.highlight)
+    if args.where:
+        parse_where(args.where)
+    if args.exam_date:
+        from extract_warehouse import exam_date
+        exam_date(args.exam_date)
+    if args.watch and (args.batch or args.split_by):
+        raise ValueError("--watch不能与--batch、--split-by同时使用")
+    if args.all_sheets and (args.sheet or args.batch or args.split_by or args.watch):
+        raise ValueError("--all-sheets不能与--sheet、--batch、--split-by、--watch同时使用")
+    warehouse_modes = [name for name, value in (("--ingest", args.ingest), ("--from-warehouse", args.from_warehouse),
+                                                ("--history", args.history)) if value]
+    if len(warehouse_modes) > 1:
+        raise ValueError(f"{'、'.join(warehouse_modes)}不能同时使用")
+    if warehouse_modes and (args.batch or args.split_by or args.watch):
+        raise ValueError(f"{warehouse_modes[0]}不能与--batch、--split-by、--watch同时使用")
+    if args.from_warehouse and args.all_sheets:
+        raise ValueError("--from-warehouse不能与--all-sheets同时使用")
+    if (args.sketch or args.merge_sketches) and (args.split_by or args.watch or args.all_sheets or args.ingest or args.history):
+        raise ValueError("--sketch、--merge-sketches不能与--split-by、--watch、--all-sheets、--ingest、--history同时使用")
+    if args.merge_sketches and (args.batch or args.from_warehouse):
+        raise ValueError("--merge-sketches不能与--batch、--from-warehouse同时使用")
+    if any(not 0 <= quantile <= 100 for quantile in args.quantiles):
+        raise ValueError("--quantiles应为0到100之间的百分数")
+    if args.sketch_k < 8 or args.sketch_bin <= 0:
+        raise ValueError("--sketch-k应不小于8，--sketch-bin应大于0")
+
+
+def run_cli(args: argparse.Namespace) -> None:
+    """
+    按解析好的命令行参数运行：批量、分组输出或单个工作簿的提取
+
+    :param args: 命令行参数
+    :return: 返回值为None
+    """
+    try:
+        validate_args(args)
+    except ValueError as e:
+        print(f"错误：{e}")
+        return
+
+    # 成绩库及摘要文件路径相对于当前目录，get_workbook会切换到-d目录
+    args.warehouse = os.path.abspath(args.warehouse)
+    if args.sketch:
+        args.sketch = os.path.abspath(args.sketch)
+
+    if args.merge_sketches:
+        from extract_sketch import run_merge_sketches
+        try:
+            run_merge_sketches(args)
+        except ValueError as e:
+            print(f"合并摘要失败：{e}")
+        return
+
+    if args.history or args.from_warehouse:
+        try:
+            if args.history:
+                from extract_warehouse import run_history
+                run_history(args)
+            elif args.sketch:
+                from extract_sketch import run_sketch, save_sketch_report
+                sketches, _ = run_sketch(args.warehouse, args, args.sketch)
+                save_sketch_report(sketches, output_file(args.filename, args.output_format), args)
+            else:
+                run_extract(args.warehouse, output_file(args.filename, args.output_format), args)
+        except ValueError as e:
+            print(f"提取失败：{e}")
+        return
+
+    if args.watch:
+        from extract_watch import run_watch
+        run_watch(args)
+        return
+
+    if args.batch:
+        from extract_batch import run_batch
+        run_batch(args)
+        return
+
+    input_workbook = get_workbook(args.subject, args.directory)
+
+    if args.split_by:
+        from extract_batch import run_split
+        try:
+            run_split(input_workbook, args)
+        except ValueError as e:
+            print(f"分组输出失败：{e}")
+        return
+
+    if args.ingest:
+        from extract_warehouse import run_ingest
+        try:
+            run_ingest(input_workbook, args)
+        except ValueError as e:
+            print(f"导入失败：{e}")
+        return
+
+    if args.all_sheets:
+        from extract_batch import run_all_sheets
+        try:
+            run_all_sheets(input_workbook, args)
+        except ValueError as e:
+            print(f"提取失败：{e}")
+        return
+
+    if args.sketch:
+        from extract_sketch import run_sketch, save_sketch_report
+        try:
+            sketches, _ = run_sketch(input_workbook, args, args.sketch)
+            print(f"摘要已保存为{args.sketch}")
+            save_sketch_report(sketches, output_file(args.filename, args.output_format), args)
+        except ValueError as e:
+            print(f"统计失败：{e}")
+        return
+
+    try:
+        run_extract(input_workbook, output_file(args.filename, args.output_format), args)
+    except ValueError as e:
+        print(f"提取失败：{e}")
@@ -0,0 +1,163 @@
+"""
+后续处理的执行计划
+
+把命令行要求的后续处理操作按执行顺序收集为计划，找出各操作读取的列。每个扫描阶段对这些列逐行遍历一次
+（ScoreTable.scan），同时求出数值视图（排名、前k名及高亮的输入）、计数、求和及最大值（平均值及最大值标记使用）
+和对比的差值，各操作之后直接使用，不再各自读取整列。连接及分组统计仍各自处理整列。
+按名次选取前k名或重新排序会改变行，之后的操作需要再扫描一次。
+
+逐个操作单独执行时，每个操作都要读取它用到的列：求数值视图、求汇总（计数、求和及最大值）、求差值各遍历一次
+（PlanStep.passes）；合并后每个扫描阶段只遍历一次。--explain及--profile打印计划及节省的遍历次数。
+"""
+import argparse
+from typing import List, NamedTuple
+
+# 两个扫描阶段：行改变（选取前k名、按名次排序）之前及之后
+BEFORE_REORDER, AFTER_REORDER = 0, 1
+
+
+class PlanStep(NamedTuple):
+    """
+    计划中的一项操作
+
+    phase为所在的扫描阶段，columns为需要扫描的列（表头名称或列字母），pair为对比的两列，
+    separate表示这一步不使用扫描结果、单独处理整列，reorder表示这一步改变了行，之后的操作属于下一个扫描阶段，
+    passes为这一步单独执行时逐行遍历列的次数
+    """
+    name: str
+    phase: int
+    columns: tuple = ()
+    separate: bool = False
+    reorder: bool = False
+    pair: tuple = ()
+    passes: int = 0
+
+
+class PostProcessPlan:
+    """
+    按命令行参数收集的后续处理操作，按执行顺序排列
+    """
+
+    def __init__(self, steps: List[PlanStep]):
+        self.steps = steps
+
+    @classmethod
+    def build(cls, args: argparse.Namespace, highlight_mode: str, highlights: list) -> "PostProcessPlan":
+        """
+        :param args: 命令行参数
+        :param highlight_mode: 实际使用的高亮方式，conditional或static
+        :param highlights: 高亮规则，conditional模式下已包含-mn的最大值规则
+        :return: 执行计划
+        """
+        steps = []
+        phase = BEFORE_REORDER
+
+        def add(name: str, columns=(), separate: bool = False, reorder: bool = False, pair: tuple = (),
+                passes: int = 0) -> None:
+            steps.append(PlanStep(name, phase, tuple(str(column) for column in columns), separate, reorder,
+                                  tuple(str(column) for column in pair), passes))
+
+        add("类型转化")
+        if args.compare_nums:
+            first, second, name = args.compare_nums
+            # 两列的数值视图及差值
+            add(f"对比：{second} - {first} → {name}", (first, second), pair=(first, second), passes=len({first, second}) + 1)
+        for item in getattr(args, "join", None) or []:
+            add(f"与{item}连接", getattr(args, "join_subjects", None) or (), separate=True)
+
+        rank_by = getattr(args, "rank_by", None) or []
+        for column in rank_by:
+            add(f"排名：{column}（{args.rank_within}内，排序）", (column,), passes=1)
+        if getattr(args, "top_k", None):
+            key = rank_by[0] if rank_by else args.top_k_by
+            add(f"选取每组前{args.top_k}名：{key}", (key,), reorder=True, passes=1)
+            phase = AFTER_REORDER
+        elif rank_by and getattr(args, "sort_by_rank", False):
+            add(f"按{rank_by[0]}排序输出", (rank_by[0],), reorder=True, passes=1)
+            phase = AFTER_REORDER
+
+        if args.rank_number:
+            add("序号列")
+        if args.calc_total_average_column:
+            mode = "不计0分" if args.calc_total_average_mode == "normal no zero" else "计入0分"
+            # 每列的数值视图及汇总
+            add(f"平均值：{'、'.join(args.calc_total_average_column)}（{mode}）", args.calc_total_average_column,
+                passes=2 * len(args.calc_total_average_column))
+        if args.mark_column and highlight_mode == "static":
+            add(f"最大值标记：{'、'.join(args.mark_column)}", args.mark_column, passes=2 * len(args.mark_column))
+        if highlights:
+            columns = [rule.column for rule in highlights]
+            if highlight_mode == "static":
+                # 最大值规则使用汇总中的最大值，其余规则只用数值视图
+                add(f"高亮：{'、'.join(columns)}", columns,
+                    passes=sum(2 if rule.kind == "max" else 1 for rule in highlights))
+            else:
+                add(f"高亮写为条件格式：{'、'.join(columns)}")
+        if getattr(args, "group_stats", None):
+            add(f"分组统计：{'、'.join(args.group_stats)}", separate=True)
+        add("写出：数据与标记一次写出", separate=True)
+        return cls(steps)
+
+    def scan_columns(self, phase: int) -> list:
+        """
+        一个扫描阶段需要扫描的列，按首次出现的顺序
+        """
+        columns = []
+        for step in self.steps:
+            if step.phase == phase:
+                columns += [column for column in step.columns if column not in columns]
+        return columns
+
+    def compare_pairs(self, phase: int) -> list:
+        """
+        一个扫描阶段中对比的（第一列，第二列），差值在扫描时一并求出
+        """
+        return [step.pair for step in self.steps if step.phase == phase and step.pair]
+
+    def scans(self) -> list:
+        """
+        需要进行的扫描阶段：第一个阶段总要进行类型转化，重排行之后的阶段只在有列需要扫描时进行
+        """
+        return [BEFORE_REORDER] + ([AFTER_REORDER] if self.scan_columns(AFTER_REORDER) else [])
+
+    def operation_passes(self) -> int:
+        """
+        各操作单独执行时逐行遍历列的总次数
+        """
+        return sum(step.passes for step in self.steps)
+
+    def scan_passes(self) -> int:
+        """
+        合并扫描的遍历次数：每个有列需要扫描的阶段一次
+        """
+        return sum(1 for phase in self.scans() if self.scan_columns(phase))
+
+    def explain(self) -> str:
+        """
+        计划的文字说明
+        """
+        lines = ["后续处理计划："]
+        scans = self.scans()
+        for phase in (BEFORE_REORDER, AFTER_REORDER):
+            steps = [step for step in self.steps if step.phase == phase]
+            if not steps:
+                continue
+            if phase in scans:
+                columns = self.scan_columns(phase)
+                what = "类型转化，" if phase == BEFORE_REORDER else ""
+                read = f"一次遍历求出{'、'.join(columns)}的数值、计数、求和及最大值" if columns else "无需读取数值列"
+                pairs = self.compare_pairs(phase)
+                if pairs:
+                    read += "及" + "、".join(f"{second} - {first}" for first, second in pairs) + "的差值"
+                lines.append(f"  扫描{scans.index(phase) + 1}：{what}{read}")
+            for step in steps:
+                if step.name != "类型转化":
+                    note = "单独处理" if step.separate else ("使用扫描结果" if step.columns else "无需读取数值")
+                    if step.reorder:
+                        note += "，改变行"
+                    lines.append(f"    {step.name}  [{note}]")
+        operation_passes, scan_passes = self.operation_passes(), self.scan_passes()
+        if operation_passes:
+            lines.append(f"  逐个操作需遍历列{operation_passes}次，合并扫描遍历{scan_passes}次，"
+                         f"节省{max(operation_passes - scan_passes, 0)}次")
+        return "\n".join(lines)
@@ -0,0 +1,128 @@
+"""
+各处理阶段的性能统计（--profile、--profile-json、--profile-cprofile）
+"""
+import argparse, contextlib, cProfile, json, pstats, time
+
+
+class StageProfiler:
+    """
+    记录各处理阶段的耗时、工作簿加载及保存次数、处理的行数和单元格数、读写字节数
+
+    未启用时stage直接返回空的上下文管理器，add也立即返回，几乎没有额外开销
+    """
+
+    FIELDS = ("wall", "cpu", "calls", "loads", "saves", "rows", "cells", "bytes_read", "bytes_written")
+    _NULL_STAGE = contextlib.nullcontext()
+
+    def __init__(self, enabled: bool = False, cprofile: bool = False):
+        """
+        :param enabled: 是否启用
+        :param cprofile: 是否对每个阶段运行cProfile，以便导出最慢阶段的详细统计
+        """
+        self.enabled = enabled or cprofile
+        self.cprofile = cprofile
+        self.stages = {}
+        self._current = None
+        self._profiles = {}
+
+    def stage(self, name: str):
+        """
+        计时一个阶段，用法：with profiler.stage("filter"): ...
+        """
+        if not self.enabled:
+            return self._NULL_STAGE
+        return self._measure(name)
+
+    @contextlib.contextmanager
+    def _measure(self, name: str):
+        record = self.stages.setdefault(name, dict.fromkeys(self.FIELDS, 0))
+        previous, self._current = self._current, name
+        profile = self._profiles.setdefault(name, cProfile.Profile()) if self.cprofile else None
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            record["wall"] += time.perf_counter() - start_wall
+            record["cpu"] += time.process_time() - start_cpu
+            record["calls"] += 1
+            self._current = previous
+
+    def add(self, **counts) -> None:
+        """
+        给当前阶段累加计数，如 profiler.add(rows=100, cells=800)
+        """
+        if not self.enabled:
+            return
+        record = self.stages.setdefault(self._current or "其他", dict.fromkeys(self.FIELDS, 0))
+        for key, value in counts.items():
+            record[key] += value
+
+    def slowest(self) -> str:
+        return max(self.stages, key=lambda name: self.stages[name]["wall"]) if self.stages else ""
+
+    def report(self) -> str:
+        """
+        以表格形式返回各阶段的统计
+        """
+        header = f"{'阶段':<16}{'墙钟(s)':>10}{'CPU(s)':>10}{'次数':>6}{'加载':>6}{'保存':>6}{'行数':>10}{'单元格':>12}{'读取字节':>14}{'写入字节':>14}"
+        lines = [header, "-" * len(header)]
+        total = dict.fromkeys(self.FIELDS, 0)
+        for name, record in self.stages.items():
+            lines.append(f"{name:<16}{record['wall']:>10.4f}{record['cpu']:>10.4f}{record['calls']:>6}{record['loads']:>6}{record['saves']:>6}"
+                         f"{record['rows']:>10}{record['cells']:>12}{record['bytes_read']:>14}{record['bytes_written']:>14}")
+            for key in self.FIELDS:
+                total[key] += record[key]
+        lines.append("-" * len(header))
+        lines.append(f"{'合计':<16}{total['wall']:>10.4f}{total['cpu']:>10.4f}{total['calls']:>6}{total['loads']:>6}{total['saves']:>6}"
+                     f"{total['rows']:>10}{total['cells']:>12}{total['bytes_read']:>14}{total['bytes_written']:>14}")
+        return "\n".join(lines)
+
+    def to_json(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"stages": self.stages, "slowest": self.slowest()}, file, ensure_ascii=False, indent=2)
+
+    def dump_slowest(self, path: str) -> str:
+        """
+        将最慢阶段的cProfile统计写入文件，可用 python -m pstats 查看
+
+        :param path: 输出文件路径
+        :return: 最慢阶段的名称
+        """
+        name = self.slowest()
+        if name in self._profiles:
+            pstats.Stats(self._profiles[name]).dump_stats(path)
+        return name
+
+
+NULL_PROFILER = StageProfiler()
+
+
+def make_profiler(args: argparse.Namespace) -> StageProfiler:
+    """
+    按命令行参数创建性能统计，未要求时返回不做任何记录的NULL_PROFILER
+    """
+    profile_json = getattr(args, "profile_json", None)
+    profile_cprofile = getattr(args, "profile_cprofile", None)
+    if not (getattr(args, "profile", False) or profile_json or profile_cprofile):
+        return NULL_PROFILER
+    return StageProfiler(enabled=True, cprofile=bool(profile_cprofile))
+
+
+def report_profile(profiler: StageProfiler, args: argparse.Namespace) -> None:
+    """
+    打印各阶段的统计表，并按参数写入JSON及最慢阶段的cProfile统计
+    """
+    if not profiler.enabled:
+        return
+
+    print(profiler.report())
+    if getattr(args, "profile_json", None):
+        profiler.to_json(args.profile_json)
+        print(f"性能统计已写入{args.profile_json}")
+    if getattr(args, "profile_cprofile", None):
+        name = profiler.dump_slowest(args.profile_cprofile)
+        print(f"最慢的阶段是{name}，其cProfile统计已写入{args.profile_cprofile}")
@@ -0,0 +1,340 @@
+"""
+常驻的本地提取服务
+
+网页等调用方每小时对同样几个工作簿调用数百次，每次启动命令行都要重新启动Python、导入openpyxl并完整解析工作簿。
+守护进程只启动一次，解析得到的工作表（版式及数据行）保存在按最近使用淘汰的内存缓存中，
+以文件大小及修改时间判断源工作簿是否改变；提取请求通过本机的HTTP端口或Unix套接字发送，每个请求在单独的线程中处理。
+服务只监听本机回环地址；请求不能使用缓存目录、清空缓存及启动守护进程等选项，请求的-d目录必须位于启动时的
+--serve-root目录内，输出等路径必须位于-d目录内。
+
+协议：
+    POST /extract   请求体为JSON，{"argv": [与命令行相同的参数]}，返回处理摘要及处理过程的输出
+    GET  /status    返回缓存的条目数、命中及未命中次数
+"""
+import contextlib, io, ipaddress, json, os, socket, socketserver, stat, sys, threading, time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Tuple
+
+
+class SheetLRU:
+    """
+    解析结果的内存缓存，按最近使用淘汰，条目以（文件绝对路径，工作表键）区分，
+    文件大小或修改时间改变时重新解析；同一条目同时只解析一次，其他请求等待其结果
+    """
+
+    def __init__(self, max_entries: int = 8):
+        """
+        :param max_entries: 最多保留的工作表数
+        """
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: tuple, signature: tuple):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == signature:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        return None
+
+    def get_or_load(self, path: str, sheet_key: tuple, loader: Callable[[], tuple]) -> Tuple[tuple, bool]:
+        """
+        取出缓存的解析结果，没有或文件已改变时调用loader解析
+
+        :param path: 源工作簿路径
+        :param sheet_key: 区分同一工作簿中不同解析方式的键，如（工作表，模式）
+        :param loader: 解析函数，返回需要缓存的值
+        :return: 缓存的值，是否命中
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        key = (path, sheet_key)
+
+        with self._lock:
+            entry = self._lookup(key, signature)
+            if entry is not None:
+                return entry[1], True
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                entry = self._lookup(key, signature)
+                if entry is not None:
+                    return entry[1], True
+
+            value = loader()
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = (signature, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                self._loading.pop(key, None)
+        return value, False
+
+    def status(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses,
+                    "sheets": [{"path": path, "key": list(sheet_key)} for path, sheet_key in self._entries]}
+
+
+class ThreadOutput(io.TextIOBase):
+    """
+    按线程分流的输出：capture期间当前线程的输出写入各自的缓冲区，其他输出照常写入原来的流，
+    使并发处理的请求不会混在一起
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        buffer = getattr(self._local, "buffer", None)
+        return (buffer if buffer is not None else self._stream).write(text)
+
+    def flush(self) -> None:
+        if getattr(self._local, "buffer", None) is None:
+            self._stream.flush()
+
+    @contextlib.contextmanager
+    def capture(self, buffer: io.StringIO = None):
+        buffer = buffer if buffer is not None else io.StringIO()
+        self._local.buffer = buffer
+        try:
+            yield buffer
+        finally:
+            self._local.buffer = None
+
+
+def capture_output():
+    """
+    将sys.stdout、sys.stderr换为ThreadOutput（只换一次），返回当前线程的捕获上下文，用法：
+    with capture_output() as buffer: ...
+    """
+    for name in ("stdout", "stderr"):
+        if not isinstance(getattr(sys, name), ThreadOutput):
+            setattr(sys, name, ThreadOutput(getattr(sys, name)))
+
+    @contextlib.contextmanager
+    def both():
+        with sys.stdout.capture() as buffer, sys.stderr.capture(buffer):
+            yield buffer
+    return both()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "CommandLineExtractTool"
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/status":
+            self._reply(200, self.server.report_status())
+        else:
+            self._reply(404, {"status": "failed", "error": f"未知的路径{self.path}"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/extract":
+            self._reply(404, {"status": "failed", "error": f"未知的路径{self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length).decode("utf-8"))
+            if not isinstance(request, dict):
+                raise ValueError("请求体应为JSON对象")
+        except (ValueError, UnicodeDecodeError) as e:
+            self._reply(400, {"status": "failed", "error": f"无法解析请求：{e}"})
+            return
+        result = self.server.extract(request)
+        self._reply(200 if result.get("status") == "ok" else 400, result)
+
+    def _reply(self, code: int, payload: dict) -> None:
+        data = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self) -> str:
+        # Unix套接字没有客户端地址
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "local"
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _TCPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class _TCP6Server(_TCPServer):
+    address_family = socket.AF_INET6
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def loopback_host(host: str) -> str:
+    """
+    检查监听的主机是本机回环地址（localhost、127.0.0.0/8或::1），空主机为127.0.0.1
+
+    :param host: 主机名或IP地址，IPv6地址可带方括号
+    :return: 用于绑定的主机，不是回环地址时抛出ValueError
+    """
+    host = host.strip("[]") or "127.0.0.1"
+    if host == "localhost":
+        return host
+    try:
+        loopback = ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        loopback = False
+    if not loopback:
+        raise ValueError(f"提取服务只能监听本机回环地址（如127.0.0.1、::1），不能使用{host}")
+    return host
+
+
+def make_server(address: str, handle: Callable[[dict], dict], status: Callable[[], dict]):
+    """
+    创建服务，地址为“主机:端口”（只能是本机回环地址）或“unix:套接字路径”
+
+    :param address: 监听地址
+    :param handle: 处理一个提取请求，返回结果字典（status为ok表示成功）
+    :param status: 返回服务状态
+    :return: socketserver服务，调用serve_forever开始处理请求
+    """
+    if address.startswith("unix:"):
+        path = address[len("unix:"):]
+        if not hasattr(socketserver, "UnixStreamServer"):
+            raise ValueError("当前系统不支持Unix套接字，请使用“主机:端口”")
+        if os.path.lexists(path):
+            # 只删除上次留下的套接字，其他文件（如输错的路径）不删除
+            if not stat.S_ISSOCK(os.lstat(path).st_mode):
+                raise ValueError(f"{path}已存在且不是套接字")
+            os.remove(path)
+        server = _UnixServer(path, _Handler)
+    else:
+        host, sep, port = address.rpartition(":")
+        if not sep or not port.isdigit():
+            raise ValueError(f"无法解析地址{address}，请使用“主机:端口”或“unix:套接字路径”")
+        host = loopback_host(host)
+        server = (_TCP6Server if ":" in host else _TCPServer)((host, int(port)), _Handler)
+    server.extract = handle
+    server.report_status = status
+    return server
+
+
+# 只应由本机命令行使用的选项，提取请求中出现时直接拒绝
+SERVICE_REJECTED_OPTIONS = ("--serve", "--serve-cache", "--serve-root", "--clear-cache", "--cache-dir", "--cache-size", "--cache", "-ca")
+
+
+def inside_directory(directory: str, path: str, option: str) -> str:
+    """
+    将提取请求中的路径限制在目录内：相对路径相对于该目录，解析符号链接后仍须位于其中
+
+    :param directory: 守护进程的根目录，或已限制在根目录内的-d目录
+    :param path: 请求中给出的路径
+    :param option: 路径所属的选项，用于错误信息
+    :return: 位于目录内的绝对路径，否则抛出ValueError
+    """
+    root = os.path.realpath(directory)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise ValueError(f"{option}的路径{path}不在{directory}目录内")
+    return resolved
+
+
+def handle_service_request(request: dict, sheet_cache: SheetLRU, root: str = ".") -> dict:
+    """
+    守护进程中处理一个提取请求，参数与命令行相同，源工作簿在-d目录中按科目非交互地查找
+
+    请求由不含缓存、守护进程等选项的解析器解析，解析时不会执行任何操作。-d目录由请求给出，
+    因此先将其限制在守护进程启动时确定的根目录内（相对路径相对于根目录），输出工作簿、连接的工作簿、
+    成绩库及性能统计文件再限制在-d目录内。任何异常都作为失败的结果返回
+
+    :param request: {"argv": [命令行参数]}
+    :param sheet_cache: 内存缓存
+    :param root: 守护进程的根目录（--serve-root）
+    :return: 处理摘要，status为ok或failed，log为处理过程的输出
+    """
+    import traceback
+    from CommandLineExtractTool import build_parser
+    from extract_batch import find_batch_workbooks
+    from extract_formats import output_file
+    from extract_join import resolve_join_source
+    from extract_pipeline import run_extract, validate_args
+
+    start_time = time.perf_counter()
+    result = {"status": "failed"}
+    with capture_output() as log:
+        try:
+            argv = request.get("argv")
+            if not isinstance(argv, list) or not all(isinstance(item, str) for item in argv):
+                raise ValueError("argv应为字符串列表")
+            rejected = [item for item in argv if item.split("=", 1)[0] in SERVICE_REJECTED_OPTIONS]
+            if rejected:
+                raise ValueError(f"提取请求不支持{'、'.join(rejected)}")
+            try:
+                args = build_parser(service=True).parse_args(argv)
+            except SystemExit:
+                raise ValueError("参数错误")
+            validate_args(args)
+            if (args.batch or args.split_by or args.watch or args.all_sheets or args.sketch or args.merge_sketches
+                    or args.ingest or args.history):
+                raise ValueError("守护进程只处理单个工作表的提取，不支持--batch、--split-by、--watch、--all-sheets、--sketch、--ingest、--history")
+
+            args.directory = inside_directory(root, args.directory, "-d")
+            workbooks = find_batch_workbooks(args.directory, args.subject)
+            if len(workbooks) != 1:
+                raise ValueError(f"{args.directory}中有{len(workbooks)}个{args.subject}类工作簿，应恰好有1个")
+            new_workbook = inside_directory(args.directory, output_file(args.filename, args.output_format), "filename")
+            args.warehouse = inside_directory(args.directory, args.warehouse, "--warehouse")
+            for option in ("profile_json", "profile_cprofile"):
+                if getattr(args, option):
+                    setattr(args, option, inside_directory(args.directory, getattr(args, option), "--" + option.replace("_", "-")))
+            if args.join:
+                args.join = [inside_directory(args.directory, resolve_join_source(item, args.subject, args.directory), "--join")
+                             for item in args.join]
+
+            result = run_extract(workbooks[0], new_workbook, args, interactive=False, sheet_cache=sheet_cache)
+            result["status"] = "ok"
+        except (ValueError, IndexError, OSError, SystemExit) as e:
+            result = {"status": "failed", "error": str(e) or "".join(log.getvalue().strip().splitlines()[-1:])}
+        except Exception as e:
+            # 未预料的错误同样返回结果，调用方总能收到回复，详细信息写入log
+            traceback.print_exc()
+            result = {"status": "failed", "error": f"处理请求时发生未知错误：{e!r}"}
+    result["log"] = log.getvalue()
+    result["seconds"] = round(time.perf_counter() - start_time, 3)
+    return result
+
+
+def run_service(address: str, cache_entries: int, root: str = ".") -> None:
+    """
+    启动守护进程，直到按Ctrl+C结束
+
+    :param address: 监听地址，“主机:端口”或“unix:套接字路径”
+    :param cache_entries: 内存缓存最多保留的工作表数
+    :param root: 请求允许访问的根目录，启动时解析为绝对路径，之后不随请求改变
+    """
+    root = os.path.realpath(root)
+    if not os.path.isdir(root):
+        raise ValueError(f"根目录{root}不存在")
+    sheet_cache = SheetLRU(cache_entries)
+    server = make_server(address, lambda request: handle_service_request(request, sheet_cache, root), sheet_cache.status)
+    print(f"提取服务已在{address}启动，根目录为{root}，POST /extract 提交请求，GET /status 查看缓存")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("提取服务已停止")
+    finally:
+        server.server_close()
@@ -0,0 +1,563 @@
+"""
+可合并的流式统计
+
+全区报表需要汇总数百个工作簿的分位数及分数分布，数据多到无法一次载入内存。这里每个（分组层级，分组，科目）
+保存一份大小有上限的摘要：人数、总分、平方和、最低分、最高分、及格及优秀人数、固定宽度的分数段人数都是精确的，
+分位数由KLL摘要近似给出（误差约为1.7/k的排名比例，k=200时约1%）。数据行只遍历一次，按块处理，
+每组的内存与行数无关；不同文件或进程得到的摘要可以合并，保存为JSON文件后也可以之后再合并，合并结果与一次处理所有数据相同
+（分位数在误差范围内）。
+"""
+import argparse, bisect, contextlib, glob, io, itertools, json, math, os, random, re, time
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+from extract_options import DEFAULT_QUANTILES
+from extract_stats import ALL_GROUP, MISSING_KEY, GroupStatistics
+
+# 摘要文件的格式版本
+SKETCH_VERSION = 1
+# 每次处理的行数
+CHUNK_SIZE = 8192
+
+
+def _score(value) -> Optional[float]:
+    """
+    分数转化为数字，字符串数字同样转化，其他值（空单元格、“缺考”、布尔值、NaN及无穷大）为None
+    """
+    if type(value) is int or type(value) is float:
+        return value if math.isfinite(value) else None
+    if isinstance(value, bool) or value is None:
+        return None
+    if not isinstance(value, (int, float)):
+        try:
+            value = float(str(value).strip())
+        except ValueError:
+            return None
+    return float(value) if math.isfinite(value) else None
+
+
+def _group_key(value) -> str:
+    return MISSING_KEY if value is None else str(value).strip() or MISSING_KEY
+
+
+class KLLSketch:
+    """
+    KLL分位数摘要：多层压缩器，第h层的每个值代表2**h个原始值，某层满时排序后随机保留奇数位或偶数位的值并上移一层
+    """
+
+    def __init__(self, k: int = 200, seed: int = 0):
+        """
+        :param k: 最高层的容量，越大越精确
+        :param seed: 压缩时随机选择的种子，使结果可以重现
+        """
+        self.k = k
+        self.count = 0
+        self.compactors = []
+        self.size = 0
+        self.max_size = 0
+        self._random = random.Random(seed)
+        self._grow()
+
+    def _grow(self) -> None:
+        self.compactors.append([])
+        self.max_size = sum(self._capacity(height) for height in range(len(self.compactors)))
+
+    def _capacity(self, height: int) -> int:
+        depth = len(self.compactors) - height - 1
+        return int(math.ceil((2 / 3) ** depth * self.k)) + 1
+
+    def _compress(self) -> None:
+        while self.size >= self.max_size:
+            for height, items in enumerate(self.compactors):
+                if len(items) >= self._capacity(height):
+                    if height + 1 >= len(self.compactors):
+                        self._grow()
+                    items.sort()
+                    # 个数为奇数时留下最大的一个
+                    kept = [items.pop()] if len(items) % 2 else []
+                    self.compactors[height + 1].extend(items[self._random.random() < 0.5::2])
+                    items[:] = kept
+                    break
+            self.size = sum(len(items) for items in self.compactors)
+
+    def update(self, values: Iterable[float]) -> None:
+        """
+        加入一批值
+        """
+        values = list(values)
+        self.compactors[0].extend(values)
+        self.count += len(values)
+        self.size += len(values)
+        if self.size >= self.max_size:
+            self._compress()
+
+    def merge(self, other: "KLLSketch") -> None:
+        while len(self.compactors) < len(other.compactors):
+            self._grow()
+        for height, items in enumerate(other.compactors):
+            self.compactors[height].extend(items)
+        self.count += other.count
+        self.size = sum(len(items) for items in self.compactors)
+        self._compress()
+
+    def quantiles(self, fractions: Iterable[float]) -> list:
+        """
+        :param fractions: 0到1之间的排名比例
+        :return: 对应的近似分位数，没有值时为None
+        """
+        weighted = sorted((value, 1 << height) for height, items in enumerate(self.compactors) for value in items)
+        total = sum(weight for _, weight in weighted)
+        results = []
+        for fraction in fractions:
+            if not total:
+                results.append(None)
+                continue
+            target = fraction * total
+            cumulative = 0
+            for value, weight in weighted:
+                cumulative += weight
+                if cumulative >= target:
+                    break
+            results.append(value)
+        return results
+
+    def to_dict(self) -> dict:
+        return {"k": self.k, "count": self.count, "compactors": self.compactors}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "KLLSketch":
+        sketch = cls(data["k"])
+        sketch.compactors = []
+        for items in data["compactors"]:
+            sketch._grow()
+            sketch.compactors[-1] = list(items)
+        sketch.count = data["count"]
+        sketch.size = sum(len(items) for items in sketch.compactors)
+        return sketch
+
+
+class ScoreSketch:
+    """
+    一组学生一科成绩的摘要：精确的人数、总分、平方和、最值、及格及优秀人数、分数段人数，近似的分位数
+    """
+
+    def __init__(self, k: int = 200, bin_width: float = 10, pass_line: float = None, excellent_line: float = None):
+        self.bin_width = bin_width
+        self.pass_line = pass_line
+        self.excellent_line = excellent_line
+        self.count = 0
+        self.total = 0.0
+        self.squares = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.passed = 0
+        self.excellent = 0
+        self.histogram = Counter()
+        self.kll = KLLSketch(k)
+
+    def update(self, values: list) -> None:
+        """
+        加入一批分数（已转化为数字），列表在此排序，之后的最值、及格人数及分数段都用二分查找得到
+        """
+        if not values:
+            return
+        values.sort()
+        count = len(values)
+        self.count += count
+        self.total += math.fsum(values)
+        self.squares += math.fsum(value * value for value in values)
+        self.minimum = values[0] if self.minimum is None else min(self.minimum, values[0])
+        self.maximum = values[-1] if self.maximum is None else max(self.maximum, values[-1])
+        if self.pass_line is not None:
+            self.passed += count - bisect.bisect_left(values, self.pass_line)
+        if self.excellent_line is not None:
+            self.excellent += count - bisect.bisect_left(values, self.excellent_line)
+        # 第key段为[key * 宽度, (key + 1) * 宽度)
+        width = self.bin_width
+        start = 0
+        while start < count:
+            key = math.floor(values[start] / width)
+            end = max(bisect.bisect_left(values, (key + 1) * width, start), start + 1)
+            self.histogram[key] += end - start
+            start = end
+        self.kll.update(values)
+
+    def merge(self, other: "ScoreSketch") -> None:
+        if (self.bin_width, self.pass_line, self.excellent_line) != (other.bin_width, other.pass_line, other.excellent_line):
+            raise ValueError("分数段宽度或及格线、优秀线不同的摘要不能合并")
+        self.count += other.count
+        self.total += other.total
+        self.squares += other.squares
+        for value in (other.minimum, other.maximum):
+            if value is not None:
+                self.minimum = value if self.minimum is None else min(self.minimum, value)
+                self.maximum = value if self.maximum is None else max(self.maximum, value)
+        self.passed += other.passed
+        self.excellent += other.excellent
+        self.histogram.update(other.histogram)
+        self.kll.merge(other.kll)
+
+    def distribution(self) -> str:
+        """
+        分数段人数，如“60-70:12 70-80:30”
+        """
+        def bound(value):
+            return int(value) if float(value).is_integer() else value
+        return " ".join(f"{bound(key * self.bin_width)}-{bound((key + 1) * self.bin_width)}:{count}"
+                        for key, count in sorted(self.histogram.items()))
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "total": self.total, "squares": self.squares,
+                "min": self.minimum, "max": self.maximum, "passed": self.passed, "excellent": self.excellent,
+                "histogram": {str(key): count for key, count in self.histogram.items()}, "kll": self.kll.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: dict, bin_width: float, pass_line: float = None, excellent_line: float = None) -> "ScoreSketch":
+        sketch = cls(data["kll"]["k"], bin_width, pass_line, excellent_line)
+        sketch.count = data["count"]
+        sketch.total = data["total"]
+        sketch.squares = data["squares"]
+        sketch.minimum = data["min"]
+        sketch.maximum = data["max"]
+        sketch.passed = data["passed"]
+        sketch.excellent = data["excellent"]
+        sketch.histogram = Counter({int(key): count for key, count in data["histogram"].items()})
+        sketch.kll = KLLSketch.from_dict(data["kll"])
+        return sketch
+
+
+def _plain(value):
+    if value is None or value != value:
+        return None
+    return int(value) if float(value).is_integer() else value
+
+
+class SketchSet:
+    """
+    各分组层级下各组各科的摘要，以（分组层级，分组键，科目）区分
+    """
+
+    def __init__(self, fields: list, k: int = 200, bin_width: float = 10, pass_lines: dict = None,
+                 excellent_lines: dict = None, skip_zero: bool = False):
+        """
+        :param fields: 分组字段，依次细分，如["学校", "班级"]
+        :param k: KLL摘要的大小
+        :param bin_width: 分数段宽度
+        :param pass_lines: 科目名到及格线的字典
+        :param excellent_lines: 科目名到优秀线的字典
+        :param skip_zero: 是否把0分当作缺考
+        """
+        self.fields = list(fields)
+        self.k = k
+        self.bin_width = bin_width
+        self.pass_lines = dict(pass_lines or {})
+        self.excellent_lines = dict(excellent_lines or {})
+        self.skip_zero = skip_zero
+        self.subjects = []
+        self.sketches = {}
+        self.sources = []
+
+    def levels(self) -> list:
+        return [self.fields[:depth] for depth in range(len(self.fields) + 1)]
+
+    def _sketch(self, level: int, group: tuple, subject: str) -> ScoreSketch:
+        key = (level, group, subject)
+        sketch = self.sketches.get(key)
+        if sketch is None:
+            sketch = self.sketches[key] = ScoreSketch(self.k, self.bin_width, self.pass_lines.get(subject),
+                                                      self.excellent_lines.get(subject))
+        return sketch
+
+    def update(self, rows: Iterable[list], group_positions: list, subject_positions: dict) -> int:
+        """
+        逐块读取数据行并加入摘要，每块内先按（分组，科目）收集分数，再整批加入
+
+        :param rows: 数据行（可以是生成器）
+        :param group_positions: 各分组字段在行中的位置，与fields对应
+        :param subject_positions: 科目名到在行中位置的字典
+        :return: 处理的行数
+        """
+        for subject in subject_positions:
+            if subject not in self.subjects:
+                self.subjects.append(subject)
+        rows = iter(rows)
+        row_count = 0
+        while True:
+            chunk = list(itertools.islice(rows, CHUNK_SIZE))
+            if not chunk:
+                return row_count
+            row_count += len(chunk)
+
+            # 先按最细的分组收集各科分数，较粗的分组由其拼接而成
+            leaves = {}
+            positions = list(subject_positions.values())
+            for row in chunk:
+                key = tuple(_group_key(row[position]) for position in group_positions)
+                bucket = leaves.get(key)
+                if bucket is None:
+                    bucket = leaves[key] = [[] for _ in positions]
+                for values, position in zip(bucket, positions):
+                    number = _score(row[position]) if position < len(row) else None
+                    if number is not None and not (self.skip_zero and number == 0):
+                        values.append(number)
+
+            for level in range(len(group_positions) + 1):
+                batches = {}
+                for key, bucket in leaves.items():
+                    merged = batches.get(key[:level])
+                    if merged is None:
+                        batches[key[:level]] = [list(values) for values in bucket]
+                    else:
+                        for values, more in zip(merged, bucket):
+                            values.extend(more)
+                for group, bucket in batches.items():
+                    for subject, values in zip(subject_positions, bucket):
+                        if values:
+                            self._sketch(level, group, subject).update(values)
+
+    def merge(self, other: "SketchSet") -> None:
+        if other.fields != self.fields:
+            raise ValueError(f"分组字段不同（{'、'.join(self.fields)}与{'、'.join(other.fields)}）的摘要不能合并")
+        if other.skip_zero != self.skip_zero:
+            raise ValueError("0分是否计入不同的摘要不能合并")
+        for subject in other.subjects:
+            if subject not in self.subjects:
+                self.subjects.append(subject)
+        for key, sketch in other.sketches.items():
+            if key in self.sketches:
+                self.sketches[key].merge(sketch)
+            else:
+                self.sketches[key] = sketch
+        self.sources += other.sources
+
+    def statistics(self, quantiles: Iterable[float] = DEFAULT_QUANTILES) -> GroupStatistics:
+        """
+        转化为与分组统计相同格式的结果，分位数统计量记为p10、p25等，中位数（p50）记为median
+
+        :param quantiles: 需要的分位数（百分数）
+        :return: 统计结果
+        """
+        quantiles = list(quantiles)
+        names = ["median" if quantile == 50 else f"p{quantile:g}" for quantile in quantiles]
+        metrics = ["count", "mean", "std", "min"] + names + ["max", "pass_rate", "excellent_rate", "distribution"]
+
+        records = []
+        for level, fields in enumerate(self.levels()):
+            level_name = "、".join(fields) if fields else ALL_GROUP
+            groups = sorted({group for key_level, group, _ in self.sketches if key_level == level})
+            for group in groups:
+                for subject in self.subjects:
+                    sketch = self.sketches.get((level, group, subject))
+                    if sketch is None or not sketch.count:
+                        continue
+                    mean = sketch.total / sketch.count
+                    record = {"level": level_name, "group": group, "subject": subject, "count": sketch.count,
+                              "mean": _plain(mean),
+                              "std": _plain(math.sqrt(max(sketch.squares / sketch.count - mean * mean, 0.0))),
+                              "min": _plain(sketch.minimum), "max": _plain(sketch.maximum),
+                              "pass_rate": _plain(sketch.passed / sketch.count) if sketch.pass_line is not None else None,
+                              "excellent_rate": _plain(sketch.excellent / sketch.count) if sketch.excellent_line is not None else None,
+                              "distribution": sketch.distribution()}
+                    for name, value in zip(names, sketch.kll.quantiles(quantile / 100 for quantile in quantiles)):
+                        record[name] = _plain(value)
+                    records.append(record)
+        return GroupStatistics(self.fields, metrics, records)
+
+    def to_dict(self) -> dict:
+        return {"version": SKETCH_VERSION, "fields": self.fields, "k": self.k, "bin_width": self.bin_width,
+                "pass_lines": self.pass_lines, "excellent_lines": self.excellent_lines, "skip_zero": self.skip_zero,
+                "subjects": self.subjects, "sources": self.sources,
+                "sketches": [{"level": level, "group": list(group), "subject": subject, **sketch.to_dict()}
+                             for (level, group, subject), sketch in self.sketches.items()]}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SketchSet":
+        if data.get("version") != SKETCH_VERSION:
+            raise ValueError(f"不支持的摘要文件版本{data.get('version')}")
+        sketches = cls(data["fields"], data["k"], data["bin_width"], data["pass_lines"], data["excellent_lines"],
+                       data["skip_zero"])
+        sketches.subjects = list(data["subjects"])
+        sketches.sources = list(data["sources"])
+        for item in data["sketches"]:
+            subject = item["subject"]
+            sketches.sketches[(item["level"], tuple(item["group"]), subject)] = ScoreSketch.from_dict(
+                item, sketches.bin_width, sketches.pass_lines.get(subject), sketches.excellent_lines.get(subject))
+        return sketches
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.to_dict(), file, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "SketchSet":
+        try:
+            with open(path, encoding="utf-8") as file:
+                return cls.from_dict(json.load(file))
+        except (OSError, ValueError, KeyError) as e:
+            raise ValueError(f"无法读取摘要文件{path}：{e}")
+
+
+def merge_sketch_files(paths: List[str]) -> Optional[SketchSet]:
+    """
+    依次读取并合并摘要文件，没有文件时返回None
+    """
+    merged = None
+    for path in paths:
+        sketches = SketchSet.load(path)
+        if merged is None:
+            merged = sketches
+        else:
+            merged.merge(sketches)
+    return merged
+
+
+def sketch_columns(headers: list, args: argparse.Namespace) -> Tuple[list, list, dict]:
+    """
+    流式统计的分组字段及科目在数据行中的位置
+
+    科目为-gs指定的列（表头名称或列字母），未指定时为分组字段、学校、姓名及编号类列以外的所有列，没有数字的列不产生统计
+
+    :param headers: 表头列表，列的位置与数据行中的位置相同
+    :param args: 命令行参数
+    :return: 表头中存在的分组字段，各分组字段的位置，科目名到位置的字典
+    """
+    from sheetml_reader import column_index as column_index_from_string, column_letter as get_column_letter
+    from extract_types import ColumnTypes
+    from extract_workbook import RowIndex
+    stripped = [str(header).strip() if header is not None else None for header in headers]
+
+    def find(key: str, aliases: Tuple[str, ...] = ()) -> int:
+        for name in (key,) + aliases:
+            if name in stripped:
+                return stripped.index(name)
+        if re.fullmatch(r"[A-Za-z]{1,3}", key) and column_index_from_string(key.upper()) <= len(headers):
+            return column_index_from_string(key.upper()) - 1
+        raise IndexError(f"表头中没有{key}")
+
+    fields, group_positions = [], []
+    for field in args.stats_by:
+        try:
+            group_positions.append(find(field, RowIndex.SCHOOL if field in RowIndex.SCHOOL else ()))
+            fields.append(field)
+        except IndexError:
+            print(f"表头中没有{field}，不按{field}分组")
+
+    if args.group_stats:
+        subjects = {}
+        for key in args.group_stats:
+            index = find(key)
+            subjects[stripped[index] or get_column_letter(index + 1)] = index
+    else:
+        subjects = {name: index for index, name in enumerate(stripped)
+                    if name and index not in group_positions and name != "姓名" and name not in RowIndex.SCHOOL
+                    and not any(word in name for word in ColumnTypes.ID_HEADERS)}
+    return fields, group_positions, subjects
+
+
+def new_sketch_set(fields: list, subjects: list, args: argparse.Namespace) -> SketchSet:
+    """
+    按命令行参数（满分、及格及优秀比例、0分是否计入、摘要大小、分数段宽度）创建空的摘要
+    """
+    from extract_pipeline import parse_full_scores
+    full_scores = parse_full_scores(args.full_score)
+    full = {name: full_scores.get(name, full_scores.get(None)) for name in subjects}
+    return SketchSet(fields, args.sketch_k, args.sketch_bin,
+                     pass_lines={name: score * args.pass_ratio for name, score in full.items() if score},
+                     excellent_lines={name: score * args.excellent_ratio for name, score in full.items() if score},
+                     skip_zero=args.calc_total_average_mode == "normal no zero")
+
+
+def run_sketch(input_workbook: str, args: argparse.Namespace, sketch_path: str = None,
+               interactive: bool = True) -> Tuple[SketchSet, dict]:
+    """
+    提取（按学校、班级及--where筛选）出学生成绩，逐块加入流式统计的摘要，不载入列式表也不写出数据行；
+    使用-st时边读边统计，内存与行数无关
+
+    :param input_workbook: 源工作簿路径
+    :param args: 命令行参数
+    :param sketch_path: 摘要文件的保存路径，为None时不保存
+    :param interactive: 有多个候选工作表时是否询问用户
+    :return: 摘要，本次处理的摘要信息
+    """
+    from extract_pipeline import extract_rows
+    from extract_profile import make_profiler, report_profile
+    from extract_workbook import WorkbookSession
+    start_time = time.perf_counter()
+    profiler = make_profiler(args)
+
+    with WorkbookSession(input_workbook, read_only=args.stream, profiler=profiler, fast_reader=args.fast_reader) as session:
+        input_sheet, layout, rows = extract_rows(session, args, interactive)
+        fields, group_positions, subjects = sketch_columns(list(layout.sub_title_dict.values()), args)
+        sketches = new_sketch_set(fields, list(subjects), args)
+        with profiler.stage("sketch"):
+            row_count = sketches.update(rows, group_positions, subjects)
+            profiler.add(rows=row_count, cells=row_count * len(subjects))
+    sketches.sources.append(os.path.abspath(input_workbook))
+
+    if sketch_path is not None:
+        with profiler.stage("save_sketch"):
+            sketches.save(sketch_path)
+    report_profile(profiler, args)
+    return sketches, {"source": input_workbook, "sheet": input_sheet, "output": sketch_path, "rows": row_count,
+                      "seconds": round(time.perf_counter() - start_time, 3)}
+
+
+def sketch_worker(input_workbook: str, sketch_path: str, args: argparse.Namespace) -> dict:
+    """
+    批量模式中在进程池中统计一个工作簿，摘要保存为文件，由主进程合并
+    """
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            _, summary = run_sketch(input_workbook, args, sketch_path, interactive=False)
+        summary["status"] = "ok"
+    except (Exception, SystemExit) as e:
+        summary = {"source": input_workbook, "output": sketch_path, "status": "failed",
+                   "error": str(e) or "".join(log.getvalue().strip().splitlines()[-1:])}
+    return summary
+
+
+def save_sketch_report(sketches: SketchSet, new_workbook: str, args: argparse.Namespace) -> int:
+    """
+    将摘要转化为统计表（与-gs的统计工作表格式相同，另有分位数及分数分布）写出
+
+    :param sketches: 摘要
+    :param new_workbook: 输出路径
+    :param args: 命令行参数
+    :return: 统计表的行数
+    """
+    from extract_formats import TabularExport
+    from extract_pipeline import write_statistics_sheet
+    from extract_workbook import create_workbook, safe_name
+    stats = sketches.statistics(args.quantiles)
+    if args.output_format == "xlsx":
+        wb = create_workbook(write_only=True)
+        write_statistics_sheet(wb, safe_name(args.title, 31), stats)
+        wb.save(new_workbook)
+    else:
+        TabularExport(args.output_format, stats.header(), stats.rows(),
+                      {"title": args.title, "sources": sketches.sources, "quantiles": list(args.quantiles)}).save(new_workbook)
+    print(f"统计结果已写入{new_workbook}，共{len(stats.records)}行，来自{len(sketches.sources)}个工作簿")
+    return len(stats.records)
+
+
+def run_merge_sketches(args: argparse.Namespace) -> SketchSet:
+    """
+    合并已保存的摘要文件（可用通配符）并写出统计表，使用--sketch时同时保存合并后的摘要
+
+    :param args: 命令行参数
+    :return: 合并后的摘要
+    """
+    from extract_formats import output_file
+    paths = []
+    for item in args.merge_sketches:
+        matches = sorted(glob.glob(item)) if glob.has_magic(item) else [item]
+        paths += [path for path in matches if path not in paths]
+    sketches = merge_sketch_files(paths)
+    if sketches is None:
+        raise ValueError(f"没有找到摘要文件{'、'.join(args.merge_sketches)}")
+    print(f"已合并{len(paths)}个摘要文件")
+    if args.sketch:
+        sketches.save(args.sketch)
+        print(f"合并后的摘要已保存为{args.sketch}")
+    save_sketch_report(sketches, output_file(args.filename, args.output_format), args)
+    return sketches
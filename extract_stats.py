@@ -0,0 +1,304 @@
+"""
+分组统计
+
+按全部、学校、学校及班级等分组层级，一次计算各科的人数、平均分、中位数、最高分、最低分、标准差、及格率及优秀率。
+安装了NumPy时每个分组层级只对分组键编码一次，每科用bincount累计人数、总分及及格人数，
+再按（分组，分数）排序一次得到每组的最低分、最高分和中位数，不需要对每个分组分别循环；
+没有NumPy时退回到纯Python的逐组计算，结果相同。
+"""
+import math
+from typing import Iterable, Optional
+from extract_options import METRICS
+
+try:
+    import numpy as np
+except ImportError:
+    # 没有NumPy时逐组计算
+    np = None
+
+
+METRIC_NAMES = {
+    "count": "人数",
+    "mean": "平均分",
+    "median": "中位数",
+    "max": "最高分",
+    "min": "最低分",
+    "std": "标准差",
+    "pass_rate": "及格率",
+    "excellent_rate": "优秀率",
+    "distribution": "分数分布",
+}
+ALL_GROUP = "全部"
+MISSING_KEY = "未填写"
+
+
+def metric_name(metric: str) -> str:
+    """
+    统计量的中文名称，分位数p10、p25等为“10%分位数”
+    """
+    if metric in METRIC_NAMES:
+        return METRIC_NAMES[metric]
+    return f"{metric[1:]}%分位数"
+
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    if value != value:
+        return None
+    return float(value)
+
+
+def _key(value) -> str:
+    return MISSING_KEY if value is None else str(value).strip() or MISSING_KEY
+
+
+def _factorize(keys: Iterable) -> tuple:
+    """
+    将分组键编码为从0开始的整数，返回（编码列表，按首次出现顺序排列的分组键列表）
+    """
+    codes = {}
+    encoded = [codes.setdefault(key, len(codes)) for key in keys]
+    return encoded, list(codes)
+
+
+def factorize_field(column: list) -> tuple:
+    """
+    对一个分组字段编码：先按原值编码，再把去掉首尾空白后相同的值及空值（记为“未填写”）合并
+    """
+    encoded, raw_labels = _factorize(column)
+    remap, labels = _factorize(map(_key, raw_labels))
+    if np is not None:
+        return np.asarray(remap, dtype=np.int64)[np.asarray(encoded, dtype=np.int64)], labels
+    return [remap[code] for code in encoded], labels
+
+
+def _level_codes(level: list, field_codes: dict, row_count: int) -> tuple:
+    """
+    一个分组层级中每行的分组编号及各组的分组键（元组）
+    """
+    if not level:
+        codes = np.zeros(row_count, dtype=np.int64) if np is not None else [0] * row_count
+        return codes, [()]
+
+    if np is None:
+        return _factorize(zip(*(map(field_codes[field][1].__getitem__, field_codes[field][0]) for field in level)))
+
+    combined = np.zeros(row_count, dtype=np.int64)
+    for field in level:
+        field_code, field_labels = field_codes[field]
+        combined = combined * len(field_labels) + field_code
+    unique, codes = np.unique(combined, return_inverse=True)
+
+    labels = []
+    for key in unique.tolist():
+        parts = []
+        for field in reversed(level):
+            field_labels = field_codes[field][1]
+            key, position = divmod(key, len(field_labels))
+            parts.append(field_labels[position])
+        labels.append(tuple(reversed(parts)))
+    return codes.reshape(-1), labels
+
+
+def _float_array(column: list, skip_zero: bool = False):
+    """
+    一列转化为浮点数组，非数字记为NaN
+    """
+    try:
+        # 只有数字和None时由NumPy直接转化，None成为NaN
+        array = np.array(column, dtype=float)
+    except (ValueError, TypeError):
+        # 有“缺考”等字符串时逐个筛选，type()比较同时排除了布尔值
+        array = np.array([value if type(value) in (int, float) else None for value in column], dtype=float)
+    if skip_zero:
+        array[array == 0] = math.nan
+    return array
+
+
+class GroupStatistics:
+    """
+    一个或多个分组层级的统计结果，每条记录为一个（分组，科目）
+    """
+
+    def __init__(self, fields: list, metrics: list, records: list):
+        """
+        :param fields: 分组字段，如["学校", "班级"]
+        :param metrics: 统计量，METRICS中的若干项
+        :param records: 记录列表，每条为{"level", "group", "subject", 各统计量}
+        """
+        self.fields = list(fields)
+        self.metrics = list(metrics)
+        self.records = records
+
+    def header(self) -> list:
+        return ["分组"] + self.fields + ["科目"] + [metric_name(metric) for metric in self.metrics]
+
+    def rows(self) -> list:
+        """
+        逐行的统计结果，与header对应，分组层级中没有的字段留空
+        """
+        rows = []
+        for record in self.records:
+            group = list(record["group"]) + [None] * (len(self.fields) - len(record["group"]))
+            rows.append([record["level"]] + group + [record["subject"]] + [record[metric] for metric in self.metrics])
+        return rows
+
+    def to_dict(self) -> dict:
+        return {"fields": self.fields, "metrics": self.metrics,
+                "records": [dict(record, group=list(record["group"])) for record in self.records]}
+
+
+def compute_statistics(group_columns: dict, subject_columns: dict, levels: list, metrics: list = METRICS,
+                       pass_lines: dict = None, excellent_lines: dict = None, skip_zero: bool = False) -> GroupStatistics:
+    """
+    计算各分组层级下各科的统计量
+
+    :param group_columns: 分组字段名到该列值的字典，如{"学校": [...], "班级": [...]}
+    :param subject_columns: 科目名到该列值的字典，非数字的值（如“缺考”）不参与统计
+    :param levels: 分组层级列表，每个层级是分组字段的列表，空列表表示全部学生
+    :param metrics: 需要的统计量
+    :param pass_lines: 科目名到及格线的字典，没有的科目不计算及格率
+    :param excellent_lines: 科目名到优秀线的字典，没有的科目不计算优秀率
+    :param skip_zero: 是否把0分当作缺考，不参与统计
+    :return: 统计结果
+    """
+    pass_lines = pass_lines or {}
+    excellent_lines = excellent_lines or {}
+    fields = []
+    for level in levels:
+        for field in level:
+            if field not in fields:
+                fields.append(field)
+
+    row_count = len(next(iter(subject_columns.values()))) if subject_columns else 0
+
+    # 每个分组字段只编码一次，多字段的分组层级由各字段的编码组合得到
+    field_codes = {field: factorize_field(group_columns[field]) for field in fields}
+
+    if np is not None:
+        # 每科的数值只转化、排序一次，各分组层级共用
+        values = {subject: _float_array(column, skip_zero) for subject, column in subject_columns.items()}
+        value_orders = {subject: np.argsort(array, kind="stable") for subject, array in values.items()}
+    else:
+        values = {subject: [None if (number := _number(value)) is None or (skip_zero and number == 0) else number
+                            for value in column]
+                  for subject, column in subject_columns.items()}
+
+    records = []
+    for level in levels:
+        codes, labels = _level_codes(level, field_codes, row_count)
+        # 分组按分组键排序输出
+        order = sorted(range(len(labels)), key=lambda group: labels[group])
+        level_name = "、".join(level) if level else ALL_GROUP
+
+        if np is not None:
+            results = {subject: _compute_numpy(codes, len(labels), column, value_orders[subject],
+                                               pass_lines.get(subject), excellent_lines.get(subject))
+                       for subject, column in values.items()}
+        else:
+            results = {subject: _compute_python(codes, len(labels), column, pass_lines.get(subject), excellent_lines.get(subject))
+                       for subject, column in values.items()}
+        for group in order:
+            for subject in subject_columns:
+                record = {"level": level_name, "group": labels[group], "subject": subject}
+                for metric in metrics:
+                    record[metric] = results[subject][metric][group]
+                records.append(record)
+
+    return GroupStatistics(fields, list(metrics), records)
+
+
+def _compute_numpy(codes, group_count: int, values, value_order, pass_line: float = None, excellent_line: float = None) -> dict:
+    """
+    一科在一个分组层级下各组的统计量，每项统计量为按分组编号排列的列表
+
+    value_order是该科按分数排序的下标，对它再按分组编号做一次稳定排序就得到（分组，分数）的顺序
+    """
+    if not len(values):
+        return {metric: [0 if metric == "count" else None] * group_count for metric in METRICS}
+
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+
+    count = np.bincount(codes, weights=valid, minlength=group_count)
+    total = np.bincount(codes, weights=filled, minlength=group_count)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        deviation = np.where(valid, values - mean[codes], 0.0)
+        std = np.sqrt(np.bincount(codes, weights=deviation * deviation, minlength=group_count) / count)
+
+    # 按（分组，分数）排序一次，空值排在每组最后，每组的最低分、最高分、中位数由位置直接取出
+    group_codes = codes[value_order]
+    if group_count <= np.iinfo(np.int16).max:
+        # 16位整数的稳定排序是基数排序，与行数成线性关系
+        group_codes = group_codes.astype(np.int16)
+    sorted_values = values[value_order[np.argsort(group_codes, kind="stable")]]
+    sizes = np.bincount(codes, minlength=group_count)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    counts = count.astype(np.int64)
+    empty = counts == 0
+    # 没有成绩的组取到的是其他位置的值，最后统一记为空值
+    last = np.minimum(starts + np.maximum(counts - 1, 0), len(values) - 1)
+    first = np.minimum(starts, len(values) - 1)
+    minimum = sorted_values[first]
+    maximum = sorted_values[last]
+    median = (sorted_values[np.minimum(starts + (counts - 1) // 2, len(values) - 1)]
+              + sorted_values[np.minimum(starts + counts // 2, len(values) - 1)]) / 2
+    for array in (minimum, maximum, median):
+        array[empty] = math.nan
+
+    def rate(line):
+        if line is None:
+            return [None] * group_count
+        passed = np.bincount(codes, weights=valid & (filled >= line), minlength=group_count)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return _plain(passed / count)
+
+    return {
+        "count": counts.tolist(),
+        "mean": _plain(mean),
+        "median": _plain(median),
+        "max": _plain(maximum),
+        "min": _plain(minimum),
+        "std": _plain(std),
+        "pass_rate": rate(pass_line),
+        "excellent_rate": rate(excellent_line),
+    }
+
+
+def _plain(array) -> list:
+    """
+    NumPy数组转回Python数字列表，NaN记为None，整数值写为整型
+    """
+    return [None if value != value else int(value) if value.is_integer() else value for value in array.tolist()]
+
+
+def _compute_python(codes: list, group_count: int, values: list, pass_line: float = None, excellent_line: float = None) -> dict:
+    groups = [[] for _ in range(group_count)]
+    for code, value in zip(codes, values):
+        if value is not None:
+            groups[code].append(value)
+
+    result = {metric: [] for metric in METRICS}
+    for scores in groups:
+        scores.sort()
+        count = len(scores)
+        result["count"].append(count)
+        if not count:
+            for metric in METRICS[1:]:
+                result[metric].append(None)
+            continue
+        mean = sum(scores) / count
+        middle = count // 2
+        median = scores[middle] if count % 2 else (scores[middle - 1] + scores[middle]) / 2
+        for metric, value in (("mean", mean), ("median", median), ("max", scores[-1]), ("min", scores[0]),
+                              ("std", math.sqrt(sum((score - mean) ** 2 for score in scores) / count))):
+            result[metric].append(int(value) if float(value).is_integer() else value)
+        for metric, line in (("pass_rate", pass_line), ("excellent_rate", excellent_line)):
+            if line is None:
+                result[metric].append(None)
+            else:
+                rate = sum(1 for score in scores if score >= line) / count
+                result[metric].append(int(rate) if rate.is_integer() else rate)
+    return result
@@ -0,0 +1,260 @@
+"""
+列类型推断及字符串数字转化
+
+成绩表中的数字常以字符串保存，逐个单元格判断并转化很慢，也会把考号、班级等编号误转为数字（丢失前导0）。
+这里按列推断类型：表头为考号、班级等的列及含有前导0的列为编号，其余列取前SAMPLE_SIZE行抽样，
+全为整数的为整型、含有小数的为浮点型、非数字占多数的为文本；之后整列一次转化（安装了NumPy时向量化）。
+--column-type可以为任意列指定类型。
+"""
+import itertools, re
+from typing import Iterable, Iterator, Tuple
+from sheetml_reader import column_letter as get_column_letter
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy为可选依赖，没有安装时逐个转化
+    np = None
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def plain_number(value):
+    """
+    将NumPy标量转回Python数字，整数值写为整型
+    """
+    value = float(value)
+    if value != value:
+        return None
+    return int(value) if value.is_integer() else value
+
+
+class ColumnTypes:
+    """
+    按列推断的数据类型：整型（int）、浮点型（float）、文本（text）或编号（id）
+
+    每列只抽样一次决定类型，之后整列按类型转化字符串数字：int、float列中的字符串数字转化为数字，
+    无法转化的（如“缺考”）保持原样；text、id列不做转化，考号、班级代码等看起来像数字的编号因此保持为文本
+    """
+
+    INT, FLOAT, TEXT, ID = "int", "float", "text", "id"
+    KINDS = (INT, FLOAT, TEXT, ID)
+    # 表头中含有这些词的列视为编号
+    ID_HEADERS = ("考号", "学号", "准考证", "身份证", "编号", "代码", "班级", "班号", "座号", "电话", "手机")
+    # 每列抽样的非空值个数
+    SAMPLE_SIZE = 1000
+    # 超过这个长度的数字串视为编号（身份证号、手机号等，转为数字会丢失精度或失去意义）
+    ID_DIGITS = 11
+
+    def __init__(self, headers: list, kinds: list, sources: list):
+        """
+        :param headers: 表头列表
+        :param kinds: 每列的类型
+        :param sources: 每列类型的依据：override（指定）、header（表头）、sample（抽样）
+        """
+        self.headers = list(headers)
+        self.kinds = list(kinds)
+        self.sources = list(sources)
+        self.converted = [0] * len(self.kinds)
+        self.kept = [0] * len(self.kinds)
+
+    @classmethod
+    def infer(cls, headers: list, columns: list, overrides: dict = None) -> "ColumnTypes":
+        """
+        由每列的样本推断类型
+
+        :param headers: 表头列表
+        :param columns: 每列的值（只看前SAMPLE_SIZE个非空值）
+        :param overrides: 指定的列类型，键为表头名称或输出工作表中的列字母
+        :return: 各列类型
+        """
+        overrides = overrides or {}
+        kinds, sources = [], []
+        for index, header in enumerate(headers):
+            name = "" if header is None else str(header).strip()
+            override = overrides.get(name) or overrides.get(get_column_letter(index + 1))
+            if override:
+                kinds.append(override)
+                sources.append("override")
+            elif name and any(word in name for word in cls.ID_HEADERS):
+                kinds.append(cls.ID)
+                sources.append("header")
+            else:
+                kinds.append(cls._sample_kind(columns[index] if index < len(columns) else []))
+                sources.append("sample")
+        return cls(headers, kinds, sources)
+
+    @classmethod
+    def _sample_kind(cls, column: Iterable) -> str:
+        """
+        数字（含字符串数字）占抽样非空值的一半以上时为数字列，出现小数时为float；
+        字符串数字有前导零或位数过多时为id；其余为text
+        """
+        numbers = strings = total = 0
+        has_float = False
+        for value in column:
+            if value is None or (isinstance(value, str) and not value.strip()):
+                continue
+            total += 1
+            if is_number(value):
+                numbers += 1
+                has_float = has_float or (isinstance(value, float) and not value.is_integer())
+            elif isinstance(value, str):
+                text = value.strip()
+                number = _parse_number(text)
+                if number is not None:
+                    digits = text.lstrip("+-")
+                    if (len(digits) > 1 and digits[0] == "0" and digits[1] != ".") or len(digits) >= cls.ID_DIGITS:
+                        return cls.ID
+                    strings += 1
+                    has_float = has_float or isinstance(number, float)
+            if total >= cls.SAMPLE_SIZE:
+                break
+
+        if total and (numbers + strings) * 2 > total:
+            return cls.FLOAT if has_float else cls.INT
+        return cls.TEXT
+
+    def _convert(self, index: int, value):
+        kind = self.kinds[index] if index < len(self.kinds) else self.TEXT
+        if kind in (self.TEXT, self.ID) or not isinstance(value, str):
+            return value
+        number = _parse_number(value.strip())
+        if number is None:
+            if value.strip():
+                self.kept[index] += 1
+            return value
+        self.converted[index] += 1
+        return float(number) if kind == self.FLOAT else number
+
+    def convert_rows(self, rows: Iterable[list]) -> Iterator[list]:
+        """
+        逐行按列类型转化，用于只写模式的流式输出
+        """
+        numeric = [index for index, kind in enumerate(self.kinds) if kind in (self.INT, self.FLOAT)]
+        for row in rows:
+            row = list(row)
+            for index in numeric:
+                if index < len(row) and isinstance(row[index], str):
+                    row[index] = self._convert(index, row[index])
+            yield row
+
+    def convert_column(self, index: int, column: list) -> list:
+        """
+        整列按类型转化，安装了NumPy时一次转化整列的字符串数字
+
+        :param index: 列号（从0开始）
+        :param column: 该列的值
+        :return: 转化后的列，不需要转化时返回原列表
+        """
+        if self.kinds[index] not in (self.INT, self.FLOAT):
+            return column
+        positions = [row for row, value in enumerate(column) if isinstance(value, str)]
+        if not positions:
+            return column
+
+        converted = None
+        if np is not None:
+            strings = [column[row] for row in positions]
+            try:
+                floats = np.array(strings, dtype=float)
+            except ValueError:
+                floats = None
+            # "nan"、"inf"等不作为数字，与无法一次转化时一样交给逐个转化
+            if floats is not None and np.isfinite(floats).all():
+                if self.kinds[index] == self.FLOAT:
+                    converted = floats.tolist()
+                else:
+                    integral = floats == np.floor(floats)
+                    converted = [int(value) if is_int else value
+                                 for value, is_int in zip(floats.tolist(), integral.tolist())]
+                self.converted[index] += len(converted)
+
+        new_column = list(column)
+        if converted is None:
+            # 整列不能一次转化时逐个转化，保留无法转化的字符串；成绩列中不同的字符串很少，每个只解析一次
+            parsed = {}
+            for row in positions:
+                text = column[row]
+                if text in parsed:
+                    value, counter = parsed[text]
+                    if counter is not None:
+                        counter[index] += 1
+                else:
+                    value = self._convert(index, text)
+                    counter = self.converted if value is not text else (self.kept if text.strip() else None)
+                    parsed[text] = value, counter
+                new_column[row] = value
+        else:
+            for row, value in zip(positions, converted):
+                new_column[row] = value
+        return new_column
+
+    def summary(self) -> str:
+        """
+        各列的类型、依据及转化数量
+        """
+        source_names = {"override": "指定", "header": "表头", "sample": "抽样"}
+        lines = ["列类型推断：", f"{'列':<4}{'表头':<12}{'类型':<8}{'依据':<6}{'转化':>8}{'未转化':>8}"]
+        for index, kind in enumerate(self.kinds):
+            header = "" if self.headers[index] is None else str(self.headers[index])
+            lines.append(f"{get_column_letter(index + 1):<4}{header:<12}{kind:<8}{source_names[self.sources[index]]:<6}"
+                         f"{self.converted[index]:>8}{self.kept[index]:>8}")
+        lines.append(f"共转化{sum(self.converted)}个字符串数字")
+        return "\n".join(lines)
+
+
+def _parse_number(text: str):
+    """
+    将字符串数字转化为整型或浮点型（整数值的浮点数转化为整型），不是数字时返回None
+    """
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        float_value = float(text)
+    except ValueError:
+        return None
+    if float_value != float_value or float_value in (float("inf"), float("-inf")):
+        return None
+    return int(float_value) if float_value.is_integer() else float_value
+
+
+def parse_column_types(items: list) -> dict:
+    """
+    解析命令行中指定的列类型，如 ["考号=id", "E=float"]
+
+    :param items: “表头名称或列字母=类型”的列表
+    :return: 表头名称或列字母到类型的字典
+    """
+    overrides = {}
+    for item in items or []:
+        key, sep, kind = item.partition("=")
+        kind = kind.strip().lower()
+        if not sep or not key.strip() or kind not in ColumnTypes.KINDS:
+            raise ValueError(f"无法解析列类型{item}，请使用“表头或列字母=类型”，类型为{'、'.join(ColumnTypes.KINDS)}之一")
+        key = key.strip()
+        overrides[key.upper() if re.fullmatch(r"[A-Za-z]{1,3}", key) else key] = kind
+    return overrides
+
+
+def sample_column_types(headers: list, rows: Iterable[list], column_type: list = None) -> Tuple[ColumnTypes, Iterable[list]]:
+    """
+    取前SAMPLE_SIZE行推断列类型，行是生成器时样本缓存下来再接上其余的行
+
+    :param headers: 表头列表
+    :param rows: 学生成绩
+    :param column_type: 命令行中指定的列类型
+    :return: 各列类型，完整的学生成绩
+    """
+    if isinstance(rows, list):
+        sample = rows[:ColumnTypes.SAMPLE_SIZE]
+    else:
+        rows = iter(rows)
+        sample = list(itertools.islice(rows, ColumnTypes.SAMPLE_SIZE))
+        rows = itertools.chain(sample, rows)
+    columns = [[row[index] if index < len(row) else None for row in sample] for index in range(len(headers))]
+    return ColumnTypes.infer(headers, columns, parse_column_types(column_type)), rows
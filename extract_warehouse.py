@@ -0,0 +1,396 @@
+"""
+SQLite成绩库
+
+每次运行提取出的学生成绩写入新的工作簿后就被丢弃，查询“3班最近六次考试的物理成绩”需要重新解析六个工作簿。
+成绩库把提取出的数据行连同表头、次表头、版式及考试、科目、工作表等信息写入本地的SQLite数据库：
+每次导入在一个事务中批量插入，学生（考号、姓名）、学校、班级及考试都建有索引；
+之后的提取可以直接从成绩库读取，历史查询先在学校、班级的不同值上匹配关键词，再按索引取出对应的行。
+
+“最近N次考试”按考试日期排列（导入时用--exam-date指定，未指定时为源工作簿的修改日期，重新导入时保留原日期），
+与导入的先后无关，补导入较早的考试或重新导入时顺序不会错乱。
+
+表结构：
+    exams        每次导入的考试、科目、工作表及考试日期，表头、次表头及版式（JSON）
+    rows         每行学生成绩，整行以JSON保存，另存考号、姓名、学校、班级用于索引
+    exam_values  每次导入中学校、班级的不同值，按关键词匹配时只需查这张小表
+"""
+import argparse, datetime, json, os, sqlite3, time
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS exams (
+    id INTEGER PRIMARY KEY,
+    exam TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    sheet TEXT NOT NULL,
+    source TEXT,
+    title TEXT,
+    headers TEXT NOT NULL,
+    heading_three TEXT NOT NULL,
+    layout TEXT NOT NULL,
+    row_count INTEGER NOT NULL DEFAULT 0,
+    ingested_at REAL NOT NULL,
+    exam_date TEXT,
+    UNIQUE (exam, subject, sheet)
+);
+CREATE TABLE IF NOT EXISTS rows (
+    exam_id INTEGER NOT NULL REFERENCES exams(id) ON DELETE CASCADE,
+    row_no INTEGER NOT NULL,
+    student_id TEXT,
+    name TEXT,
+    school TEXT,
+    class TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (exam_id, row_no)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS exam_values (
+    exam_id INTEGER NOT NULL REFERENCES exams(id) ON DELETE CASCADE,
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (exam_id, field, value)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS exams_exam ON exams (exam);
+CREATE INDEX IF NOT EXISTS exams_date ON exams (subject, exam_date);
+CREATE INDEX IF NOT EXISTS rows_student_id ON rows (student_id);
+CREATE INDEX IF NOT EXISTS rows_name ON rows (name);
+CREATE INDEX IF NOT EXISTS rows_school ON rows (school, exam_id);
+CREATE INDEX IF NOT EXISTS rows_class ON rows (class, exam_id);
+"""
+
+# 索引列对应的表头
+INDEXED_HEADERS = {
+    "student_id": ("考号", "学号"),
+    "name": ("姓名",),
+    "school": ("学校", "学校名称"),
+    "class": ("班级",),
+}
+
+# 每批插入的行数
+BATCH_SIZE = 5000
+
+
+class ExamInfo(NamedTuple):
+    id: int
+    exam: str
+    subject: str
+    sheet: str
+    source: str
+    title: str
+    row_count: int
+    ingested_at: float
+    exam_date: str
+
+
+def _json_value(value):
+    # 日期时间以ISO格式保存，读回时为文本
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def _key_text(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip() or None
+
+
+def exam_date(value: str) -> str:
+    """
+    检查考试日期（YYYY-MM-DD），有误时抛出ValueError
+
+    :return: ISO格式的日期
+    """
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError(f"考试日期{value}应为YYYY-MM-DD格式，如2024-06-20") from None
+
+
+def source_date(source: str) -> str:
+    """
+    未指定考试日期时使用源工作簿的修改日期，文件不存在时为当天
+    """
+    try:
+        return datetime.date.fromtimestamp(os.path.getmtime(source)).isoformat()
+    except OSError:
+        return datetime.date.today().isoformat()
+
+
+def _positions(headers: list) -> dict:
+    stripped = [str(header).strip() if header is not None else None for header in headers]
+    return {column: next((stripped.index(name) for name in names if name in stripped), None)
+            for column, names in INDEXED_HEADERS.items()}
+
+
+class Warehouse:
+    """
+    成绩库，用法：
+    with Warehouse(path) as warehouse:
+        warehouse.ingest(...)
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: 数据库文件路径，不存在时创建
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self._migrate()
+        self.connection.executescript(SCHEMA)
+
+    def _migrate(self) -> None:
+        # 旧版本的成绩库没有考试日期，按导入时间补上，之后可用--exam-date重新导入以更正
+        columns = [record[1] for record in self.connection.execute("PRAGMA table_info(exams)")]
+        if columns and "exam_date" not in columns:
+            with self.connection:
+                self.connection.execute("ALTER TABLE exams ADD COLUMN exam_date TEXT")
+                self.connection.execute("UPDATE exams SET exam_date = date(ingested_at, 'unixepoch', 'localtime')")
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def ingest(self, exam: str, subject: str, sheet: str, source: str, title: str, layout: dict,
+               rows: Iterable[list], date: str = None) -> int:
+        """
+        在一个事务中导入一个工作表的数据行，同一考试、科目及工作表已导入时替换原有的行
+
+        重新导入时未指定date则保留原来的考试日期
+
+        :param exam: 考试名称
+        :param subject: 科目
+        :param sheet: 源工作表名称
+        :param source: 源工作簿路径
+        :param title: 源工作表的标题
+        :param layout: 版式信息（SheetLayout._asdict()），表头为其中sub_title_dict的值
+        :param rows: 数据行
+        :param date: 考试日期（YYYY-MM-DD），为None时第一次导入使用源工作簿的修改日期
+        :return: 导入的行数
+        """
+        headers = list(layout["sub_title_dict"].values())
+        positions = _positions(headers)
+        width = len(headers)
+
+        distinct = {"school": set(), "class": set()}
+
+        def records(exam_id: int):
+            for row_no, row in enumerate(rows):
+                keys = [_key_text(row[position]) if position is not None and position < len(row) else None
+                        for position in positions.values()]
+                distinct["school"].add(keys[2])
+                distinct["class"].add(keys[3])
+                yield (exam_id, row_no, *keys, json.dumps(list(row[:width]), ensure_ascii=False, default=_json_value))
+
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO exams (exam, subject, sheet, source, title, headers, heading_three, layout, ingested_at, exam_date) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (exam, subject, sheet) DO UPDATE SET source = excluded.source, title = excluded.title, "
+                "headers = excluded.headers, heading_three = excluded.heading_three, layout = excluded.layout, "
+                "ingested_at = excluded.ingested_at, exam_date = COALESCE(?, exams.exam_date)",
+                (exam, subject, sheet, source, title, json.dumps(headers, ensure_ascii=False, default=_json_value),
+                 json.dumps(layout["heading_three"], ensure_ascii=False, default=_json_value),
+                 json.dumps(layout, ensure_ascii=False, default=_json_value), time.time(),
+                 date or source_date(source), date))
+            exam_id = self.connection.execute("SELECT id FROM exams WHERE exam = ? AND subject = ? AND sheet = ?",
+                                              (exam, subject, sheet)).fetchone()[0]
+            self.connection.execute("DELETE FROM rows WHERE exam_id = ?", (exam_id,))
+            self.connection.execute("DELETE FROM exam_values WHERE exam_id = ?", (exam_id,))
+
+            count = 0
+            pending = records(exam_id)
+            while True:
+                batch = [record for _, record in zip(range(BATCH_SIZE), pending)]
+                if not batch:
+                    break
+                self.connection.executemany("INSERT INTO rows VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+                count += len(batch)
+            self.connection.executemany("INSERT INTO exam_values VALUES (?, ?, ?)",
+                                        [(exam_id, field, value) for field, values in distinct.items()
+                                         for value in values if value is not None])
+            self.connection.execute("UPDATE exams SET row_count = ? WHERE id = ?", (count, exam_id))
+        return count
+
+    def exams(self, subject: str = None) -> List[ExamInfo]:
+        """
+        已导入的考试，按考试日期排列，同一天的按导入时间排列
+        """
+        query = "SELECT id, exam, subject, sheet, source, title, row_count, ingested_at, exam_date FROM exams"
+        parameters = ()
+        if subject is not None:
+            query += " WHERE subject = ?"
+            parameters = (subject,)
+        return [ExamInfo(*record) for record in self.connection.execute(query + " ORDER BY exam_date, ingested_at, id", parameters)]
+
+    def find_exam(self, exam: str, subject: str, sheet: str = None) -> ExamInfo:
+        """
+        按考试名称及科目（以及工作表）找出一次导入，找不到或不唯一时抛出ValueError
+        """
+        matches = [info for info in self.exams(subject) if info.exam == exam and (sheet is None or info.sheet == sheet)]
+        if not matches:
+            raise ValueError(f"成绩库{self.path}中没有{exam}的{subject}成绩")
+        if len(matches) > 1:
+            raise ValueError(f"成绩库{self.path}中{exam}有多个{subject}工作表（{'、'.join(info.sheet for info in matches)}），请使用--sheet指定")
+        return matches[0]
+
+    def load(self, exam: str, subject: str, sheet: str = None) -> Tuple[ExamInfo, dict, list]:
+        """
+        读取一次导入的版式及全部数据行
+
+        :return: 导入信息，版式信息（可传给SheetLayout），数据行
+        """
+        info = self.find_exam(exam, subject, sheet)
+        layout = json.loads(self.connection.execute("SELECT layout FROM exams WHERE id = ?", (info.id,)).fetchone()[0])
+        rows = [json.loads(data) for data, in
+                self.connection.execute("SELECT data FROM rows WHERE exam_id = ? ORDER BY row_no", (info.id,))]
+        return info, layout, rows
+
+    def _matching_values(self, column: str, keyword: str, exam_ids: list) -> list:
+        # 关键词按包含关系匹配（与--school、--classr相同），先在不同的值上匹配，再按索引取行
+        marks = ",".join("?" * len(exam_ids))
+        values = self.connection.execute(
+            f"SELECT DISTINCT value FROM exam_values WHERE field = ? AND exam_id IN ({marks})", [column] + exam_ids)
+        return [value for value, in values if keyword in value]
+
+    def history(self, subject: str, column: str, last: int, school: str = None, class_name: str = None) -> Tuple[list, list, list]:
+        """
+        最近几次考试中指定列的成绩，每名学生一行，每次考试一列（按考试日期从早到晚）
+
+        学生以考号区分，没有考号时以姓名、学校及班级区分
+
+        :param subject: 科目
+        :param column: 成绩所在的表头名称
+        :param last: 最近的考试次数
+        :param school: 学校关键词，为None时不筛选
+        :param class_name: 班级关键词，为None时不筛选
+        :return: 表头，数据行，各次考试（ExamInfo）
+        """
+        exams = self.exams(subject)[-last:] if last > 0 else []
+        positions = {}
+        for info in exams:
+            headers = json.loads(self.connection.execute("SELECT headers FROM exams WHERE id = ?", (info.id,)).fetchone()[0])
+            stripped = [str(header).strip() if header is not None else None for header in headers]
+            if column in stripped:
+                positions[info.id] = stripped.index(column)
+        exams = [info for info in exams if info.id in positions]
+        if not exams:
+            return [], [], []
+
+        exam_ids = [info.id for info in exams]
+        conditions = ["exam_id = ?"]
+        filters = []
+        for name, keyword in (("school", school), ("class", class_name)):
+            if keyword is not None:
+                values = self._matching_values(name, keyword, exam_ids)
+                conditions.append(f"{name} IN ({','.join('?' * len(values))})")
+                filters += values
+        # 成绩在SQLite中用json_extract取出，不必在Python中解析整行
+        query = (f"SELECT student_id, name, school, class, json_extract(data, ?) FROM rows "
+                 f"WHERE {' AND '.join(conditions)} ORDER BY row_no")
+
+        students = {}
+        for index, exam_id in enumerate(exam_ids):
+            for student_id, name, school_value, class_value, score in self.connection.execute(
+                    query, [f"$[{positions[exam_id]}]", exam_id] + filters):
+                key = student_id if student_id is not None else (name, school_value, class_value)
+                record = students.get(key)
+                if record is None:
+                    record = students[key] = [student_id, name, school_value, class_value] + [None] * len(exam_ids)
+                record[4 + index] = score
+
+        headers = ["考号", "姓名", "学校", "班级"] + [info.exam for info in exams]
+        rows = list(students.values())
+        if all(row[0] is None for row in rows):
+            # 没有考号时去掉考号列
+            headers, rows = headers[1:], [row[1:] for row in rows]
+        return headers, rows, exams
+
+
+def default_exam_name(source: str) -> str:
+    """
+    未指定考试名称时使用源工作簿的文件名
+    """
+    return os.path.splitext(os.path.basename(source))[0]
+
+
+def run_ingest(input_workbook: str, args: argparse.Namespace) -> list:
+    """
+    将提取（按学校、班级及--where筛选）出的数据行导入成绩库，不写出工作簿；--all-sheets时导入所有匹配的工作表
+
+    :param input_workbook: 源工作簿路径
+    :param args: 命令行参数
+    :return: 每个工作表导入的摘要
+    """
+    from extract_pipeline import extract_rows
+    from extract_profile import make_profiler, report_profile
+    from extract_workbook import WorkbookSession, matching_sheets
+    profiler = make_profiler(args)
+    date = exam_date(args.exam_date) if args.exam_date else None
+    exam = args.exam or default_exam_name(input_workbook)
+    summaries = []
+
+    with WorkbookSession(input_workbook, read_only=args.stream, profiler=profiler, fast_reader=args.fast_reader) as session, \
+            Warehouse(args.warehouse) as warehouse:
+        sheets = matching_sheets(session.source, args.subject) if args.all_sheets else [args.sheet]
+        for sheet in sheets:
+            sheet_args = argparse.Namespace(**vars(args))
+            sheet_args.sheet = sheet
+            input_sheet, layout, rows = extract_rows(session, sheet_args, interactive=not args.all_sheets)
+            with profiler.stage("ingest"):
+                count = warehouse.ingest(exam, args.subject, input_sheet, os.path.abspath(input_workbook), layout.title,
+                                         layout._asdict(), rows, date)
+                profiler.add(rows=count)
+            print(f"已将{input_sheet}的{count}行导入成绩库{args.warehouse}（考试：{exam}）")
+            summaries.append({"exam": exam, "sheet": input_sheet, "rows": count})
+
+    report_profile(profiler, args)
+    return summaries
+
+
+def run_history(args: argparse.Namespace) -> dict:
+    """
+    从成绩库查询最近几次考试中某一列的成绩，每名学生一行、每次考试一列，按学校、班级及--where筛选后
+    与普通提取一样处理（排名、高亮等）并写出
+
+    :param args: 命令行参数
+    :return: 本次处理的摘要
+    """
+    from extract_formats import output_file
+    from extract_pipeline import build_output, table_layout
+    from extract_profile import make_profiler, report_profile
+    from extract_where import WhereFilter
+    from extract_workbook import WorkbookSession
+    start_time = time.perf_counter()
+    profiler = make_profiler(args)
+    column = args.history_column or args.subject
+
+    with profiler.stage("warehouse"), Warehouse(args.warehouse) as warehouse:
+        headers, rows, exams = warehouse.history(args.subject, column, args.history, args.school, args.classr)
+    if not exams:
+        raise ValueError(f"成绩库{args.warehouse}中没有含{column}列的{args.subject}考试")
+    if args.where:
+        rows = list(WhereFilter(args.where, headers).filter(rows))
+    print(f"已从成绩库查询{'、'.join(info.exam for info in exams)}的{column}成绩，共{len(rows)}名学生，"
+          f"用时{(time.perf_counter() - start_time) * 1000:.1f}毫秒")
+
+    new_workbook = output_file(args.filename, args.output_format)
+    with WorkbookSession(args.warehouse, new_workbook, profiler=profiler) as session:
+        session.output, row_count = build_output(table_layout(args.title, headers, len(rows)), rows, args, profiler=profiler)
+        with profiler.stage("save"):
+            session.save()
+        print("已成功创建新文件")
+    report_profile(profiler, args)
+
+    return {"output": new_workbook, "rows": row_count, "exams": [info.exam for info in exams],
+            "seconds": round(time.perf_counter() - start_time, 3)}
@@ -0,0 +1,177 @@
+"""
+监视目录，工作簿新增或改变后自动重新提取
+
+老师们一天中不断把更新的成绩工作簿放入共享目录。这里每隔一段时间扫描一次目录（只比较文件大小及修改时间，
+不读取内容，扫描一次只需一次目录遍历），文件在一段时间内不再变化后才认为写入完成（防止读到正在复制的文件），
+只对这些文件重新提取。每个工作簿上次提取的数据行保存为行哈希，重新提取后逐行比较，
+数据行完全相同（如只是重新保存）时不再处理及写出。
+
+跳过以整个输出为单位：排名、平均值、最大值标记、高亮及分组统计都取决于所有行，
+只要有一行新增、改变或删除，整个输出就重新处理并写出，逐行比较的结果只用于报告变化的行数。
+"""
+import argparse, hashlib, os, time
+from typing import NamedTuple
+
+
+class FileState(NamedTuple):
+    """
+    signature为（文件大小，修改时间），changed_at为观察到其最后一次变化的时间
+    """
+    signature: tuple
+    changed_at: float
+
+
+class FolderWatcher:
+    """
+    轮询目录中名称含有科目的工作簿，返回已写入完成且与上次处理时不同的文件
+    """
+
+    def __init__(self, directory: str, subject: str, settle: float = 2.0):
+        """
+        :param directory: 监视的目录
+        :param subject: 工作簿名称中含有的科目名称
+        :param settle: 文件大小及修改时间保持不变多少秒后才处理
+        """
+        self.directory = directory
+        self.subject = subject
+        self.settle = settle
+        self._seen = {}
+        self._processed = {}
+
+    def _scan(self) -> dict:
+        signatures = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                # 跳过Excel打开文件时留下的临时文件
+                if not entry.name.endswith(".xlsx") or self.subject not in entry.name or entry.name.startswith("~$"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.is_file():
+                    signatures[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        return signatures
+
+    def poll(self, now: float = None) -> list:
+        """
+        扫描一次目录
+
+        :param now: 当前时间，默认为time.time()
+        :return: 需要重新提取的工作簿路径列表
+        """
+        now = time.time() if now is None else now
+        signatures = self._scan()
+
+        for path in set(self._seen) - set(signatures):
+            # 文件已删除，之后重新出现时按新文件处理
+            del self._seen[path]
+            self._processed.pop(path, None)
+
+        ready = []
+        for path, signature in signatures.items():
+            state = self._seen.get(path)
+            if state is None:
+                # 第一次看到的文件以修改时间为变化时间，启动时已存在的文件立即处理
+                state = FileState(signature, min(now, signature[1] / 1e9))
+            elif state.signature != signature:
+                state = FileState(signature, now)
+            self._seen[path] = state
+            if now - state.changed_at >= self.settle and self._processed.get(path) != signature:
+                ready.append(path)
+        return sorted(ready)
+
+    def mark_processed(self, path: str) -> None:
+        """
+        记录文件已按当前的内容处理（包括处理失败），文件再次改变之前不再返回
+        """
+        state = self._seen.get(path)
+        if state is not None:
+            self._processed[path] = state.signature
+
+
+class RowChanges(NamedTuple):
+    """
+    与上次提取相比新增（含改变）及删除的行数，unchanged为数据行及其顺序是否完全相同
+    """
+    added: int
+    removed: int
+    unchanged: bool
+
+
+def row_hash(row: list) -> bytes:
+    """
+    一行的哈希值：对各值的repr求blake2b摘要，不受PYTHONHASHSEED影响，重启后仍可比较
+    """
+    return hashlib.blake2b(repr(tuple(row)).encode("utf-8"), digest_size=16).digest()
+
+
+def row_hashes(rows: list) -> list:
+    """
+    每行的哈希值，见row_hash
+    """
+    return [row_hash(row) for row in rows]
+
+
+def compare_rows(previous: list, current: list) -> RowChanges:
+    """
+    比较两次提取的行哈希
+
+    :param previous: 上次的行哈希，没有时为None
+    :param current: 本次的行哈希
+    :return: 变化的行数
+    """
+    if previous is None:
+        return RowChanges(len(current), 0, False)
+    if previous == current:
+        return RowChanges(0, 0, True)
+    before, after = set(previous), set(current)
+    added = sum(1 for value in current if value not in before)
+    removed = sum(1 for value in previous if value not in after)
+    return RowChanges(added, removed, False)
+
+
+def run_watch(args: argparse.Namespace, max_polls: int = None) -> list:
+    """
+    监视模式：轮询-d目录，名称含有科目的工作簿新增或改变并写入完成后，在本进程中重新提取，直到按Ctrl+C结束
+
+    每个工作簿的结果保存在以filename命名的目录下（与批量模式相同），同一进程中openpyxl只导入一次，
+    解析结果可配合--cache、--fast-reader进一步加快。提取出的学生成绩与上次完全相同时跳过该工作簿，
+    有任何一行改变时重新写出整个输出（见extract_watch）
+
+    :param args: 命令行参数
+    :param max_polls: 最多扫描的次数，默认不限
+    :return: 每次提取的处理摘要
+    """
+    from extract_batch import batch_worker
+    from extract_formats import output_file
+    output_dir = args.filename
+    if os.path.abspath(output_dir) == os.path.abspath(args.directory):
+        raise ValueError("监视模式的输出目录不能是被监视的目录")
+    os.makedirs(output_dir, exist_ok=True)
+
+    watcher = FolderWatcher(args.directory, args.subject, args.watch_settle)
+    row_cache = {}
+    summaries = []
+    print(f"正在监视{os.path.abspath(args.directory)}中的{args.subject}类工作簿，结果保存在{output_dir}，按Ctrl+C结束")
+
+    polls = 0
+    try:
+        while max_polls is None or polls < max_polls:
+            polls += 1
+            for path in watcher.poll():
+                new_workbook = os.path.join(output_dir, output_file(os.path.splitext(os.path.basename(path))[0], args.output_format))
+                summary = batch_worker(path, new_workbook, args, row_cache)
+                watcher.mark_processed(path)
+                summaries.append(summary)
+                if summary["status"] != "ok":
+                    print(f"处理{path}失败：{summary['error']}")
+                elif summary.get("skipped"):
+                    print(f"{path}的学生成绩未改变，跳过")
+                else:
+                    print(f"已更新{summary['output']}，{summary['rows']}行，用时{summary['seconds']}秒")
+            time.sleep(args.watch_interval)
+    except KeyboardInterrupt:
+        print("已停止监视")
+
+    return summaries
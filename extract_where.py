@@ -0,0 +1,346 @@
+"""
+--where筛选表达式
+
+表达式按表头名称引用列，例如：
+    学校 contains 一中 and 班级 in (3, 5, 7) and 总分 >= 500 and 物理 > 0
+    not (姓名 is empty) or 备注 = "转入"
+
+支持的条件：=（或==）、!=、<、<=、>、>=、contains、not contains、in (...)、not in (...)、is empty、is not empty，
+用and、or、not及括号组合（not优先于and，and优先于or）。值可以是数字、带引号的文本或不含空白及括号的词。
+
+与数字比较时，数字单元格直接比较，文本单元格取其中的第一个数字（如“3班”为3），没有数字的单元格（空单元格、“缺考”）
+不满足任何数字条件；与文本比较时单元格去掉首尾空白，空单元格为空文本，不会因空单元格出错。
+
+表达式只解析一次，编译为一个Python函数（每行一次调用，不逐个节点解释）；顶层and中只涉及学校、班级等已建索引的列的条件
+先在索引的不同值上求值得到行号集合，其余条件只对这些行求值，整个筛选至多遍历一次数据行。
+"""
+import re
+from typing import Callable, Iterable, List, NamedTuple, Optional
+
+KEYWORDS = ("and", "or", "not", "in", "contains", "is", "empty")
+COMPARISONS = ("=", "==", "!=", "<", "<=", ">", ">=")
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<string>'[^']*'|"[^"]*"|“[^”]*”) |
+        (?P<field>`[^`]*`) |
+        (?P<number>[-+]?\d+(?:\.\d+)?(?![^\s(),=<>!]) ) |
+        (?P<op><=|>=|!=|==|=|<|>) |
+        (?P<punct>[(),]) |
+        (?P<word>[^\s(),=<>!'"“`]+)
+    )""", re.VERBOSE)
+_NUMBER = re.compile(r"[-+]?\d+(?:\.\d+)?")
+
+# 没有数字时的值，与任何数字比较都不成立
+NAN = float("nan")
+
+
+class Token(NamedTuple):
+    kind: str
+    text: str
+    position: int
+
+
+class Literal(NamedTuple):
+    """
+    表达式中的值，number为数字值（不是数字时为None）
+    """
+    text: str
+    number: Optional[float]
+
+
+class Condition(NamedTuple):
+    """
+    一个条件，op为COMPARISONS之一或contains、in、empty，negate表示前面有not，
+    values为比较的值（in可有多个），field解析后为列在数据行中的位置
+    """
+    field: object
+    op: str
+    values: tuple
+    negate: bool = False
+
+
+class BoolOp(NamedTuple):
+    """
+    and、or组合的条件，或not（items只有一项）
+    """
+    op: str
+    items: tuple
+
+
+def tokenize(text: str) -> List[Token]:
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"无法解析--where表达式第{position + 1}个字符附近：{text[position:position + 10]}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        start = match.start(kind)
+        if kind == "word" and value.lower() in KEYWORDS:
+            kind, value = "keyword", value.lower()
+        tokens.append(Token(kind, value, start))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.index = 0
+
+    def peek(self, offset: int = 0) -> Optional[Token]:
+        index = self.index + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def accept(self, kind: str, text: str = None) -> Optional[Token]:
+        token = self.peek()
+        if token is not None and token.kind == kind and (text is None or token.text == text):
+            self.index += 1
+            return token
+        return None
+
+    def error(self, expected: str) -> ValueError:
+        token = self.peek()
+        where = f"第{token.position + 1}个字符“{token.text}”处" if token else "末尾"
+        return ValueError(f"--where表达式{where}应为{expected}：{self.text}")
+
+    def expect(self, kind: str, text: str = None, expected: str = None) -> Token:
+        token = self.accept(kind, text)
+        if token is None:
+            raise self.error(expected or text or kind)
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise ValueError("--where表达式为空")
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise self.error("and、or或表达式结束")
+        return node
+
+    def parse_or(self):
+        items = [self.parse_and()]
+        while self.accept("keyword", "or"):
+            items.append(self.parse_and())
+        return items[0] if len(items) == 1 else BoolOp("or", tuple(items))
+
+    def parse_and(self):
+        items = [self.parse_not()]
+        while self.accept("keyword", "and"):
+            items.append(self.parse_not())
+        return items[0] if len(items) == 1 else BoolOp("and", tuple(items))
+
+    def parse_not(self):
+        if self.accept("keyword", "not"):
+            return BoolOp("not", (self.parse_not(),))
+        if self.accept("punct", "("):
+            node = self.parse_or()
+            self.expect("punct", ")")
+            return node
+        return self.parse_condition()
+
+    def parse_condition(self) -> Condition:
+        token = self.peek()
+        if token is None or token.kind not in ("word", "field", "string"):
+            raise self.error("表头名称")
+        self.index += 1
+        field = token.text[1:-1] if token.kind != "word" else token.text
+
+        if self.accept("keyword", "is"):
+            negate = bool(self.accept("keyword", "not"))
+            self.expect("keyword", "empty")
+            return Condition(field, "empty", (), negate)
+
+        negate = bool(self.accept("keyword", "not"))
+        if self.accept("keyword", "contains"):
+            return Condition(field, "contains", (self.parse_value(),), negate)
+        if self.accept("keyword", "in"):
+            self.expect("punct", "(")
+            values = [self.parse_value()]
+            while self.accept("punct", ","):
+                values.append(self.parse_value())
+            self.expect("punct", ")")
+            return Condition(field, "in", tuple(values), negate)
+        if negate:
+            raise self.error("in或contains")
+
+        op = self.expect("op", expected="比较运算符、contains、in或is").text
+        value = self.parse_value()
+        if op in ("<", "<=", ">", ">=") and value.number is None:
+            raise ValueError(f"--where表达式中{field} {op} {value.text}：大小比较的值应为数字")
+        return Condition(field, "=" if op == "==" else op, (value,))
+
+    def parse_value(self) -> Literal:
+        token = self.peek()
+        if token is None or token.kind not in ("string", "number", "word"):
+            raise self.error("值")
+        self.index += 1
+        if token.kind == "string":
+            return Literal(token.text[1:-1], None)
+        if token.kind == "number":
+            return Literal(token.text, float(token.text))
+        return Literal(token.text, None)
+
+
+def parse_where(text: str):
+    """
+    解析--where表达式
+
+    :param text: 表达式
+    :return: 语法树（Condition或BoolOp），有误时抛出ValueError
+    """
+    return _Parser(text).parse()
+
+
+def _num(value) -> float:
+    """
+    单元格的数字值，文本取其中的第一个数字，没有数字时为NaN
+    """
+    if type(value) is int or type(value) is float:
+        return value
+    if value is None or isinstance(value, bool):
+        return NAN
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER.search(str(value))
+    return float(match.group()) if match else NAN
+
+
+def _text(value) -> str:
+    return "" if value is None else str(value).strip()
+
+
+def _fields(node) -> set:
+    if isinstance(node, Condition):
+        return {node.field}
+    return set().union(*(_fields(item) for item in node.items))
+
+
+class WhereFilter:
+    """
+    按表头解析好的--where表达式，编译为逐行的判断函数
+    """
+
+    # 表头的别名，如“学校”同时匹配“学校名称”
+    ALIASES = {"学校": ("学校", "学校名称"), "学校名称": ("学校名称", "学校")}
+
+    def __init__(self, text: str, headers: list):
+        """
+        :param text: 表达式
+        :param headers: 表头列表，列的位置与数据行中的位置相同
+        """
+        self.text = text
+        positions = {}
+        for position, header in enumerate(headers):
+            if header is not None:
+                positions.setdefault(str(header).strip(), position)
+        self.tree = self._resolve(parse_where(text), positions)
+        self.predicate = self.compile(self.tree)
+
+    def _resolve(self, node, positions: dict):
+        if isinstance(node, BoolOp):
+            return BoolOp(node.op, tuple(self._resolve(item, positions) for item in node.items))
+        for name in self.ALIASES.get(node.field, (node.field,)):
+            if name in positions:
+                return node._replace(field=positions[name])
+        raise ValueError(f"表头中没有{node.field}，可用的表头为{'、'.join(positions)}")
+
+    @staticmethod
+    def compile(node, single: bool = False) -> Callable:
+        """
+        将语法树编译为一个函数，值作为常量传入，不拼接到源码中
+
+        :param node: 已解析列位置的语法树
+        :param single: 为True时函数的参数为单元格的值（树中只能涉及一列），否则为整行
+        :return: 判断函数
+        """
+        constants = {"_num": _num, "_text": _text}
+
+        def constant(value) -> str:
+            name = f"c{len(constants)}"
+            constants[name] = value
+            return name
+
+        def emit(node) -> str:
+            if isinstance(node, BoolOp):
+                if node.op == "not":
+                    return f"(not {emit(node.items[0])})"
+                return "(" + f" {node.op} ".join(emit(item) for item in node.items) + ")"
+
+            cell = "value" if single else f"row[{node.field}]"
+            if node.op == "empty":
+                source = f"(_text({cell}) == '')"
+            elif node.op == "contains":
+                source = f"({constant(node.values[0].text)} in _text({cell}))"
+            elif node.op in ("=", "!=", "in"):
+                numbers = tuple(value.number for value in node.values if value.number is not None)
+                texts = tuple(value.text for value in node.values)
+                parts = []
+                if numbers:
+                    # NaN与任何数字都不相等
+                    parts.append(f"(_num({cell}) in {constant(frozenset(numbers))})")
+                parts.append(f"(_text({cell}) in {constant(frozenset(texts))})")
+                source = "(" + " or ".join(parts) + ")"
+                if node.op == "!=":
+                    # 没有数字的单元格不满足与数字的不等比较
+                    source = (f"((n := _num({cell})) == n and not {source})" if numbers
+                              else f"(not {source})")
+            else:
+                source = f"(_num({cell}) {node.op} {constant(node.values[0].number)})"
+            return f"(not {source})" if node.negate else source
+
+        code = f"def predicate({'value' if single else 'row'}):\n    return {emit(node)}\n"
+        exec(compile(code, "<where>", "exec"), constants)
+        return constants["predicate"]
+
+    def __call__(self, row: list) -> bool:
+        return self.predicate(row)
+
+    def filter(self, rows: Iterable[list]) -> Iterable[list]:
+        """
+        逐行筛选（流式读取时使用）
+        """
+        predicate = self.predicate
+        return (row for row in rows if predicate(row))
+
+    def select(self, rows: list, candidates: Iterable[int] = None, indexes: dict = None) -> list:
+        """
+        筛选出满足表达式的行号
+
+        :param rows: 数据行
+        :param candidates: 已按其他条件筛选出的有序行号，默认为所有行
+        :param indexes: 列位置到“单元格值 → 行号集合”的索引（RowIndex.by_position）
+        :return: 有序的行号列表
+        """
+        indexes = indexes or {}
+        conjuncts = self.tree.items if isinstance(self.tree, BoolOp) and self.tree.op == "and" else (self.tree,)
+
+        selected = None
+        remaining = []
+        for conjunct in conjuncts:
+            fields = _fields(conjunct)
+            position = next(iter(fields))
+            if len(fields) == 1 and position in indexes:
+                # 只涉及一个已建索引的列：在不同的值上求值，不遍历数据行
+                check = self.compile(conjunct, single=True)
+                matched = set()
+                for value, value_rows in indexes[position].items():
+                    if check(value):
+                        matched |= value_rows
+                selected = matched if selected is None else selected & matched
+            else:
+                remaining.append(conjunct)
+
+        if candidates is None:
+            candidates = sorted(selected) if selected is not None else range(len(rows))
+        elif selected is not None:
+            candidates = [row for row in candidates if row in selected]
+        if not remaining:
+            return list(candidates)
+
+        predicate = self.compile(remaining[0] if len(remaining) == 1 else BoolOp("and", tuple(remaining)))
+        return [row for row in candidates if predicate(rows[row])]
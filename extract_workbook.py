@@ -0,0 +1,796 @@
+"""
+工作簿的查找、打开及保存，工作表版式的识别，数据行的逐行读取、筛选及流式写出
+
+openpyxl只在真正读写工作簿时才导入；使用--fast-reader时源工作簿由sheetml_reader读取
+"""
+from __future__ import annotations
+import os, re, sys, zipfile
+from typing import TYPE_CHECKING, Iterable, Iterator, NamedTuple, Tuple, Union
+from sheetml_reader import SheetMLWorkbook, column_index as column_index_from_string, column_letter as get_column_letter
+from extract_profile import NULL_PROFILER, StageProfiler
+
+if TYPE_CHECKING:
+    from openpyxl.workbook.workbook import Workbook
+
+
+class WorkbookSession:
+    """
+    工作簿会话：一次运行中源工作簿只解析一次，输出工作簿只保存一次，
+    各处理阶段都直接使用内存中的工作簿，并记录加载和保存的次数
+    """
+
+    def __init__(self, source_path: str, output_path: str = None, read_only: bool = False, profiler: StageProfiler = NULL_PROFILER,
+                 fast_reader: bool = False):
+        """
+        :param source_path: 源工作簿路径（后缀为.xlsx的文件）
+        :param output_path: 输出工作簿路径
+        :param read_only: 是否以只读流式模式打开源工作簿
+        :param profiler: 各阶段的性能统计，加载和保存会计入当前阶段
+        :param fast_reader: 是否直接解析SheetML读取源工作簿，不构建openpyxl的单元格对象
+        """
+        self.source_path = source_path
+        self.output_path = output_path
+        self.read_only = read_only
+        self.fast_reader = fast_reader
+        self.profiler = profiler
+        self.load_count = 0
+        self.save_count = 0
+        self._source = None
+        self._output = None
+
+    @property
+    def source(self) -> Union[Workbook, SheetMLWorkbook]:
+        """
+        源工作簿，第一次访问时加载
+        """
+        if self._source is None:
+            if not verify_file(self.source_path):
+                sys.exit()
+            try:
+                if self.fast_reader:
+                    self._source = SheetMLWorkbook(self.source_path, read_only=self.read_only)
+                else:
+                    self._source = _load_workbook(self.source_path, read_only=self.read_only)
+            except _invalid_file_errors():
+                print("错误：无效的Excel文件")
+                sys.exit()
+            except PermissionError:
+                print("错误：文件被拒绝访问")
+                sys.exit()
+            self.load_count += 1
+            self.profiler.add(loads=1, bytes_read=os.path.getsize(self.source_path))
+        return self._source
+
+    @property
+    def output(self) -> Workbook:
+        """
+        输出工作簿，在内存中创建
+        """
+        return self._output
+
+    @output.setter
+    def output(self, wb: Workbook) -> None:
+        self._output = wb
+
+    def save(self) -> None:
+        """
+        将输出工作簿写入磁盘，整个会话只应调用一次
+        """
+        if self._output is None or self.output_path is None:
+            print("没有需要保存的输出工作簿")
+            return
+        self._output.save(self.output_path)
+        self.save_count += 1
+        self.profiler.add(saves=1, bytes_written=os.path.getsize(self.output_path))
+
+    def close(self) -> None:
+        for wb in (self._source, self._output):
+            if wb is not None:
+                wb.close()
+        self._source = None
+        self._output = None
+
+    def report(self) -> str:
+        return f"源工作簿加载{self.load_count}次，输出工作簿保存{self.save_count}次"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def _load_workbook(path: str, read_only: bool = False) -> Workbook:
+    """
+    用openpyxl加载工作簿，openpyxl在第一次加载时才导入
+    """
+    import openpyxl
+    return openpyxl.load_workbook(path, read_only=read_only)
+
+
+def create_workbook(write_only: bool = False) -> Workbook:
+    import openpyxl
+    return openpyxl.Workbook(write_only=write_only)
+
+
+def _invalid_file_errors() -> tuple:
+    """
+    无效的Excel文件可能引发的异常，openpyxl已导入时包括其InvalidFileException
+    """
+    errors = (zipfile.BadZipFile, KeyError)
+    if "openpyxl" in sys.modules:
+        from openpyxl.utils.exceptions import InvalidFileException
+        errors += (InvalidFileException,)
+    return errors
+
+
+def _open_workbook(workbook) -> Workbook:
+    """
+    传入路径则加载工作簿，传入内存中的工作簿（openpyxl或SheetML快速读取器）则直接复用
+    """
+    if not isinstance(workbook, str):
+        return workbook
+    return _load_workbook(workbook)
+
+
+def _release_workbook(wb: Workbook, workbook, save: bool = False) -> None:
+    """
+    只有由路径打开的工作簿才在此保存并关闭，内存中的工作簿交由WorkbookSession处理
+    """
+    if not isinstance(workbook, str):
+        return
+    if save:
+        wb.save(workbook)
+    wb.close()
+
+
+def _workbook_name(workbook) -> str:
+    if not isinstance(workbook, str):
+        return "当前工作簿"
+    return workbook
+
+
+def verify_file(file_path: str) -> bool:
+    """
+    检验文件是否存在且可读，不加载工作簿
+
+    :param file_path: 文件路径
+    :return: 文件是否可用
+    """
+    if not os.path.exists(file_path):
+        print("错误：文件不存在")
+        return False
+
+    if not os.access(file_path, os.R_OK):
+        print("错误：文件不可读")
+        return False
+
+    return True
+
+
+def get_workbook(subject: str, path: str) -> str:
+    """
+    获取工作簿函数
+    
+    :param subject: 工作簿名称中含有的科目名称
+    :param path: 工作簿目录
+    :return: 指定的工作簿名称
+    
+    """
+    all_files = os.listdir(path)
+    os.chdir(path)
+    excel_files = [file_name for file_name in all_files if file_name.endswith('.xlsx')]
+    selected_workbook = [test for test in excel_files if subject in test]
+    selected_workbook_num = len(selected_workbook)
+    real_selected_workbook = ""
+    
+    if selected_workbook_num == 0 and len(excel_files) > 0:
+        print(f"您所在的目录似乎没有{subject}类成绩相关文件\n但是您可以选择打开指定的文件以进入指定工作簿")
+
+        while True:
+            try:
+                selected_file_input = int(input("请您输入您想要进行操作的工作表："))
+            except:
+                print("请不要输入非数字")
+            else:
+
+                if selected_workbook_num == "exit":
+                    break
+                elif selected_file_input > selected_workbook_num or selected_file_input < 0:
+                    print("请不要输入非显示序号的数字！")
+                else:
+                    print("已完成输入！")
+                    break
+
+    elif selected_workbook_num == 0 and len(excel_files) == 0:
+        print(f"这里没有{subject}类工作簿")
+    elif selected_workbook_num == 1:
+        real_selected_workbook = selected_workbook[selected_workbook_num - 1]
+        
+    else:
+        print(f"您所在的目录存在多个含有{subject}类的工作簿\n您可以选择进入指定工作簿")
+        try:
+            for test in range(int(selected_workbook_num)):
+                print(f"{test+1}.{selected_workbook[test]}")
+        except:
+            print("发生错误！")
+        
+        #  循环以进行询问    
+        while True:
+            try:
+                selected_workbook_num_two = int(input("请您输入您想要进行操作的工作簿："))
+            except:
+                print("请不要输入非数字")
+            else:
+
+                if selected_workbook_num_two == "exit":
+                    break
+
+                elif selected_workbook_num_two > selected_workbook_num or selected_workbook_num_two <= 0:
+                    print("请不要输入非显示序号的数字！")
+
+                else:
+                    print("已完成输入！")
+                    real_selected_workbook = selected_workbook[selected_workbook_num_two - 1]
+                    break
+
+    # 只检验文件是否可用，工作簿的解析交由WorkbookSession完成；不可用时与原先一样直接退出
+    if real_selected_workbook and not verify_file(real_selected_workbook):
+        sys.exit()
+
+    return real_selected_workbook
+
+
+def get_sheet(workbook: Union[str, Workbook], sheet: str, subject: str, interactive: bool = True) -> str:
+    """
+    获取工作簿中指定的工作表
+
+    :param workbook: 工作表所在工作簿（.xlsx文件，或WorkbookSession中的工作簿）
+    :param sheet: 工作表名称
+    :param subject: 工作表名称中所含学科关键词
+    :param interactive: 有多个候选工作表时是否询问用户，否则返回空字符串
+    :return: 工作表名称
+    """
+    sheet_name = ''
+
+    if sheet is not None:
+        sheet_name = sheet
+
+    else:
+        wb = _open_workbook(workbook)
+        sheet_num = len(wb.sheetnames)
+
+        sheet_sub = [test for test in wb.sheetnames if subject in test]
+        sheet_sub_num = len(sheet_sub)
+        
+        if sheet_num == 1 and sheet_sub_num == 1:
+            sheet_name = wb.sheetnames[0]
+        elif sheet_num != 1 and sheet_sub_num == 1:
+            sheet_name = sheet_sub[0]
+        elif sheet_num == 0 or sheet_sub_num == 0:
+            print(f"您选择的工作簿没有{subject}类工作表")
+        elif not interactive:
+            print(f"您选择的工作簿中有多个{subject}类工作表，请使用--sheet指定")
+        else:
+            
+            print(f"您选择的工作簿中有多个{subject}类工作表\n您可以进行选择")
+            
+            for test in range(len(sheet_sub)):
+                print(f"{test+1}.{sheet_sub[test]}")
+                
+            while True:
+                try:
+                    selected_sheet_num = int(input("请您输入您想要进行操作的工作表："))
+                except:
+                    print("请不要输入非数字")
+                else:
+                    if selected_sheet_num > sheet_sub_num or selected_sheet_num < 0:
+                        print("请不要输入非显示序号的数字！")
+
+                    else:
+                        print("已完成输入！")
+                        sheet_name = wb.sheetnames[selected_sheet_num - 1]
+                        break
+                        
+        _release_workbook(wb, workbook)
+    
+    return sheet_name
+
+
+def get_data_place(workbook: Union[str, Workbook], sheet: str) -> Tuple[int, int, str]:
+    """
+    获取工作表内容第一次出现的位置
+
+    :param workbook: 指定工作簿（后缀为.xlsx的文件，或WorkbookSession中的工作簿）
+    :param sheet:   指定工作表
+    :return: 工作表最大行， 工作表最大列， 工作表内容开始位置
+    """
+    wb = _open_workbook(workbook)
+    new_sheet = wb[sheet]
+
+    wb_row_num = new_sheet.max_row
+    wb_column_num = new_sheet.max_column
+    result_cell = ''
+
+    if new_sheet['A1'].value is None:
+        if new_sheet['A2'].value is None or new_sheet['A2'].value == " ":
+            print("A1和A2都为空！")
+            if new_sheet['B1'].value is None or new_sheet['B1'].value == " ":
+                print("A1和B1都为空！")
+
+            else:
+                print(f"{_workbook_name(workbook)}中\n{sheet}A1无内容, B1有内容")
+                result_cell = "B1"
+
+        else:
+            print(f"{_workbook_name(workbook)}中\n{sheet}A1无内容，A2有内容")
+            result_cell = "A2"
+
+    else:
+        print(f"{_workbook_name(workbook)}中\n{sheet}A1有内容")
+        result_cell = "A1"
+
+    _release_workbook(wb, workbook)
+
+    return wb_row_num, wb_column_num, result_cell
+
+
+def verify_title(workbook: Union[str, Workbook], sheet: str, start_cell: str) -> Tuple[int, int, str, bool]:
+    """
+    确定工作表有无标题，标题大小及内容
+
+    :param workbook: 指定工作簿（后缀为.xlsx的文件，或WorkbookSession中的工作簿）
+    :param sheet: 指定工作表
+    :param start_cell: 工作表内容起始位置
+    :return: 标题行大小，标题列大小，标题值，是否存在标题
+    """
+    wb = _open_workbook(workbook)
+    sheet = wb[sheet]
+
+    # 对变量进行初赋值
+    row_size = 0
+    column_size = 0
+    default_value = ""
+    exist = False
+
+    # 是否存在标题等系列操作
+    merged_ranges = sheet.merged_cells.ranges
+    for merged_cell in merged_ranges:
+        if start_cell in merged_cell.coord:
+            exist = True
+            row_size = merged_cell.max_row - merged_cell.min_row + 1
+            column_size = merged_cell.max_col - merged_cell.min_col + 1
+            default_value = sheet[start_cell].value
+
+    _release_workbook(wb, workbook)
+
+    if exist:
+        print(f"工作表存在标题，标题是{default_value}\n标题占{row_size}行，{column_size}列")
+    else:
+        print("工作表似乎不存在标题")
+
+    return row_size, column_size, default_value, exist
+
+
+def get_sub_title(workbook: Union[str, Workbook], sheet: str, start_cell: str, title_row_size: int, title_col_size: int, max_column: int) -> Tuple[str, dict]:
+    """
+    获取表头信息
+
+    :param workbook: 指定工作簿（后缀为.xlsx的文件，或WorkbookSession中的工作簿）
+    :param sheet: 指定工作表
+    :param start_cell: 工作表内容起始位置
+    :param title_row_size: 标题的行大小
+    :param title_col_size: 标题的列大小
+    :param max_column: 工作表最大列
+    :return: 表头起始位置，表头位置及至对应的字典
+    """
+    wb = _open_workbook(workbook)
+    sheet = wb[sheet]
+
+    # 表头紧接在标题之下，内容从A2开始时整体下移一行
+    start_sub_title_row = int(''.join(re.findall(r'\d+', start_cell))) + title_row_size
+    start_sub_title_col = re.match(r"^([A-Za-z]+)", start_cell).group(1).upper()
+    start_sub_title = start_sub_title_col + str(start_sub_title_row)
+    sub_title_dict = {}
+
+    # 获取字典
+    for test in range(max_column - column_index_from_string(start_sub_title_col) + 1):
+        place = get_column_letter(column_index_from_string(start_sub_title_col) + test) + str(start_sub_title_row)
+        sub_title_dict[place] = sheet[place].value
+
+    _release_workbook(wb, workbook)
+
+    print(f"表头位置及内容的字典：\n{sub_title_dict}")
+
+    return start_sub_title, sub_title_dict
+
+
+def verify_heading_three(workbook: Union[str, Workbook], sheet: str, start_sub_title: str, max_column: int) -> Tuple[list, bool]:
+    """
+    确认工作表有无表头，表头内容
+
+    :param workbook: 指定工作簿（后缀为.xlsx的文件，或WorkbookSession中的工作簿）
+    :param sheet: 指定工作表
+    :param start_sub_title: 工作表表头起始位置
+    :param max_column: 工作表最大列
+    :return: 如果次表头存在的表次头名称列表，是否存在次标头
+    """
+    wb = _open_workbook(workbook)
+    sheet = wb[sheet]
+
+    # 官方文件必有表头，故以表头为基础，次表头与之对应，只存入列表
+    heading_three = []
+    # 注意，这里的row已转化为整型
+    sub_title_row = int(''.join(re.findall(r'\d+', start_sub_title)))
+    sub_title_col = re.match(r"^([A-Za-z]+)", start_sub_title).group(1).upper()
+    exist = False
+
+    # 判断指定的表头下的行的最后一列是否为数字，如果是则证明无次表头，如果是字符串，则有次表头
+    if isinstance(sheet.cell(row=sub_title_row + 1,
+                             column=max_column).value, int):
+        heading_three = []
+
+    elif isinstance(sheet.cell(row=sub_title_row + 1,
+                               column=max_column).value, str):
+
+        for test in range(column_index_from_string(sub_title_col), max_column + 1):
+            heading_three.append(sheet.cell(row=sub_title_row + 1, column=test).value)
+            exist = True
+
+    _release_workbook(wb, workbook)
+
+    if exist:
+        print(f"工作表存在次表头次表头列表是\n{heading_three}")
+    else:
+        print("工作表不存在次表头")
+
+    return heading_three, exist
+
+
+class SheetLayout(NamedTuple):
+    """
+    工作表版式信息，字段与get_data_place、verify_title、get_sub_title、verify_heading_three的返回值一致
+    """
+    max_row: int
+    max_column: int
+    start_cell: str
+    title_row_size: int
+    title_col_size: int
+    title: str
+    title_exist: bool
+    sub_title_place: str
+    sub_title_dict: dict
+    heading_three: list
+    heading_three_exist: bool
+
+
+def _is_blank(value) -> bool:
+    return value is None or value == " "
+
+
+def detect_layout_streaming(workbook: Workbook, sheet: str, probe_rows: int = 8) -> SheetLayout:
+    """
+    只读取工作表前几行判断版式，适用于只读（read_only）模式打开的工作簿
+
+    只读模式下拿不到合并单元格，因此以“起始行只有一个非空值，下一行有多个非空值”判断标题，
+    标题所占行数为起始行加上其后紧跟的整行空白行数
+
+    :param workbook: 以只读模式打开的工作簿
+    :param sheet: 指定工作表
+    :param probe_rows: 用于判断版式的行数
+    :return: 工作表版式信息
+    """
+    ws = workbook[sheet]
+    head_rows = [list(row) for row in ws.iter_rows(min_row=1, max_row=probe_rows, values_only=True)]
+    head_rows += [[] for _ in range(probe_rows - len(head_rows))]
+
+    def value_at(row: int, column: int):
+        cells = head_rows[row - 1] if row <= len(head_rows) else []
+        return cells[column - 1] if column <= len(cells) else None
+
+    # 与get_data_place的判断顺序一致
+    if value_at(1, 1) is None:
+        if _is_blank(value_at(2, 1)):
+            print("A1和A2都为空！")
+            start_cell = "" if _is_blank(value_at(1, 2)) else "B1"
+        else:
+            start_cell = "A2"
+    else:
+        start_cell = "A1"
+
+    if not start_cell:
+        print("A1和B1都为空！")
+        return SheetLayout(ws.max_row or 0, 0, "", 0, 0, "", False, "", {}, [], False)
+
+    start_row = int(''.join(re.findall(r'\d+', start_cell)))
+    start_col_letter = re.match(r"^([A-Za-z]+)", start_cell).group(1).upper()
+    start_col = column_index_from_string(start_col_letter)
+
+    def filled(row: int) -> int:
+        return sum(1 for value in head_rows[row - 1][start_col - 1:] if not _is_blank(value)) if row <= len(head_rows) else 0
+
+    # 标题判断
+    title_row_size = 0
+    title = ""
+    title_exist = False
+    if filled(start_row) == 1 and not _is_blank(value_at(start_row, start_col)):
+        next_row = start_row + 1
+        while next_row < probe_rows and filled(next_row) == 0:
+            next_row += 1
+        if filled(next_row) > 1:
+            title_exist = True
+            title = value_at(start_row, start_col)
+            title_row_size = next_row - start_row
+
+    # 表头，与get_sub_title相同，从起始行 + 标题行数行开始
+    sub_title_row = start_row + title_row_size
+    header = head_rows[sub_title_row - 1] if sub_title_row <= len(head_rows) else []
+    max_column = len(header)
+    while max_column > 0 and header[max_column - 1] is None:
+        max_column -= 1
+    max_column = max(max_column, ws.max_column or 0)
+    title_col_size = max_column - start_col + 1 if title_exist else 0
+
+    sub_title_place = f"{start_col_letter}{sub_title_row}"
+    sub_title_dict = {f"{get_column_letter(column)}{sub_title_row}": value_at(sub_title_row, column)
+                      for column in range(start_col, max_column + 1)}
+
+    # 次表头，与verify_heading_three相同，以表头下一行最后一列的类型判断
+    heading_three = []
+    heading_three_exist = False
+    if isinstance(value_at(sub_title_row + 1, max_column), str):
+        heading_three = [value_at(sub_title_row + 1, column) for column in range(start_col, max_column + 1)]
+        heading_three_exist = True
+
+    if title_exist:
+        print(f"工作表存在标题，标题是{title}\n标题占{title_row_size}行，{title_col_size}列")
+    else:
+        print("工作表似乎不存在标题")
+    print(f"表头位置及内容的字典：\n{sub_title_dict}")
+    if heading_three_exist:
+        print(f"工作表存在次表头次表头列表是\n{heading_three}")
+    else:
+        print("工作表不存在次表头")
+
+    return SheetLayout(ws.max_row or 0, max_column, start_cell, title_row_size, title_col_size, title, title_exist,
+                       sub_title_place, sub_title_dict, heading_three, heading_three_exist)
+
+
+def data_start_row(layout: SheetLayout) -> int:
+    """
+    数据行的起始行号：表头下一行，有次表头时再下一行
+    """
+    sub_title_row = int(''.join(re.findall(r'\d+', layout.sub_title_place)))
+    return sub_title_row + (2 if layout.heading_three_exist else 1)
+
+
+def header_column(sub_title_dict: dict, names: Tuple[str, ...]) -> int:
+    """
+    在表头中查找指定名称所在列，返回列号，找不到返回0
+    """
+    for key, value in sub_title_dict.items():
+        if value in names:
+            return column_index_from_string(re.match(r"^([A-Za-z]+)", key).group(1).upper())
+    return 0
+
+
+def stream_personal_scores(workbook: Workbook, sheet: str, layout: SheetLayout, school: str, class_num: str) -> Iterator[list]:
+    """
+    逐行读取工作表的值，边读边按学校、班级筛选，内存占用与工作表行数无关
+
+    :param workbook: 以只读模式打开的工作簿
+    :param sheet: 指定工作表
+    :param layout: detect_layout_streaming得到的版式信息
+    :param school: 指定筛选的学生所在学校，为None时不筛选
+    :param class_num: 指定筛选出的班级，为None时不筛选
+    :return: 逐行产出学生个人成绩信息，每一项为一行从内容起始列开始的值
+    """
+    start_col = column_index_from_string(re.match(r"^([A-Za-z]+)", layout.start_cell).group(1).upper())
+    school_col = header_column(layout.sub_title_dict, ("学校", "学校名称"))
+    class_col = header_column(layout.sub_title_dict, ("班级",))
+
+    if school is not None and not school_col:
+        print("表头没有\"学校\"或\"学校名称\"")
+        return
+    if class_num is not None and not class_col:
+        print("表头没有\"班级\"")
+        return
+
+    start_record_row = data_start_row(layout)
+
+    for values in workbook[sheet].iter_rows(min_row=start_record_row, values_only=True):
+        if school is not None:
+            value = values[school_col - 1] if school_col <= len(values) else None
+            if value is None or school not in str(value):
+                continue
+        if class_num is not None:
+            value = values[class_col - 1] if class_col <= len(values) else None
+            if value is None or class_num not in str(value):
+                continue
+
+        row_list = list(values[start_col - 1:layout.max_column])
+        row_list += [None] * (layout.max_column - start_col + 1 - len(row_list))
+        yield row_list
+
+
+def read_data_rows(workbook: Workbook, sheet: str, layout: SheetLayout) -> Iterator[list]:
+    """
+    按版式逐行读取数据行的值（从内容起始列到最大列），行范围与stream_personal_scores相同
+
+    :param workbook: 源工作簿（普通或只读模式均可）
+    :param sheet: 指定工作表
+    :param layout: 工作表版式信息
+    :return: 逐行产出的值列表
+    """
+    start_col = column_index_from_string(re.match(r"^([A-Za-z]+)", layout.start_cell).group(1).upper())
+    start_record_row = data_start_row(layout)
+    width = layout.max_column - start_col + 1
+
+    for values in workbook[sheet].iter_rows(min_row=start_record_row, min_col=start_col,
+                                            max_col=layout.max_column, values_only=True):
+        row_list = list(values)
+        row_list += [None] * (width - len(row_list))
+        yield row_list
+
+
+class RowIndex:
+    """
+    学校、班级的哈希索引
+
+    一次遍历数据行，建立“单元格值 → 行号集合”的字典，之后按学校、班级或两者组合查询，
+    查询只需遍历不同的值（学校、班级的个数），而不必再遍历所有行
+    """
+
+    SCHOOL = ("学校", "学校名称")
+    CLASS = ("班级",)
+
+    def __init__(self):
+        self.row_count = 0
+        self.fields = {}
+        self.indexes = {}
+
+    @classmethod
+    def build(cls, rows: Iterable[list], layout: SheetLayout) -> "RowIndex":
+        """
+        一次遍历建立学校和班级的索引
+
+        :param rows: read_data_rows得到的数据行
+        :param layout: 工作表版式信息
+        :return: 建好的索引
+        """
+        index = cls()
+        start_col = column_index_from_string(re.match(r"^([A-Za-z]+)", layout.start_cell).group(1).upper())
+        for names in (cls.SCHOOL, cls.CLASS):
+            column = header_column(layout.sub_title_dict, names)
+            if column:
+                index.fields[names] = column - start_col
+                index.indexes[names] = {}
+
+        row_id = -1
+        for row_id, row in enumerate(rows):
+            for names, position in index.fields.items():
+                value = row[position] if position < len(row) else None
+                index.indexes[names].setdefault(value, set()).add(row_id)
+        index.row_count = row_id + 1
+
+        return index
+
+    def lookup(self, names: Tuple[str, ...], keyword: str) -> set:
+        """
+        查找指定列中包含keyword的所有行
+
+        :param names: 列名，RowIndex.SCHOOL或RowIndex.CLASS
+        :param keyword: 要查找的内容，按包含关系匹配
+        :return: 行号集合
+        """
+        if names not in self.indexes:
+            print("表头没有" + "或".join(f"\"{name}\"" for name in names))
+            return set()
+
+        rows = set()
+        for value, value_rows in self.indexes[names].items():
+            if value is not None and keyword in str(value):
+                rows |= value_rows
+        return rows
+
+    def select(self, school: str = None, class_num: str = None) -> set:
+        """
+        按学校、班级或两者组合查询
+
+        :param school: 指定筛选的学生所在学校，为None时不筛选
+        :param class_num: 指定筛选出的班级，为None时不筛选
+        :return: 行号集合
+        """
+        rows = None
+        for names, keyword in ((self.SCHOOL, school), (self.CLASS, class_num)):
+            if keyword is not None:
+                matched = self.lookup(names, keyword)
+                rows = matched if rows is None else rows & matched
+
+        return set(range(self.row_count)) if rows is None else rows
+
+    def by_position(self) -> dict:
+        """
+        数据行中的列位置到该列索引的字典，供--where在索引上求值
+        """
+        return {position: self.indexes[names] for names, position in self.fields.items()}
+
+    def groups(self, names: Tuple[str, ...]) -> dict:
+        """
+        按指定列的值分组
+
+        :param names: 列名，RowIndex.SCHOOL或RowIndex.CLASS
+        :return: 单元格值到有序行号列表的字典
+        """
+        return {value: sorted(rows) for value, rows in self.indexes.get(names, {}).items()}
+
+
+def title_rows(title: str, headers: list, heading_three: list, title_exist: bool, heading_three_exist: bool) -> list:
+    """
+    新工作表的标题行、表头行及次表头行
+    """
+    rows = []
+    if title_exist:
+        rows.append([title])
+    rows.append(list(headers))
+    if heading_three_exist:
+        rows.append(list(heading_three))
+    return rows
+
+
+def create_streaming_workbook(sheet: str, max_column: int, start_cell: str, title: str, sub_title: dict, heading_three: list, title_exist: bool, heading_three_exist: bool, data: Iterable[list], wb: Workbook = None) -> Tuple[Workbook, int]:
+    """
+    以只写（write_only）模式创建新的工作簿，按整行追加内容
+
+    只写模式下追加的行会直接写入临时文件，内存占用不随行数增长，但之后不能再修改单元格，
+    所以data应是已经转化好的行（可以是生成器），保存交由WorkbookSession完成
+
+    :param sheet: 新命名的工作表
+    :param max_column: 原工作表最大列
+    :param start_cell: 原工作表内容起始位置
+    :param title: 工作表内容的标题
+    :param sub_title: 原工作表的表头
+    :param heading_three: 原工作表的次表头
+    :param title_exist: 原内容标题是否存在
+    :param heading_three_exist: 原次表头是否存在
+    :param data: 逐行产出学生个人成绩信息的可迭代对象
+    :param wb: 已有的只写模式工作簿，给出时在其中新建工作表
+    :return: 只写模式的新工作簿，写入的数据行数
+    """
+    if wb is None:
+        wb = create_workbook(write_only=True)
+    ws = wb.create_sheet(sheet)
+
+    start_cell_column = re.match(r"^([A-Za-z]+)", start_cell).group(1).upper()
+    max_column = max_column - column_index_from_string(start_cell_column) + 1
+
+    if title_exist:
+        ws.merged_cells.add(f"A1:{get_column_letter(max_column)}1")
+
+    for row in title_rows(title, list(sub_title.values()), heading_three, title_exist, heading_three_exist):
+        ws.append(row)
+
+    row_count = 0
+    for row in data:
+        ws.append(row)
+        row_count += 1
+
+    print(f"已写入{row_count}行学生成绩")
+
+    return wb, row_count
+
+
+def safe_name(name: str, limit: int = None) -> str:
+    """
+    去掉文件名、工作表名中不允许出现的字符
+    """
+    name = re.sub(r'[\\/:*?"<>|\[\]]', "_", name) or "_"
+    return name[:limit] if limit else name
+
+
+def matching_sheets(source: Union[Workbook, SheetMLWorkbook], subject: str) -> list:
+    """
+    工作簿中名称含有科目的所有工作表，没有时（如工作表按考试命名）为所有工作表
+    """
+    return [name for name in source.sheetnames if subject in name] or list(source.sheetnames)
@@ -0,0 +1,521 @@
+"""
+直接解析.xlsx中SheetML的快速读取器
+
+openpyxl会为每个单元格构建一个Python对象，而提取成绩只需要一个工作表的原始值、共享字符串表以及合并单元格列表。
+这里直接打开.xlsx压缩包，按行分段解析目标工作表的XML，并逐项解析sharedStrings.xml，只保存单元格的值。
+
+SheetMLWorkbook、SheetMLWorksheet提供了get_sheet、get_data_place、verify_title、get_sub_title、verify_heading_three
+及read_data_rows用到的那部分openpyxl接口（sheetnames、ws["A1"]、ws.cell()、max_row、max_column、merged_cells.ranges、
+iter_rows(values_only=True)），因此现有的版式判断函数可以原样作用在它上面，得到与openpyxl相同的结果。
+"""
+import datetime, posixpath, re, zipfile
+import xml.etree.ElementTree as ET
+from typing import Iterator, Optional, Tuple
+
+
+NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_DOC_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_COORDINATE = re.compile(r"^\$?([A-Za-z]{1,3})\$?(\d+)$")
+# 公式中的相对引用（不含$的部分在共享公式中需要平移）
+_FORMULA_REFERENCE = re.compile(r"(?<![A-Za-z_!])(\$?)([A-Z]{1,3})(\$?)(\d+)(?![\d(])")
+# Excel内置的日期、时间格式编号
+_BUILTIN_DATE_FORMATS = set(range(14, 23)) | {45, 46, 47}
+_DATE_FORMAT_CHARS = re.compile(r"[dmyhs]", re.IGNORECASE)
+_EXCEL_EPOCH = datetime.datetime(1899, 12, 30)
+
+
+def column_index(letters: str) -> int:
+    """
+    列字母转化为列号，如 A -> 1，AB -> 28
+    """
+    index = 0
+    for letter in letters.upper():
+        index = index * 26 + ord(letter) - 64
+    return index
+
+
+def column_letter(index: int) -> str:
+    """
+    列号转化为列字母，如 1 -> A，28 -> AB
+    """
+    letters = ""
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def split_coordinate(coordinate: str) -> Tuple[int, int]:
+    """
+    单元格坐标转化为（行号，列号），如 B3 -> (3, 2)
+    """
+    match = _COORDINATE.match(coordinate)
+    if match is None:
+        raise ValueError(f"无效的单元格坐标{coordinate}")
+    return int(match.group(2)), column_index(match.group(1))
+
+
+def _cast_number(text: str):
+    # 与openpyxl一致：含小数点或指数的为浮点型，否则为整型
+    if "." in text or "E" in text or "e" in text:
+        return float(text)
+    return int(text)
+
+
+def _rich_text(element) -> str:
+    """
+    共享字符串或内联字符串的文字：纯文本直接取<t>，富文本拼接各段<r>中的<t>，忽略注音（rPh）
+    """
+    direct = element.find(NS_MAIN + "t")
+    if direct is not None:
+        return direct.text or ""
+    return "".join(run.findtext(NS_MAIN + "t") or "" for run in element.iter(NS_MAIN + "r"))
+
+
+def _from_excel(serial: float):
+    """
+    Excel日期序号转化为datetime，1900年2月29日之前的序号按Excel的闰年错误修正
+    """
+    if serial < 60:
+        serial += 1
+    moment = _EXCEL_EPOCH + datetime.timedelta(days=serial)
+    if moment.time() == datetime.time(0):
+        return moment
+    # 去掉浮点误差带来的微秒
+    return moment.replace(microsecond=0) + datetime.timedelta(seconds=round(moment.microsecond / 1e6))
+
+
+def _shift_formula(formula: str, row_delta: int, col_delta: int) -> str:
+    """
+    共享公式：将主公式中的相对引用平移到当前单元格
+    """
+    def shift(match):
+        col_abs, letters, row_abs, row = match.groups()
+        column = letters if col_abs else column_letter(column_index(letters) + col_delta)
+        row = row if row_abs else str(int(row) + row_delta)
+        return f"{col_abs}{column}{row_abs}{row}"
+
+    # 不处理字符串常量中的内容
+    parts = formula.split('"')
+    for number in range(0, len(parts), 2):
+        parts[number] = _FORMULA_REFERENCE.sub(shift, parts[number])
+    return '"'.join(parts)
+
+
+_CHUNK_SIZE = 1024 * 1024
+_ROOT_START = re.compile(rb"<((?:[\w.-]+:)?worksheet)\b[^>]*>")
+_SHEET_DATA_START = re.compile(rb"<((?:[\w.-]+:)?)sheetData\b[^>]*?(/?)>")
+
+
+def _sheet_parts(stream, chunk_size: int = _CHUNK_SIZE) -> Iterator[Tuple[str, ET.Element]]:
+    """
+    分段解析工作表XML，依次产出("head", 根元素)、每一行的("row", <row>元素)、("tail", 根元素)
+
+    逐个元素产出事件的iterparse在Python中处理每个事件，百万级单元格时开销比解析本身还大。
+    这里按字节在</row>处切分<sheetData>，每段约chunk_size字节，套上原来的根元素标签后交给C实现的解析器一次解析，
+    内存占用只与chunk_size有关。head为<sheetData>之前的部分（含<dimension>），tail为之后的部分（含<mergeCells>）。
+    """
+    buffer = b""
+    match = None
+    while match is None:
+        chunk = stream.read(chunk_size)
+        buffer += chunk
+        match = _SHEET_DATA_START.search(buffer)
+        if match is None and not chunk:
+            raise ValueError("工作表XML中没有<sheetData>")
+
+    root = _ROOT_START.search(buffer, 0, match.start())
+    if root is None:
+        raise ValueError("工作表XML中没有<worksheet>")
+    root_start = root.group(0)
+    root_end = b"</" + root.group(1) + b">"
+    yield "head", ET.fromstring(buffer[:match.start()] + root_end)
+
+    buffer = buffer[match.end():]
+    if not match.group(2):
+        row_end = b"</" + match.group(1) + b"row>"
+        data_end = b"</" + match.group(1) + b"sheetData>"
+        while True:
+            end = buffer.find(data_end)
+            cut = end if end >= 0 else buffer.rfind(row_end)
+            if end < 0 and cut >= 0:
+                cut += len(row_end)
+            if cut > 0:
+                for row in ET.fromstring(root_start + buffer[:cut] + root_end):
+                    yield "row", row
+            if end >= 0:
+                buffer = buffer[end + len(data_end):]
+                break
+            buffer = buffer[max(cut, 0):]
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                raise ValueError("工作表XML不完整")
+            buffer += chunk
+
+    yield "tail", ET.fromstring(root_start + buffer + stream.read())
+
+
+class MergedRange:
+    """
+    合并单元格范围，字段与openpyxl的MergedCellRange相同
+    """
+    __slots__ = ("coord", "min_row", "min_col", "max_row", "max_col")
+
+    def __init__(self, coord: str):
+        start, _, end = coord.partition(":")
+        self.coord = coord
+        self.min_row, self.min_col = split_coordinate(start)
+        self.max_row, self.max_col = split_coordinate(end or start)
+
+    def __repr__(self):
+        return f"<MergedRange {self.coord}>"
+
+
+class _MergedCells:
+    __slots__ = ("ranges",)
+
+    def __init__(self, ranges: list):
+        self.ranges = ranges
+
+
+class _Cell:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class SheetMLWorksheet:
+    """
+    一个工作表：需要随机访问单元格时整表解析为值的二维列表，只逐行读取时直接边解析边产出
+    """
+
+    def __init__(self, workbook: "SheetMLWorkbook", title: str, path: str):
+        self.parent = workbook
+        self.title = title
+        self.path = path
+        self._rows = None
+        self._merged = None
+        self._max_column = 0
+        self._dimension = None
+
+    def _parse(self) -> Iterator[Tuple[int, list]]:
+        """
+        逐行解析工作表XML，产出（行号，该行的值列表），列表下标0对应A列
+
+        解析结束时记录合并单元格
+        """
+        shared_strings = self.parent.shared_strings
+        date_styles = self.parent.date_styles
+        data_only = self.parent.data_only
+        shared_formulas = {}
+        column_numbers = {}
+        merged = []
+        next_row = 1
+
+        tag_cell = NS_MAIN + "c"
+        tag_value = NS_MAIN + "v"
+        tag_formula = NS_MAIN + "f"
+        tag_inline = NS_MAIN + "is"
+
+        with self.parent.archive.open(self.path) as stream:
+            for part, element in _sheet_parts(stream):
+                if part == "head":
+                    dimension = element.find(NS_MAIN + "dimension")
+                    if dimension is not None:
+                        self._dimension = dimension.get("ref")
+                    continue
+                if part == "tail":
+                    merged = [MergedRange(cell.get("ref")) for cell in element.iter(NS_MAIN + "mergeCell")]
+                    continue
+
+                row_number = int(element.get("r") or next_row)
+                values = []
+                next_column = 1
+                for cell in element.iter(tag_cell):
+                    coordinate = cell.get("r")
+                    if coordinate:
+                        letters = coordinate.rstrip("0123456789")
+                        column = column_numbers.get(letters)
+                        if column is None:
+                            column = column_numbers[letters] = column_index(letters.lstrip("$"))
+                    else:
+                        column = next_column
+                    next_column = column + 1
+                    if column > len(values):
+                        values.extend([None] * (column - len(values)))
+
+                    data_type = cell.get("t", "n")
+                    value_element = cell.find(tag_value)
+                    text = value_element.text if value_element is not None else None
+                    value = None
+
+                    formula = cell.find(tag_formula) if not data_only else None
+                    if formula is not None and data_type != "array":
+                        if formula.get("t") == "shared" and formula.get("si") is not None:
+                            if formula.text:
+                                shared_formulas[formula.get("si")] = (formula.text, row_number, column)
+                                value = "=" + formula.text
+                            elif formula.get("si") in shared_formulas:
+                                master, master_row, master_col = shared_formulas[formula.get("si")]
+                                value = "=" + _shift_formula(master, row_number - master_row, column - master_col)
+                        elif formula.text:
+                            value = "=" + formula.text
+
+                    if value is None:
+                        if data_type == "inlineStr":
+                            inline = cell.find(tag_inline)
+                            value = _rich_text(inline) if inline is not None else None
+                        elif text is None:
+                            value = None
+                        elif data_type == "s":
+                            value = shared_strings[int(text)]
+                        elif data_type == "n":
+                            value = _cast_number(text)
+                            style = cell.get("s")
+                            if style is not None and int(style) in date_styles:
+                                value = _from_excel(value)
+                        elif data_type == "b":
+                            value = bool(int(text))
+                        elif data_type == "d":
+                            value = datetime.datetime.fromisoformat(text.rstrip("Z"))
+                        else:
+                            # str（公式的字符串结果）、e（错误值）等均按字符串处理
+                            value = text
+
+                    values[column - 1] = value
+
+                next_row = row_number + 1
+                yield row_number, values
+
+        self._merged = merged
+
+    def _ensure_loaded(self) -> None:
+        if self._rows is not None:
+            return
+        rows = []
+        for row_number, values in self._parse():
+            if row_number > len(rows):
+                rows.extend([[] for _ in range(row_number - len(rows))])
+            rows[row_number - 1] = values
+
+        # 与openpyxl一致：合并范围内除左上角外的单元格都视为空单元格，合并范围也计入最大行、最大列
+        for merged in self._merged:
+            if merged.max_row > len(rows):
+                rows.extend([[] for _ in range(merged.max_row - len(rows))])
+            for row in range(merged.min_row, merged.max_row + 1):
+                values = rows[row - 1]
+                if merged.max_col > len(values):
+                    values.extend([None] * (merged.max_col - len(values)))
+                start = merged.min_col if row == merged.min_row else merged.min_col - 1
+                values[start:merged.max_col] = [None] * (merged.max_col - start)
+
+        # 去掉末尾没有任何单元格的行，与openpyxl的max_row一致
+        while rows and not rows[-1]:
+            rows.pop()
+        self._rows = rows
+        self._max_column = max((len(values) for values in rows), default=0)
+
+    def _dimension_bounds(self) -> Optional[Tuple[int, int]]:
+        """
+        不解析整表时，从<sheetData>之前的<dimension>读取最大行、最大列
+        """
+        if self._dimension is None:
+            with self.parent.archive.open(self.path) as stream:
+                part, head = next(_sheet_parts(stream))
+            dimension = head.find(NS_MAIN + "dimension")
+            self._dimension = dimension.get("ref") if dimension is not None else ""
+        if not self._dimension:
+            return None
+        end = self._dimension.partition(":")[2] or self._dimension
+        return split_coordinate(end)
+
+    @property
+    def max_row(self) -> Optional[int]:
+        if self._rows is None and self.parent.read_only:
+            # 与openpyxl的只读模式一致：没有<dimension>时为None
+            bounds = self._dimension_bounds()
+            return bounds[0] if bounds is not None else None
+        self._ensure_loaded()
+        return max(len(self._rows), 1)
+
+    @property
+    def max_column(self) -> Optional[int]:
+        if self._rows is None and self.parent.read_only:
+            # 与openpyxl的只读模式一致：没有<dimension>时为None
+            bounds = self._dimension_bounds()
+            return bounds[1] if bounds is not None else None
+        self._ensure_loaded()
+        return max(self._max_column, 1)
+
+    @property
+    def merged_cells(self) -> _MergedCells:
+        self._ensure_loaded()
+        return _MergedCells(self._merged)
+
+    def _value(self, row: int, column: int):
+        self._ensure_loaded()
+        if row > len(self._rows):
+            return None
+        values = self._rows[row - 1]
+        return values[column - 1] if column <= len(values) else None
+
+    def cell(self, row: int, column: int) -> _Cell:
+        return _Cell(self._value(row, column))
+
+    def __getitem__(self, coordinate: str) -> _Cell:
+        return _Cell(self._value(*split_coordinate(coordinate)))
+
+    def iter_rows(self, min_row: int = 1, max_row: int = None, min_col: int = 1, max_col: int = None, values_only: bool = True) -> Iterator[tuple]:
+        """
+        逐行产出值的元组，与openpyxl的iter_rows(values_only=True)相同，空行产出全为None的元组
+
+        只读模式下且整表尚未解析时边解析边产出，内存占用与行数无关
+        """
+        if not values_only:
+            raise ValueError("SheetMLWorksheet只支持values_only=True")
+
+        if self._rows is not None or not self.parent.read_only:
+            self._ensure_loaded()
+            if not self._rows and max_row is None and max_col is None and min_row == 1 and min_col == 1:
+                # 与openpyxl一致：空工作表不指定范围时不产出任何行
+                return
+            last_row = max_row if max_row is not None else self.max_row
+            last_col = max_col if max_col is not None else self.max_column
+            width = last_col - min_col + 1
+            for row in range(min_row, last_row + 1):
+                values = self._rows[row - 1][min_col - 1:last_col] if row <= len(self._rows) else []
+                yield tuple(values) + (None,) * (width - len(values))
+            return
+
+        bounds = self._dimension_bounds()
+        last_col = max_col if max_col is not None else (bounds[1] if bounds else None)
+        expected = min_row
+        for row_number, values in self._parse():
+            if row_number < min_row:
+                continue
+            if max_row is not None and row_number > max_row:
+                break
+            width = (last_col if last_col is not None else len(values)) - min_col + 1
+            # 补上中间没有单元格的行
+            while expected < row_number:
+                yield (None,) * width
+                expected += 1
+            part = values[min_col - 1:min_col - 1 + width]
+            yield tuple(part) + (None,) * (width - len(part))
+            expected = row_number + 1
+
+
+class SheetMLWorkbook:
+    """
+    只读的.xlsx工作簿，只解析需要的工作表
+    """
+
+    def __init__(self, path: str, read_only: bool = False, data_only: bool = False):
+        """
+        :param path: .xlsx文件路径
+        :param read_only: 为True时iter_rows直接流式解析，不保留整表
+        :param data_only: 为True时读取公式的计算结果而不是公式本身
+        """
+        self.path = path
+        self.read_only = read_only
+        self.data_only = data_only
+        self.archive = zipfile.ZipFile(path)
+        self._sheets = self._read_sheet_paths()
+        self._worksheets = {}
+        self._shared_strings = None
+        self._date_styles = None
+
+    def _read_sheet_paths(self) -> dict:
+        """
+        由workbook.xml及其关系文件得到工作表名称到XML路径的字典（保持工作表顺序）
+        """
+        workbook_path = "xl/workbook.xml"
+        with self.archive.open("_rels/.rels") as stream:
+            for relation in ET.parse(stream).getroot():
+                if relation.get("Type", "").endswith("/officeDocument"):
+                    workbook_path = relation.get("Target").lstrip("/")
+
+        base = posixpath.dirname(workbook_path)
+        rels_path = posixpath.join(base, "_rels", posixpath.basename(workbook_path) + ".rels")
+        targets = {}
+        with self.archive.open(rels_path) as stream:
+            for relation in ET.parse(stream).getroot():
+                target = relation.get("Target")
+                targets[relation.get("Id")] = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(base, target))
+
+        with self.archive.open(workbook_path) as stream:
+            root = ET.parse(stream).getroot()
+        sheets = {}
+        for sheet in root.iter(NS_MAIN + "sheet"):
+            sheets[sheet.get("name")] = targets[sheet.get(NS_DOC_REL + "id")]
+
+        self._base = base
+        self._rels = targets
+        return sheets
+
+    def _part(self, relation_suffix: str, default: str) -> Optional[str]:
+        names = set(self.archive.namelist())
+        for target in self._rels.values():
+            if target.endswith(relation_suffix) and target in names:
+                return target
+        return default if default in names else None
+
+    @property
+    def shared_strings(self) -> list:
+        """
+        共享字符串表，第一次使用时逐项解析
+        """
+        if self._shared_strings is None:
+            strings = []
+            path = self._part("sharedStrings.xml", posixpath.join(self._base, "sharedStrings.xml"))
+            if path is not None:
+                tag_item = NS_MAIN + "si"
+                with self.archive.open(path) as stream:
+                    for event, element in ET.iterparse(stream, events=("end",)):
+                        if element.tag != tag_item:
+                            continue
+                        strings.append(_rich_text(element))
+                        element.clear()
+            self._shared_strings = strings
+        return self._shared_strings
+
+    @property
+    def date_styles(self) -> set:
+        """
+        使用日期、时间格式的样式编号集合，用于将数字转化为datetime
+        """
+        if self._date_styles is None:
+            styles = set()
+            path = self._part("styles.xml", posixpath.join(self._base, "styles.xml"))
+            if path is not None:
+                with self.archive.open(path) as stream:
+                    root = ET.parse(stream).getroot()
+                custom = {}
+                for number_format in root.iter(NS_MAIN + "numFmt"):
+                    code = re.sub(r'"[^"]*"|\[[^\]]*\]|\\\\.', "", number_format.get("formatCode", ""))
+                    custom[int(number_format.get("numFmtId"))] = bool(_DATE_FORMAT_CHARS.search(code))
+                cell_xfs = root.find(NS_MAIN + "cellXfs")
+                if cell_xfs is not None:
+                    for index, xf in enumerate(cell_xfs.findall(NS_MAIN + "xf")):
+                        format_id = int(xf.get("numFmtId", 0))
+                        if format_id in _BUILTIN_DATE_FORMATS or custom.get(format_id, False):
+                            styles.add(index)
+            self._date_styles = styles
+        return self._date_styles
+
+    @property
+    def sheetnames(self) -> list:
+        return list(self._sheets)
+
+    def __getitem__(self, name: str) -> SheetMLWorksheet:
+        if name not in self._sheets:
+            raise KeyError(f"工作表{name}不存在")
+        if name not in self._worksheets:
+            self._worksheets[name] = SheetMLWorksheet(self, name, self._sheets[name])
+        return self._worksheets[name]
+
+    def close(self) -> None:
+        self.archive.close()
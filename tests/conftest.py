@@ -0,0 +1,40 @@
+"""
+测试共用的夹具：仓库根目录及benchmarks加入导入路径，按版式生成的模拟成绩工作簿
+"""
+import os, sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import bench
+
+# 测试用的工作簿行数，足以覆盖30所学校中的大部分
+ROWS = 120
+
+
+@pytest.fixture(scope="session")
+def gradebooks(tmp_path_factory) -> dict:
+    """
+    每种版式一个模拟成绩工作簿，版式名到路径的字典
+    """
+    directory = tmp_path_factory.mktemp("gradebooks")
+    paths = {}
+    for variant in bench.VARIANTS:
+        os.makedirs(directory / variant)
+        path = str(directory / variant / "物理成绩.xlsx")
+        bench.generate_gradebook(path, ROWS, variant)
+        paths[variant] = path
+    return paths
+
+
+@pytest.fixture
+def no_numpy(monkeypatch):
+    """
+    模拟没有安装NumPy，列式运算走纯Python路径
+    """
+    import extract_highlight, extract_pipeline, extract_stats, extract_types
+    for module in (extract_highlight, extract_pipeline, extract_stats, extract_types):
+        monkeypatch.setattr(module, "np", None)
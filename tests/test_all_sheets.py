@@ -0,0 +1,56 @@
+"""
+--all-sheets：每个匹配的工作表一个输出或（-ss）同一工作簿中的一个工作表，无法确定版式的工作表跳过
+"""
+import contextlib, io, os
+
+import openpyxl
+import pytest
+
+import bench
+from extract_batch import run_all_sheets
+
+
+@pytest.fixture(scope="module")
+def workbook(gradebooks, tmp_path_factory) -> str:
+    """
+    两个成绩相同的物理工作表、一个空白的物理工作表及一个不匹配的化学工作表
+    """
+    wb = openpyxl.load_workbook(gradebooks["title"])
+    wb.copy_worksheet(wb.worksheets[0]).title = "物理二"
+    wb.create_sheet("物理空白")
+    wb.create_sheet("化学")
+    path = str(tmp_path_factory.mktemp("all_sheets") / "期末物理.xlsx")
+    wb.save(path)
+    return path
+
+
+def _run(workbook: str, output: str, *extra: str) -> tuple:
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        summaries = run_all_sheets(workbook, bench._args(workbook, output, "-as", *extra))
+    return summaries, log.getvalue()
+
+
+@pytest.mark.parametrize("extra", [(), ("-fr",), ("-of", "csv")])
+def test_each_sheet_in_its_own_file(workbook, tmp_path, extra):
+    output = str(tmp_path / "各工作表")
+    summaries, log = _run(workbook, output, *extra)
+    written = [summary for summary in summaries if summary.get("status", "ok") == "ok"]
+
+    assert [summary["sheet"] for summary in written] == ["物理成绩", "物理二"]
+    assert written[0]["rows"] == written[1]["rows"] > 0
+    assert "物理空白" in log
+    suffix = ".csv" if "csv" in extra else ".xlsx"
+    assert sorted(name for name in os.listdir(output) if not name.endswith(".meta.json")) == [f"物理二{suffix}", f"物理成绩{suffix}"]
+
+
+def test_split_sheets_into_one_workbook(workbook, tmp_path):
+    output = str(tmp_path / "各工作表")
+    summaries, log = _run(workbook, output, "-ss")
+
+    assert [summary["sheet"] for summary in summaries] == ["物理成绩", "物理二"]
+    assert "无法确定工作表物理空白的版式，跳过" in log
+    assert "输出工作簿保存1次" in log
+    wb = openpyxl.load_workbook(output + ".xlsx")
+    assert wb.sheetnames == ["物理成绩", "物理二"]
+    assert list(wb["物理成绩"].values) == list(wb["物理二"].values)
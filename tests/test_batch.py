@@ -0,0 +1,34 @@
+"""
+批量模式：目录中某个工作簿无法处理时记录失败原因，其余工作簿照常完成，summary.json列出全部结果
+"""
+import contextlib, io, json, os, shutil
+
+import bench
+from extract_batch import find_batch_workbooks, run_batch
+
+
+def test_failing_workbook_does_not_stop_batch(gradebooks, tmp_path):
+    source = tmp_path / "源"
+    source.mkdir()
+    shutil.copy(gradebooks["title"], source / "一模物理.xlsx")
+    shutil.copy(gradebooks["plain_sub"], source / "二模物理.xlsx")
+    (source / "损坏物理.xlsx").write_bytes(b"not a workbook")
+    (source / "~$一模物理.xlsx").write_bytes(b"lock file")
+    (source / "一模化学.xlsx").write_bytes(b"other subject")
+    assert [os.path.basename(path) for path in find_batch_workbooks(str(source), "物理")] == [
+        "一模物理.xlsx", "二模物理.xlsx", "损坏物理.xlsx"]
+
+    output = str(tmp_path / "结果")
+    args = bench._args(str(source / "一模物理.xlsx"), output, "-b", str(source), "-w", "2")
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        summaries = run_batch(args)
+
+    assert [(os.path.basename(summary["source"]), summary["status"]) for summary in summaries] == [
+        ("一模物理.xlsx", "ok"), ("二模物理.xlsx", "ok"), ("损坏物理.xlsx", "failed")]
+    assert summaries[2]["error"]
+    assert all(summary["rows"] > 0 and summary["loads"] == summary["saves"] == 1 for summary in summaries[:2])
+    assert sorted(os.listdir(output)) == ["summary.json", "一模物理.xlsx", "二模物理.xlsx"]
+    with open(os.path.join(output, "summary.json"), encoding="utf-8") as file:
+        assert json.load(file)["files"] == summaries
+    assert "成功2个，失败1个" in log.getvalue()
@@ -0,0 +1,130 @@
+"""
+解析结果的磁盘缓存：读写往返、文件改变后失效、文本列不用pickle、淘汰及清空时只删除缓存条目
+"""
+import datetime, os
+
+import openpyxl
+import pytest
+
+import bench
+from extract_cache import ParsedSheetCache, content_hash
+
+LAYOUT = {"start_cell": "A1", "sub_title_dict": {"A1": "考号", "B1": "姓名", "C1": "物理", "D1": "总分"}}
+ROWS = [
+    ["2024001", "甲", 95.5, 600],
+    ["2024002", "乙", None, 2 ** 60],
+    ["2024003", None, 60.0, None],
+]
+
+
+@pytest.fixture
+def source(tmp_path) -> str:
+    path = tmp_path / "物理成绩.xlsx"
+    path.write_bytes(b"workbook")
+    return str(path)
+
+
+def test_round_trip(tmp_path, source):
+    cache = ParsedSheetCache(str(tmp_path / "cache"))
+    assert cache.get(source, "subject:物理", "full") is None
+
+    cache.put(source, "subject:物理", "full", "成绩", LAYOUT, ROWS)
+    sheet, layout, rows = cache.get(source, "subject:物理", "full")
+
+    assert (sheet, layout, rows) == ("成绩", LAYOUT, ROWS)
+    assert [type(value) for value in rows[0]] == [str, str, float, int]
+    assert cache.get(source, "subject:物理", "stream") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_changed_file_misses(tmp_path, source):
+    cache = ParsedSheetCache(str(tmp_path / "cache"))
+    cache.put(source, "subject:物理", "full", "成绩", LAYOUT, ROWS)
+    with open(source, "ab") as file:
+        file.write(b" changed")
+
+    assert cache.get(source, "subject:物理", "full") is None
+
+
+def test_clear_removes_only_cache_entries(tmp_path, source):
+    directory = tmp_path / "cache"
+    cache = ParsedSheetCache(str(directory))
+    cache.put(source, "subject:物理", "full", "成绩", LAYOUT, ROWS)
+    (directory / "keep").mkdir()
+    (directory / "keep" / "notes.txt").write_text("不是缓存")
+    (directory / "other.txt").write_text("不是缓存")
+
+    assert cache.clear() > 0
+    assert sorted(os.listdir(directory)) == ["keep", "other.txt"]
+    assert (directory / "keep" / "notes.txt").read_text() == "不是缓存"
+
+
+def test_clear_removes_empty_directory(tmp_path, source):
+    directory = tmp_path / "cache"
+    cache = ParsedSheetCache(str(directory))
+    cache.put(source, "subject:物理", "full", "成绩", LAYOUT, ROWS)
+
+    cache.clear()
+    assert not directory.exists()
+    assert cache.clear() == 0
+
+
+def test_text_columns_are_json_and_numbers_are_mapped(tmp_path, source, monkeypatch):
+    np = pytest.importorskip("numpy")
+    import extract_cache
+    cache = ParsedSheetCache(str(tmp_path / "cache"))
+    dated = [row + [value] for row, value in zip(ROWS, [datetime.datetime(2024, 6, 7, 9, 30), datetime.date(2024, 6, 8), None])]
+    layout = {"start_cell": "A1", "sub_title_dict": dict(LAYOUT["sub_title_dict"], E1="考试时间")}
+    cache.put(source, "subject:物理", "full", "成绩", layout, dated)
+
+    (entry,) = [name for name in os.listdir(tmp_path / "cache") if name != "index.json"]
+    assert sorted(os.listdir(tmp_path / "cache" / entry)) == [
+        "0.json", "1.json", "2.npy", "3.json", "4.json", "meta.json"]
+
+    modes = []
+    load = np.load
+    monkeypatch.setattr(extract_cache.np, "load", lambda *args, **kwargs: modes.append(kwargs) or load(*args, **kwargs))
+    assert cache.get(source, "subject:物理", "full") == ("成绩", layout, dated)
+    assert modes == [{"mmap_mode": "r", "allow_pickle": False}]
+
+
+def test_unsupported_values_are_not_cached(tmp_path, source, capsys):
+    cache = ParsedSheetCache(str(tmp_path / "cache"))
+    cache.put(source, "subject:物理", "full", "成绩", LAYOUT, [row[:3] + [object()] for row in ROWS])
+    assert cache.get(source, "subject:物理", "full") is None
+    assert "不写入缓存" in capsys.readouterr().out
+
+
+def test_evict_removes_oldest_entry_and_prunes_index(tmp_path, source):
+    cache = ParsedSheetCache(str(tmp_path / "cache"))
+    other = tmp_path / "化学成绩.xlsx"
+    other.write_bytes(b"other workbook")
+    cache.put(source, "subject:物理", "full", "成绩", LAYOUT, ROWS)
+    (old_entry,) = [entry for _, _, entry in cache._entries()]
+    os.utime(os.path.join(old_entry, "meta.json"), (0, 0))
+
+    cache.max_bytes = cache.size() * 3 // 2
+    cache.put(str(other), "subject:化学", "full", "成绩", LAYOUT, ROWS)
+    assert cache.get(source, "subject:物理", "full") is None
+    assert cache.get(str(other), "subject:化学", "full") is not None
+    assert len(cache._entries()) == 1
+
+    # 源文件改变后的旧记录及没有条目的哈希都从index.json中删除
+    other.write_bytes(b"other workbook, changed")
+    cache.put(str(other), "subject:化学", "full", "成绩", LAYOUT, ROWS)
+    index = cache._load_index()
+    assert list(index.values()) == [content_hash(str(other))]
+    assert list(index) == [f"{other}|{other.stat().st_size}|{other.stat().st_mtime_ns}"]
+
+
+def test_warm_run_skips_parsing(gradebooks, tmp_path):
+    pytest.importorskip("numpy")
+    path = gradebooks["title"]
+    extra = ("--cache", "--cache-dir", str(tmp_path / "cache"), "-rk", "物理")
+    cold = bench.run_flow(path, str(tmp_path / "cold"), *extra)
+    warm = bench.run_flow(path, str(tmp_path / "warm"), *extra)
+
+    assert (cold["loads"], warm["loads"]) == (1, 0)
+    assert cold["rows"] == warm["rows"]
+    cold_rows = list(openpyxl.load_workbook(tmp_path / "cold.xlsx").active.values)
+    assert list(openpyxl.load_workbook(tmp_path / "warm.xlsx").active.values) == cold_rows
@@ -0,0 +1,105 @@
+"""
+非Excel输出格式：列名合成及去重、CSV及JSON Lines的.meta.json元数据、Parquet在第一批之后放宽列类型而不丢失值
+"""
+import contextlib, csv, datetime, io, json
+
+import pytest
+
+import bench
+import extract_formats
+from extract_formats import METADATA_SUFFIX, PARQUET_METADATA_KEY, TabularExport, column_names, output_file
+from extract_pipeline import run_extract
+
+
+def test_column_names_join_and_deduplicate():
+    headers = ["姓名", "物理", "物理", None, "物理", None]
+    heading_three = ["", "卷面", "卷面", "赋分", None]
+    assert column_names(headers, heading_three) == ["姓名", "物理_卷面", "物理_卷面_2", "赋分", "物理", "列F"]
+    assert column_names(["总分", "总分", "总分"]) == ["总分", "总分_2", "总分_3"]
+
+
+def _export(tmp_path, output_format: str, columns: list, rows: list, metadata: dict = None) -> str:
+    path = str(tmp_path / output_file("结果", output_format))
+    export = TabularExport(output_format, columns, iter(rows), metadata)
+    export.save(path)
+    return path
+
+
+ROWS = [["甲", 90, 85.5, datetime.datetime(2024, 6, 7, 9, 30)],
+        ["乙", None, "缺考", None],
+        ["丙", 70, 60, datetime.datetime(2024, 6, 8, 9, 30)]]
+COLUMNS = ["姓名", "物理", "化学", "考试时间"]
+
+
+def test_csv_and_metadata(tmp_path):
+    path = _export(tmp_path, "csv", COLUMNS, ROWS, {"title": "一中物理"})
+    with open(path, encoding="utf-8", newline="") as file:
+        assert list(csv.reader(file)) == [COLUMNS, ["甲", "90", "85.5", "2024-06-07 09:30:00"],
+                                          ["乙", "", "缺考", ""], ["丙", "70", "60", "2024-06-08 09:30:00"]]
+    with open(path + METADATA_SUFFIX, encoding="utf-8") as file:
+        assert json.load(file) == {"title": "一中物理", "columns": COLUMNS, "rows": 3}
+
+
+def test_jsonl_and_metadata(tmp_path):
+    path = _export(tmp_path, "jsonl", COLUMNS, ROWS, {"title": "一中物理"})
+    with open(path, encoding="utf-8") as file:
+        records = [json.loads(line) for line in file]
+    assert records[1] == {"姓名": "乙", "物理": None, "化学": "缺考", "考试时间": None}
+    assert records[2]["考试时间"] == "2024-06-08T09:30:00"
+    with open(path + METADATA_SUFFIX, encoding="utf-8") as file:
+        assert json.load(file)["rows"] == 3
+
+
+def test_parquet_widens_types_after_first_batch(tmp_path, monkeypatch, capsys):
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr(extract_formats, "PARQUET_BATCH_ROWS", 2)
+    columns = ["整数", "放宽为小数", "放宽为文本", "大整数", "空值"]
+    rows = [[1, 80, 90, None, None],
+            [2, 70, 85, 5, None],
+            [3, 75.5, "缺考", 2 ** 60, None],
+            [4, None, 60, 7, "备注"],
+            [5, 66, True, None, None]]
+    path = _export(tmp_path, "parquet", columns, rows, {"title": "一中物理"})
+
+    table = pq.read_table(path)
+    assert [str(field.type) for field in table.schema] == ["int64", "double", "string", "string", "string"]
+    assert table.column("放宽为小数").to_pylist() == [80.0, 70.0, 75.5, None, 66.0]
+    assert table.column("放宽为文本").to_pylist() == ["90", "85", "缺考", "60", "True"]
+    assert table.column("大整数").to_pylist() == [None, "5", str(2 ** 60), "7", None]
+    assert table.column("空值").to_pylist() == [None, None, None, "备注", None]
+    assert table.column("整数").to_pylist() == [1, 2, 3, 4, 5]
+    metadata = json.loads(table.schema.metadata[PARQUET_METADATA_KEY])
+    assert metadata["title"] == "一中物理" and metadata["columns"] == columns
+    assert "已放宽该列的类型" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("output_format", ["csv", "jsonl", "parquet"])
+def test_run_extract_writes_format(gradebooks, tmp_path, output_format):
+    if output_format == "parquet":
+        pytest.importorskip("pyarrow")
+    path = gradebooks["title_sub"]
+    output = str(tmp_path / output_file("一中物理", output_format))
+    with contextlib.redirect_stdout(io.StringIO()):
+        summary = run_extract(path, output, bench._args(path, str(tmp_path / "一中物理"), "-of", output_format), interactive=False)
+
+    if output_format == "parquet":
+        import pyarrow.parquet as pq
+        table = pq.read_table(output)
+        names, row_count = table.column_names, table.num_rows
+        metadata = json.loads(table.schema.metadata[PARQUET_METADATA_KEY])
+    else:
+        with open(output + METADATA_SUFFIX, encoding="utf-8") as file:
+            metadata = json.load(file)
+        with open(output, encoding="utf-8") as file:
+            lines = file.read().splitlines()
+        names = next(csv.reader(lines[:1])) if output_format == "csv" else list(json.loads(lines[0]))
+        row_count = len(lines) - (output_format == "csv")
+
+    assert names == metadata["columns"]
+    assert len(set(names)) == len(names)
+    assert row_count == summary["rows"]
+    if output_format != "parquet":
+        assert metadata["rows"] == row_count
+    assert metadata["title"] == "期末成绩"
+    assert metadata["derived_columns"] == names[-2:] and names[-2] == "差值"
+    assert set(metadata["averages"]) == set(metadata["marks"]) == {names[4], names[5]}
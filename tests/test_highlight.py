@@ -0,0 +1,57 @@
+"""
+高亮：-mn默认与原来一样设置单元格字体，条件格式需用--highlight-mode conditional指定
+"""
+import contextlib, io
+
+import openpyxl
+
+import bench
+
+
+def _extract(gradebooks, tmp_path, *extra):
+    output = str(tmp_path / "out")
+    with contextlib.redirect_stdout(io.StringIO()):
+        bench.run_flow(gradebooks["title"], output, *extra)
+    return openpyxl.load_workbook(output + ".xlsx").active
+
+
+def _red_cells(ws) -> list:
+    return [cell.coordinate for row in ws.iter_rows() for cell in row
+            if cell.font is not None and cell.font.color is not None and cell.font.color.rgb == "00FF0000"]
+
+
+def test_mark_column_writes_fonts_by_default(gradebooks, tmp_path):
+    ws = _extract(gradebooks, tmp_path)
+    assert not ws.conditional_formatting
+    marked = _red_cells(ws)
+    assert marked and {coordinate[0] for coordinate in marked} <= {"E", "F"}
+    assert all(ws[coordinate].font.bold for coordinate in marked)
+
+
+def test_conditional_mode_is_opt_in(gradebooks, tmp_path):
+    ws = _extract(gradebooks, tmp_path, "--highlight-mode", "conditional")
+    assert not _red_cells(ws)
+    assert {str(rule.sqref)[0] for rule in ws.conditional_formatting} == {"E", "F"}
+
+
+def _negative_table():
+    from extract_pipeline import ScoreTable
+    return ScoreTable(["姓名", "分差"], [], [["甲", "乙", "丙", "丁"], [-5, -2, "缺考", -2]])
+
+
+def test_static_max_of_negative_column():
+    table = _negative_table()
+    assert table.mark_max(["B"]) == 2
+    assert set(table.marks[1]) == {1, 3}
+
+
+def test_static_max_of_negative_column_without_numpy(no_numpy):
+    table = _negative_table()
+    assert table.mark_max(["B"]) == 2
+    assert set(table.marks[1]) == {1, 3}
+
+
+def test_static_max_without_numbers():
+    from extract_pipeline import ScoreTable
+    table = ScoreTable(["姓名", "备注"], [], [["甲", "乙"], ["缺考", None]])
+    assert table.mark_max(["B"]) == 0
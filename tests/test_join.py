@@ -0,0 +1,80 @@
+"""
+跨考试连接：逐行读取另一次考试与收集后匹配的结果相同，重复的连接键不参与匹配，名次与整列排名一致
+"""
+import math, random
+
+import pytest
+
+from extract_join import ExamScores, RankCounter, hash_join, join_collected, join_streamed, normalize_key
+from extract_pipeline import ScoreTable, _rank_python
+
+KEYS = [0]
+SUBJECTS = {"物理": 1, "总分": 2}
+
+
+def _other_rows() -> list:
+    rows = [[f"{number:04d}", number % 97, str(300 - number)] for number in range(40)]
+    rows[5][1] = "缺考"
+    rows.append(["0003", 50, 250])          # 该次考试中重复的考号
+    rows.append([None, 1, 1])               # 没有连接键
+    rows.append([3.0, 1, 1])                # 浮点数考号与“3”相同
+    return rows
+
+
+LEFT_KEYS = [normalize_key([value]) for value in ["0001", "0003", "0005", "0007", "0007", "9999", None, "3"]]
+
+
+def _same(left: list, right: list) -> bool:
+    return all((math.isnan(a) and math.isnan(b)) or a == b for a, b in zip(left, right)) and len(left) == len(right)
+
+
+def test_normalize_key():
+    assert normalize_key([3.0, " 一中 "]) == ("3", "一中")
+    assert normalize_key([None, ""]) is None
+
+
+def test_hash_join_drops_duplicates():
+    result = hash_join([("a",), ("b",), ("b",), ("c",)], [("c",), ("a",), ("b",), ("d",)])
+    assert result.positions == [1, -1, -1, 0]
+    assert result.unmatched_left == [1, 2] and result.unmatched_right == [2, 3]
+    assert result.duplicates == [("b",)]
+
+
+@pytest.mark.parametrize("method", ["competition", "dense"])
+def test_streamed_matches_collected(method):
+    rows = _other_rows()
+    collected = join_collected(LEFT_KEYS, ExamScores.collect("期中", rows, KEYS, SUBJECTS), method)
+    streamed = join_streamed(LEFT_KEYS, "期中", iter(rows), KEYS, SUBJECTS, method)
+
+    assert streamed.matched == collected.matched == 3
+    assert streamed.unmatched_left == collected.unmatched_left == [1, 3, 4, 5]
+    assert sorted(streamed.unmatched_right) == sorted(collected.unmatched_right)
+    assert ("0003",) in streamed.duplicates and ("0007",) in streamed.duplicates
+    for subject in SUBJECTS:
+        assert _same(streamed.scores[subject], collected.scores[subject])
+        assert _same(streamed.ranks[subject], collected.ranks[subject])
+    assert streamed.scores["总分"][0] == 299 and math.isnan(streamed.scores["物理"][2])
+
+
+@pytest.mark.parametrize("method", ["competition", "dense"])
+def test_rank_counter_matches_ranking(method):
+    rnd = random.Random(3)
+    scores = [rnd.choice([None, rnd.randint(0, 20), rnd.randint(0, 20) + 0.5]) for _ in range(300)]
+    counter = RankCounter()
+    for score in scores:
+        counter.add(float("nan") if score is None else score)
+    lookup = counter.ranks(method)
+    expected = _rank_python(scores, [0] * len(scores), method)
+    assert [None if score is None else lookup[score] for score in scores] == expected
+
+
+def test_table_join_adds_deltas_and_rank_changes(no_numpy):
+    table = ScoreTable.from_rows([["0001", 90, 280], ["0002", 50, 200], ["0009", 70, 250]], ["考号", "物理", "总分"], [])
+    keys = table.join_keys(["考号"])
+    other = [["0001", 80, 299], ["0002", 60, 298], ["0003", 70, 297]]
+    table.join(join_streamed(keys, "期中", other, KEYS, SUBJECTS), keys, ["考号"])
+
+    assert table.headers[3:] == ["物理较期中", "物理名次较期中", "总分较期中", "总分名次较期中"]
+    assert table.columns[3] == [10, -10, None]
+    assert table.columns[4] == [0, 0, None]
+    assert table.unmatched == [["期中", "仅本次", "0009"], ["期中", "仅期中", "0003"]]
@@ -0,0 +1,61 @@
+"""
+版式判断：bench.py生成的各种版式在完整、流式及SheetML快速读取下都应得到与生成时一致的版式和数据行
+"""
+import contextlib, io
+
+import openpyxl
+import pytest
+
+import bench
+import extract_pipeline
+from extract_workbook import WorkbookSession, read_data_rows
+from conftest import ROWS
+
+READERS = {"full": (), "stream": ("--stream",), "fast": ("--fast-reader",), "fast_stream": ("--fast-reader", "--stream")}
+
+
+def _expected_rows(path: str, variant: str) -> list:
+    _, sub_exist, start_cell = bench.VARIANTS[variant]
+    offset = 1 if start_cell == "B1" else 0
+    wb = openpyxl.load_workbook(path, read_only=True)
+    rows = [list(row[offset:]) for row in wb[bench.SHEET].iter_rows(values_only=True)]
+    wb.close()
+    return rows[-ROWS:]
+
+
+@pytest.mark.parametrize("reader", READERS)
+@pytest.mark.parametrize("variant", bench.VARIANTS)
+def test_layout_and_rows(gradebooks, variant, reader, tmp_path):
+    path = gradebooks[variant]
+    args = bench._args(path, str(tmp_path / "out"), *READERS[reader])
+    with contextlib.redirect_stdout(io.StringIO()):
+        with WorkbookSession(path, None, read_only=args.stream, fast_reader=args.fast_reader) as session:
+            sheet, layout = extract_pipeline._parse_source(session, args, False)
+            rows = list(read_data_rows(session.source, sheet, layout))
+
+    assert bench.layout_matches(variant, layout._asdict())
+    assert rows == _expected_rows(path, variant)
+
+
+@pytest.mark.parametrize("variant", bench.VARIANTS)
+def test_bench_stages_layout_ok(gradebooks, variant, tmp_path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        case = bench.run_stages(gradebooks[variant], str(tmp_path / "out"))
+
+    assert bench.layout_matches(variant, case["layout"])
+    assert case["loads"] == 1 and case["saves"] == 1
+
+
+@pytest.mark.parametrize("reader", READERS)
+@pytest.mark.parametrize("variant", bench.VARIANTS)
+def test_extract_selects_school(gradebooks, variant, reader, tmp_path):
+    path = gradebooks[variant]
+    output = str(tmp_path / "out")
+    with contextlib.redirect_stdout(io.StringIO()):
+        summary = bench.run_flow(path, output, *READERS[reader])
+
+    expected = [row for row in _expected_rows(path, variant) if "第1中学" in row[2]]
+    wb = openpyxl.load_workbook(output + ".xlsx")
+    written = [list(row) for row in wb.active.iter_rows(values_only=True)]
+    assert summary["rows"] == len(expected)
+    assert [row[0] for row in written if row[0] and str(row[0]).startswith("2024")] == [row[0] for row in expected]
@@ -0,0 +1,33 @@
+"""
+分组输出：一次遍历按表头列的值分组
+"""
+import pytest
+
+from extract_batch import partition_rows
+from extract_workbook import SheetLayout
+
+LAYOUT = SheetLayout(6, 5, "B1", 0, 0, "", False, "B1", {"B1": "姓名", "C1": "学校名称", "D1": "班级", "E1": "物理"}, [], False)
+ROWS = [
+    ["甲", "一中", "1班", 90],
+    ["乙", "二中", "1班", 80],
+    ["丙", "一中 ", "2班", 70],
+    ["丁", None, "1班", 60],
+    ["戊", "一中", "1班", 50],
+]
+
+
+def test_partition_by_school_keeps_order():
+    groups = partition_rows(ROWS, LAYOUT, ["学校"])
+    assert list(groups) == ["一中", "二中", "未填写"]
+    assert [row[0] for row in groups["一中"]] == ["甲", "丙", "戊"]
+
+
+def test_partition_by_school_and_class():
+    groups = partition_rows(iter(ROWS), LAYOUT, ["学校", "班级"])
+    assert {key: [row[0] for row in rows] for key, rows in groups.items()} == {
+        "一中_1班": ["甲", "戊"], "二中_1班": ["乙"], "一中_2班": ["丙"], "未填写_1班": ["丁"]}
+
+
+def test_partition_missing_header():
+    with pytest.raises(ValueError, match="表头没有"):
+        partition_rows(ROWS, LAYOUT, ["年级"])
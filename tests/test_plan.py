@@ -0,0 +1,105 @@
+"""
+后续处理计划：各扫描阶段读取的列、--explain的说明，以及合并扫描与逐个操作单独执行的遍历次数
+"""
+import pytest
+
+from CommandLineExtractTool import build_parser
+from extract_highlight import parse_highlights
+from extract_pipeline import ScoreTable, post_process
+from extract_plan import AFTER_REORDER, BEFORE_REORDER, PostProcessPlan
+
+
+def _plan(*options: str) -> PostProcessPlan:
+    args = build_parser().parse_args(["物理", "out", "标题", *options])
+    return PostProcessPlan.build(args, args.highlight_mode, [])
+
+
+def test_scan_columns_in_order():
+    plan = _plan("-cn", "E", "F", "差", "-ctac", "F", "G", "-mn", "G")
+    assert plan.scans() == [BEFORE_REORDER]
+    assert plan.scan_columns(BEFORE_REORDER) == ["E", "F", "G"]
+
+
+def test_top_k_starts_second_scan():
+    plan = _plan("-rk", "总分", "-tk", "3", "-ctac", "E")
+    assert plan.scans() == [BEFORE_REORDER, AFTER_REORDER]
+    assert plan.scan_columns(BEFORE_REORDER) == ["总分"]
+    assert plan.scan_columns(AFTER_REORDER) == ["E"]
+
+
+def test_explain_describes_steps():
+    text = _plan("-rk", "总分", "-mn", "E", "-cn", "D", "E", "差").explain()
+    assert "扫描1：类型转化，一次遍历求出D、E、总分的数值、计数、求和及最大值及E - D的差值" in text
+    assert "排名：总分（全部内，排序）  [使用扫描结果]" in text
+    assert "最大值标记：E  [使用扫描结果]" in text
+    assert "逐个操作需遍历列6次，合并扫描遍历1次，节省5次" in text
+
+
+HEADERS = ["姓名", "学校", "班级", "物理", "化学", "总分"]
+
+
+def _table() -> ScoreTable:
+    rows = [["甲", "一中", 1, 90, 85.5, 500], ["乙", "一中", 2, "缺考", 70, 430], ["丙", "二中", 1, 60, 0, 510],
+            ["丁", "二中", 1, 75, 92, None], ["戊", "一中", 1, 90, 60.5, 480], ["己", "三中", 2, 0, "缺考", 300]]
+    return ScoreTable.from_rows(rows, HEADERS, [])
+
+
+def _operation_passes(args) -> int:
+    """
+    每个操作在新的成绩表上单独执行，逐行遍历列的次数之和
+    """
+    def passes(operation) -> int:
+        table = _table()
+        operation(table)
+        return table.passes
+
+    total = 0
+    if args.compare_nums:
+        total += passes(lambda table: table.compare(*args.compare_nums))
+    for column in args.rank_by or []:
+        total += passes(lambda table: table.rank(column))
+    if args.top_k:
+        total += passes(lambda table: table.top_k(args.rank_by[0], args.top_k))
+    elif args.sort_by_rank:
+        total += passes(lambda table: table.sort_order(args.rank_by[0]))
+    if args.calc_total_average_column:
+        total += passes(lambda table: table.average(args.calc_total_average_column, args.calc_total_average_mode))
+    if args.mark_column:
+        total += passes(lambda table: table.mark_max(args.mark_column))
+    if args.highlight:
+        total += passes(lambda table: table.highlight(parse_highlights(args.highlight), "static", {None: 100}, 0.6))
+    return total
+
+
+def _snapshot(table: ScoreTable) -> tuple:
+    return table.headers, table.columns, table.footer, table.marks
+
+
+@pytest.mark.parametrize("numpy", [True, False])
+@pytest.mark.parametrize("options", [
+    ("-cn", "D", "E", "差", "-ctac", "D", "E", "-mn", "D", "E"),
+    ("-rk", "物理", "-tk", "2", "-ctac", "D", "-mn", "E", "-hl", "band:物理:60-80", "max:化学"),
+    ("-rk", "总分", "物理", "--sort-by-rank", "-cn", "D", "E", "差", "-ctac", "F", "-ctam", "normal no zero",
+     "-hl", "top:总分:2", "below_pass:D", "--full-score", "100"),
+])
+def test_fused_scan_against_operation_passes(options, numpy, request, monkeypatch, capsys):
+    if not numpy:
+        request.getfixturevalue("no_numpy")
+    args = build_parser().parse_args(["物理", "out", "标题", *options, "--explain"])
+    plan = PostProcessPlan.build(args, "static", parse_highlights(args.highlight))
+    operation_passes = _operation_passes(args)
+    assert plan.operation_passes() == operation_passes
+
+    fused = _table()
+    post_process(fused, args)
+    assert fused.passes == plan.scan_passes() == len(plan.scans())
+    out = capsys.readouterr().out
+    assert f"节省{operation_passes - fused.passes}次" in out
+    assert f"后续处理实际遍历列{fused.passes}次（逐个操作需{operation_passes}次）" in out
+
+    # 不合并扫描时各操作按需读取，结果相同
+    monkeypatch.setattr(ScoreTable, "scan", lambda self, keys, pairs=(): [])
+    separate = _table()
+    post_process(separate, args)
+    assert _snapshot(fused) == _snapshot(separate)
+    assert separate.passes > fused.passes
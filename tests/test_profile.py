@@ -0,0 +1,40 @@
+"""
+性能统计：--profile-json写出各阶段的统计，加载及保存各记在load、save阶段一次；未启用时不记录
+"""
+import argparse, contextlib, io, json
+
+import pytest
+
+import bench
+from extract_pipeline import run_extract
+from extract_profile import NULL_PROFILER, StageProfiler, make_profiler
+
+STAGES = ("load", "layout", "filter", "infer_types", "rank", "calc_average", "mark_scores", "group_stats", "write_rows", "save")
+
+
+@pytest.mark.parametrize("reader", [(), ("--fast-reader",)])
+def test_profile_json_stages(gradebooks, tmp_path, reader):
+    path = gradebooks["title"]
+    profile = tmp_path / "profile.json"
+    args = bench._args(path, str(tmp_path / "一中物理"), "-rk", "物理", "-gs", "物理", "--profile-json", str(profile), *reader)
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        summary = run_extract(path, str(tmp_path / "一中物理.xlsx"), args, interactive=False)
+
+    data = json.loads(profile.read_text(encoding="utf-8"))
+    stages = data["stages"]
+    assert set(STAGES) <= set(stages)
+    assert data["slowest"] in stages
+    assert all(set(record) == set(StageProfiler.FIELDS) and record["calls"] >= 1 for record in stages.values())
+    assert {name: record["loads"] for name, record in stages.items() if record["loads"]} == {"load": 1}
+    assert {name: record["saves"] for name, record in stages.items() if record["saves"]} == {"save": 1}
+    assert stages["write_rows"]["rows"] == summary["rows"]
+    assert stages["save"]["bytes_written"] > 0
+    assert "合计" in log.getvalue()
+
+
+def test_disabled_profiler_records_nothing():
+    args = argparse.Namespace(profile=False, profile_json=None, profile_cprofile=None)
+    assert make_profiler(args) is NULL_PROFILER
+    with NULL_PROFILER.stage("load"):
+        NULL_PROFILER.add(rows=10)
+    assert NULL_PROFILER.stages == {}
@@ -0,0 +1,62 @@
+"""
+排名：并列的竞争排名及密集排名、分组内排名、前k名，NumPy及纯Python两条路径结果相同
+"""
+import pytest
+
+from extract_pipeline import ScoreTable
+
+HEADERS = ["姓名", "学校", "班级", "总分"]
+ROWS = [
+    ["甲", "一中", "1班", 90],
+    ["乙", "一中", "1班", 80],
+    ["丙", "二中", "1班", 80],
+    ["丁", "二中", "2班", 70],
+    ["戊", "一中", "2班", "缺考"],
+    ["己", "二中", "1班", 95],
+]
+
+
+@pytest.fixture(params=["numpy", "python"])
+def table(request) -> ScoreTable:
+    if request.param == "python":
+        request.getfixturevalue("no_numpy")
+    return ScoreTable.from_rows(ROWS, HEADERS, [])
+
+
+def _last_column(table: ScoreTable) -> list:
+    return table.columns[-1]
+
+
+@pytest.mark.parametrize("method, expected", [
+    ("competition", [2, 3, 3, 5, None, 1]),
+    ("dense", [2, 3, 3, 4, None, 1]),
+])
+def test_rank_ties(table, method, expected):
+    table.rank("总分", method)
+    assert table.headers[-1] == "总分排名"
+    assert _last_column(table) == expected
+
+
+def test_rank_within_school(table):
+    table.rank("总分", "competition", "学校")
+    assert table.headers[-1] == "总分校排名"
+    assert _last_column(table) == [1, 2, 2, 3, None, 1]
+
+
+def test_rank_within_class_keeps_schools_apart(table):
+    # 两所学校都有1班，班级内排名按（学校，班级）分组
+    table.rank("总分", "competition", "班级")
+    assert _last_column(table) == [1, 2, 2, 1, None, 1]
+
+
+def test_top_k_keeps_ties(table):
+    assert [ROWS[row][0] for row in table.top_k("总分", 2)] == ["己", "甲"]
+    assert [ROWS[row][0] for row in table.top_k("总分", 3)] == ["己", "甲", "乙", "丙"]
+
+
+def test_top_k_within_school(table):
+    assert [ROWS[row][0] for row in table.top_k("总分", 1, "学校")] == ["甲", "己"]
+
+
+def test_sort_order_puts_missing_last(table):
+    assert [ROWS[row][0] for row in table.sort_order("总分")] == ["己", "甲", "乙", "丙", "丁", "戊"]
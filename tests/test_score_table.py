@@ -0,0 +1,30 @@
+"""
+列式成绩表的平均值：含0与不含0两种模式，没有数值的列不写入平均值行
+"""
+import pytest
+
+from extract_pipeline import ScoreTable
+
+
+def _table() -> ScoreTable:
+    return ScoreTable(["姓名", "物理", "备注"], [], [["甲", "乙", "丙", "丁"], [80, 0, 70, "缺考"], ["缺考", None, "", "请假"]])
+
+
+@pytest.mark.parametrize("numpy", [True, False])
+def test_average_modes(numpy, request):
+    if not numpy:
+        request.getfixturevalue("no_numpy")
+    assert _table().average(["B"], "normal") == {"B": 50}
+    assert _table().average(["B"], "normal no zero") == {"B": 75}
+
+
+def test_average_without_numbers(capsys):
+    table = _table()
+    assert table.average(["C", "B"], "normal") == {"C": None, "B": 50}
+    assert table.footer == {1: 50}
+    assert "C列没有数值" in capsys.readouterr().out
+
+
+def test_average_unknown_mode():
+    with pytest.raises(ValueError):
+        _table().average(["B"], "mean")
@@ -0,0 +1,138 @@
+"""
+提取服务：只监听回环地址，请求不能执行本机命令行的操作，路径限制在-d目录内，任何错误都有回复
+"""
+import contextlib, io, json, os, shutil, socket, threading, urllib.request
+
+import pytest
+
+import extract_pipeline
+from extract_service import handle_service_request
+from extract_service import SheetLRU, loopback_host, make_server
+
+
+@pytest.fixture
+def workdir(gradebooks, tmp_path) -> str:
+    directory = tmp_path / "work"
+    directory.mkdir()
+    shutil.copy(gradebooks["title"], directory / "物理成绩.xlsx")
+    return str(directory)
+
+
+def _request(workdir: str, *argv: str) -> dict:
+    # 根目录为workdir的上一级，与守护进程以--serve-root启动时相同
+    return handle_service_request({"argv": ["物理", "out", "期末成绩", "-d", workdir, *argv]}, SheetLRU(2),
+                                  os.path.dirname(workdir))
+
+
+@pytest.mark.parametrize("host", ["", "127.0.0.1", "127.0.0.2", "localhost", "::1", "[::1]"])
+def test_loopback_hosts(host):
+    assert loopback_host(host)
+
+
+@pytest.mark.parametrize("host", ["0.0.0.0", "::", "192.168.1.10", "example.com"])
+def test_other_hosts_rejected(host):
+    with pytest.raises(ValueError):
+        loopback_host(host)
+    with pytest.raises(ValueError):
+        make_server(f"{host}:0", lambda request: {}, lambda: {})
+
+
+def test_extract_inside_directory(workdir):
+    result = _request(workdir, "-sc", "第1中学")
+    assert result["status"] == "ok", result
+    assert os.path.isfile(os.path.join(workdir, "out.xlsx"))
+
+
+@pytest.mark.parametrize("argv", [
+    ["--clear-cache"], ["--cache-dir", "VICTIM"], ["--cache-dir=VICTIM", "--clear-cache"], ["--serve"], ["--serve=127.0.0.1:0"],
+    ["--clear"], ["-h"],
+])
+def test_local_options_rejected(workdir, tmp_path, argv):
+    victim = tmp_path / "victim"
+    victim.mkdir()
+    (victim / "keep.txt").write_text("x")
+    result = _request(workdir, *[item.replace("VICTIM", str(victim)) for item in argv])
+
+    assert result["status"] == "failed"
+    assert (victim / "keep.txt").exists()
+
+
+@pytest.mark.parametrize("argv", [
+    ["--profile-json", "../profile.json"],
+    ["--profile-cprofile", "/tmp/outside.prof"],
+    ["--warehouse", "../scores.sqlite", "--from-warehouse", "期末"],
+    ["-j", "../物理成绩.xlsx"],
+])
+def test_paths_outside_directory_rejected(workdir, argv):
+    shutil.copy(os.path.join(workdir, "物理成绩.xlsx"), os.path.dirname(workdir))
+    result = _request(workdir, *argv)
+    assert result["status"] == "failed" and "目录内" in result["error"], result
+
+
+def test_output_outside_directory_rejected(workdir):
+    result = handle_service_request({"argv": ["物理", "../escaped", "期末成绩", "-d", workdir]}, SheetLRU(2),
+                                    os.path.dirname(workdir))
+    assert result["status"] == "failed"
+    assert not os.path.exists(os.path.join(os.path.dirname(workdir), "escaped.xlsx"))
+
+
+def test_unexpected_error_is_reported_over_http(workdir, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(extract_pipeline, "run_extract", fail)
+    cache = SheetLRU(2)
+    server = make_server("127.0.0.1:0", lambda request: handle_service_request(request, cache, os.path.dirname(workdir)),
+                         cache.status)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        body = json.dumps({"argv": ["物理", "out", "期末成绩", "-d", workdir]}).encode("utf-8")
+        request = urllib.request.Request(f"http://127.0.0.1:{server.server_address[1]}/extract", data=body, method="POST")
+        with pytest.raises(urllib.error.HTTPError) as error, contextlib.redirect_stderr(io.StringIO()):
+            urllib.request.urlopen(request, timeout=10)
+        reply = json.loads(error.value.read().decode("utf-8"))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert error.value.code == 400
+    assert reply["status"] == "failed" and "boom" in reply["error"]
+
+
+def test_relative_directory_is_anchored_at_root(workdir):
+    result = handle_service_request({"argv": ["物理", "out", "期末成绩", "-d", "work"]}, SheetLRU(2), os.path.dirname(workdir))
+    assert result["status"] == "ok", result
+    assert os.path.isfile(os.path.join(workdir, "out.xlsx"))
+
+
+@pytest.mark.parametrize("directory", ["..", "/", "work/../.."])
+def test_directory_outside_root_rejected(workdir, tmp_path, directory):
+    # 请求自己给出的-d不能把限制范围扩大到根目录之外
+    root = os.path.join(workdir, "root")
+    os.makedirs(root)
+    result = handle_service_request({"argv": ["物理", "out", "期末成绩", "-d", directory]}, SheetLRU(2), root)
+    assert result["status"] == "failed" and "-d" in result["error"], result
+    assert not os.path.exists(os.path.join(workdir, "out.xlsx"))
+
+
+def test_default_root_is_working_directory(workdir):
+    result = handle_service_request({"argv": ["物理", "out", "期末成绩", "-d", workdir]}, SheetLRU(2))
+    assert result["status"] == "failed" and "-d" in result["error"]
+
+
+def test_unix_path_that_is_not_a_socket_is_kept(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("keep")
+    with pytest.raises(ValueError):
+        make_server(f"unix:{path}", lambda request: {}, lambda: {})
+    assert path.read_text() == "keep"
+
+
+def test_stale_unix_socket_is_replaced(tmp_path):
+    path = str(tmp_path / "extract.sock")
+    stale = socket.socket(socket.AF_UNIX)
+    stale.bind(path)
+    stale.close()
+    server = make_server(f"unix:{path}", lambda request: {}, lambda: {})
+    server.server_close()
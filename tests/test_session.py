@@ -0,0 +1,37 @@
+"""
+工作簿会话：完整的后续处理（对比、排名、平均值、标记、高亮、分组统计）中源工作簿只加载一次，输出工作簿只保存一次
+"""
+import contextlib, io
+
+import pytest
+
+import bench
+from extract_pipeline import run_extract
+from extract_workbook import WorkbookSession
+
+READERS = {"full": (), "stream": ("--stream",), "fast": ("--fast-reader",)}
+POST_PROCESSING = ("-rk", "物理", "--sort-by-rank", "-hl", "top:总分:5", "band:物理:60-80", "-gs", "物理", "化学",
+                   "-ct", "考号=id")
+
+
+@pytest.mark.parametrize("reader", list(READERS))
+@pytest.mark.parametrize("variant", ["title", "plain_sub"])
+def test_loads_and_saves_once(gradebooks, tmp_path, monkeypatch, variant, reader):
+    sessions = []
+    original_init = WorkbookSession.__init__
+
+    def record(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        sessions.append(self)
+
+    monkeypatch.setattr(WorkbookSession, "__init__", record)
+    path = gradebooks[variant]
+    args = bench._args(path, str(tmp_path / "一中物理"), *POST_PROCESSING, *READERS[reader])
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        summary = run_extract(path, str(tmp_path / "一中物理.xlsx"), args, interactive=False)
+
+    assert len(sessions) == 1
+    assert sessions[0].load_count == sessions[0].save_count == 1
+    assert summary["loads"] == summary["saves"] == 1
+    assert summary["rows"] > 0
+    assert "源工作簿加载1次，输出工作簿保存1次" in log.getvalue()
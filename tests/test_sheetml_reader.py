@@ -0,0 +1,71 @@
+"""
+SheetML快速读取器与openpyxl逐个单元格的结果一致
+"""
+import datetime
+
+import openpyxl
+import pytest
+
+import bench
+from sheetml_reader import SheetMLWorkbook
+
+
+def _values(ws) -> list:
+    return [list(row) for row in ws.iter_rows(values_only=True)]
+
+
+@pytest.fixture(scope="module")
+def mixed_workbook(tmp_path_factory) -> str:
+    """
+    含有各种类型单元格、空行、空列、合并单元格及公式的工作簿
+    """
+    path = str(tmp_path_factory.mktemp("mixed") / "mixed.xlsx")
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "成绩"
+    ws.append(["标题"])
+    ws.merge_cells("A1:F1")
+    ws.append(["考号", "姓名", "物理", "日期", "及格", "备注"])
+    ws.append([20240000001, "张三", 95.5, datetime.datetime(2024, 6, 30, 8, 30), True, "  前后空白  "])
+    ws.append([20240000002, "李四", "88", datetime.date(2024, 7, 1), False, None])
+    ws.append([])
+    ws.append([None, "王五", -3, None, None, "=C3+C4"])
+    ws["H8"] = "远处"
+    wb.create_sheet("空表")
+    wb.save(path)
+    return path
+
+
+@pytest.mark.parametrize("read_only", [False, True])
+def test_mixed_cells_match_openpyxl(mixed_workbook, read_only):
+    expected = openpyxl.load_workbook(mixed_workbook, read_only=read_only)
+    fast = SheetMLWorkbook(mixed_workbook, read_only=read_only)
+
+    assert fast.sheetnames == expected.sheetnames
+    for name in expected.sheetnames:
+        assert _values(fast[name]) == _values(expected[name])
+        assert (fast[name].max_row, fast[name].max_column) == (expected[name].max_row, expected[name].max_column)
+    expected.close()
+    fast.close()
+
+
+def test_random_access_and_merged_cells(mixed_workbook):
+    expected = openpyxl.load_workbook(mixed_workbook)["成绩"]
+    fast = SheetMLWorkbook(mixed_workbook)["成绩"]
+
+    assert [cell.coord for cell in fast.merged_cells.ranges] == [cell.coord for cell in expected.merged_cells.ranges]
+    for row in range(1, expected.max_row + 2):
+        for column in range(1, expected.max_column + 2):
+            assert fast.cell(row=row, column=column).value == expected.cell(row=row, column=column).value
+    assert fast["B3"].value == expected["B3"].value
+
+
+@pytest.mark.parametrize("read_only", [False, True])
+@pytest.mark.parametrize("variant", bench.VARIANTS)
+def test_gradebooks_match_openpyxl(gradebooks, variant, read_only):
+    expected = openpyxl.load_workbook(gradebooks[variant], read_only=read_only)
+    fast = SheetMLWorkbook(gradebooks[variant], read_only=read_only)
+
+    assert _values(fast[bench.SHEET]) == _values(expected[bench.SHEET])
+    expected.close()
+    fast.close()
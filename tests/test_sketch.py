@@ -0,0 +1,72 @@
+"""
+流式统计摘要：分成几部分分别统计再合并，与整体统计的精确统计量相同，分位数在误差范围内
+"""
+import random
+
+import pytest
+
+from extract_sketch import SketchSet, merge_sketch_files
+
+FIELDS = ["学校", "班级"]
+EXACT = ("count", "mean", "std", "min", "max", "pass_rate", "excellent_rate", "distribution")
+
+
+def _rows(count: int, seed: int = 7) -> list:
+    rnd = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        score = rnd.choice(["缺考", None]) if rnd.random() < 0.02 else rnd.randint(0, 150)
+        rows.append([f"{rnd.randint(1, 4)}中", f"{rnd.randint(1, 6)}班", score, str(rnd.randint(0, 100))])
+    return rows
+
+
+def _sketches(rows: list) -> SketchSet:
+    sketches = SketchSet(FIELDS, k=200, bin_width=10, pass_lines={"数学": 90, "物理": 60},
+                         excellent_lines={"数学": 127.5, "物理": 85})
+    sketches.update(rows, [0, 1], {"数学": 2, "物理": 3})
+    return sketches
+
+
+def _records(sketches: SketchSet) -> dict:
+    return {(record["level"], record["group"], record["subject"]): record for record in sketches.statistics().records}
+
+
+def test_merge_matches_single_pass(tmp_path):
+    rows = _rows(6000)
+    whole = _records(_sketches(rows))
+
+    parts = []
+    for number, part in enumerate((rows[:1000], rows[1000:4500], rows[4500:])):
+        path = str(tmp_path / f"{number}.sketch.json")
+        _sketches(part).save(path)
+        parts.append(path)
+    merged = _records(merge_sketch_files(parts))
+
+    assert merged.keys() == whole.keys()
+    for key, record in whole.items():
+        for metric in EXACT:
+            assert merged[key][metric] == pytest.approx(record[metric]), (key, metric)
+
+
+def test_quantiles_within_rank_error():
+    rows = _rows(20000, seed=11)
+    records = _records(_sketches(rows))
+    scores = sorted(row[2] for row in rows if isinstance(row[2], int))
+    record = records[("全部", (), "数学")]
+    for name, fraction in (("p10", 0.1), ("median", 0.5), ("p90", 0.9)):
+        low = scores[int(len(scores) * max(fraction - 0.02, 0))]
+        high = scores[min(int(len(scores) * (fraction + 0.02)), len(scores) - 1)]
+        assert low <= record[name] <= high
+
+
+def test_merge_rejects_different_fields():
+    other = SketchSet(["学校"])
+    with pytest.raises(ValueError):
+        _sketches(_rows(10)).merge(other)
+
+
+def test_load_rejects_bad_file(tmp_path):
+    path = tmp_path / "bad.json"
+    path.write_text("{}", encoding="utf-8")
+    with pytest.raises(ValueError):
+        SketchSet.load(str(path))
@@ -0,0 +1,37 @@
+"""
+启动时间：--help及缺少参数时不导入提取流程，并在预算之内完成（与benchmarks/startup.py相同的检查）
+"""
+import subprocess, sys
+
+import pytest
+
+import startup
+
+# 导入提取流程本身时也不应导入的模块：只在用到相应功能时才导入
+OPTIONAL_MODULES = ("sqlite3", "extract_batch", "extract_cache", "extract_warehouse", "extract_sketch",
+                    "extract_watch", "extract_join", "extract_service", "openpyxl")
+
+
+@pytest.mark.parametrize("name", list(startup.CASES))
+def test_front_end_does_not_import_heavy_modules(name):
+    heavy = set(startup.HEAVY_MODULES) & startup.imported_modules(startup.CASES[name])
+    assert not heavy
+
+
+@pytest.mark.parametrize("name", list(startup.CASES))
+def test_front_end_within_budget(name):
+    baseline = startup.best_time([sys.executable, "-c", "pass"], 5)
+    elapsed = startup.best_time([sys.executable, startup.TOOL, *startup.CASES[name]], 5) - baseline
+    assert elapsed * 1000 <= startup.DEFAULT_BUDGET
+
+
+def test_help_exits_cleanly():
+    result = subprocess.run([sys.executable, startup.TOOL, "--help"], capture_output=True, text=True, cwd=startup.ROOT)
+    assert result.returncode == 0
+    assert "--highlight-mode" in result.stdout
+
+
+def test_pipeline_imports_optional_modules_lazily():
+    code = "import sys, extract_pipeline; print(' '.join(sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=startup.ROOT, check=True)
+    assert not set(OPTIONAL_MODULES) & set(result.stdout.split())
@@ -0,0 +1,105 @@
+"""
+分组统计：NumPy与纯Python两种计算都与逐组的简单计算相同，包括空白及缺失（未填写）的分组键和没有成绩的组；
+流式摘要在小分组中的分位数与按名次直接取值相同
+"""
+import math, statistics
+
+import pytest
+
+from extract_options import DEFAULT_QUANTILES
+from extract_sketch import SketchSet
+from extract_stats import MISSING_KEY, compute_statistics
+
+SCHOOLS = ["一中", "一中 ", None, "", "二中", "  ", "一中", "二中", "三中", None, "一中", "二中"]
+CLASSES = [1, 1, 2, None, 1, 2, 2, 1, 1, 2, 1, 2]
+PHYSICS = [90, 85.5, "缺考", 60, 0, None, 72, 100, "缺考", 45, 59.5, 88]
+CHEMISTRY = [80, 0, 70, 65, 90, 30, None, 95, "缺考", 50, 77, 0]
+LEVELS = [[], ["学校"], ["学校", "班级"]]
+PASS_LINES = {"物理": 60, "化学": 60}
+EXCELLENT_LINES = {"物理": 85}
+
+
+def _key(value) -> str:
+    return MISSING_KEY if value is None or not str(value).strip() else str(value).strip()
+
+
+def _reference(skip_zero: bool) -> list:
+    """
+    逐组收集分数后直接计算，与compute_statistics的记录顺序相同
+    """
+    columns = {"学校": SCHOOLS, "班级": CLASSES}
+    records = []
+    for level in LEVELS:
+        groups = {}
+        for row in range(len(SCHOOLS)):
+            group = groups.setdefault(tuple(_key(columns[field][row]) for field in level), {"物理": [], "化学": []})
+            for subject, column in (("物理", PHYSICS), ("化学", CHEMISTRY)):
+                value = column[row]
+                if type(value) in (int, float) and not (skip_zero and value == 0):
+                    group[subject].append(value)
+        for group in sorted(groups):
+            for subject, scores in groups[group].items():
+                record = {"level": "、".join(level) or "全部", "group": group, "subject": subject, "count": len(scores)}
+                if scores:
+                    record.update(mean=statistics.fmean(scores), median=statistics.median(scores), max=max(scores),
+                                  min=min(scores), std=statistics.pstdev(scores),
+                                  pass_rate=sum(score >= PASS_LINES[subject] for score in scores) / len(scores),
+                                  excellent_rate=(sum(score >= EXCELLENT_LINES[subject] for score in scores) / len(scores)
+                                                  if subject in EXCELLENT_LINES else None))
+                else:
+                    record.update(dict.fromkeys(("mean", "median", "max", "min", "std", "pass_rate", "excellent_rate")))
+                records.append(record)
+    return records
+
+
+@pytest.mark.parametrize("skip_zero", [False, True])
+@pytest.mark.parametrize("numpy", [True, False])
+def test_matches_per_group_reference(numpy, skip_zero, request):
+    if not numpy:
+        request.getfixturevalue("no_numpy")
+    stats = compute_statistics({"学校": SCHOOLS, "班级": CLASSES}, {"物理": PHYSICS, "化学": CHEMISTRY}, LEVELS,
+                               pass_lines=PASS_LINES, excellent_lines=EXCELLENT_LINES, skip_zero=skip_zero)
+    expected = _reference(skip_zero)
+
+    assert [(record["level"], record["group"], record["subject"]) for record in stats.records] == \
+        [(record["level"], record["group"], record["subject"]) for record in expected]
+    assert (MISSING_KEY,) in {record["group"] for record in stats.records}
+    for record, reference in zip(stats.records, expected):
+        for metric, value in reference.items():
+            assert record[metric] == (value if value is None or isinstance(value, (str, tuple)) else pytest.approx(value)), \
+                (record["group"], record["subject"], metric)
+
+
+def test_numpy_and_python_agree(request):
+    args = ({"学校": SCHOOLS, "班级": CLASSES}, {"物理": PHYSICS, "化学": CHEMISTRY}, LEVELS)
+    with_numpy = compute_statistics(*args, pass_lines=PASS_LINES).records
+    request.getfixturevalue("no_numpy")
+    without_numpy = compute_statistics(*args, pass_lines=PASS_LINES).records
+    assert len(without_numpy) == len(with_numpy)
+    for record, expected in zip(without_numpy, with_numpy):
+        # 标准差的求和顺序不同，只在最后一位上可能有差别
+        assert record == dict(expected, std=pytest.approx(expected["std"]) if expected["std"] is not None else None)
+
+
+def test_empty_columns():
+    stats = compute_statistics({"学校": []}, {"物理": []}, LEVELS[:2])
+    assert [record["count"] for record in stats.records] == [0]
+
+
+def test_sketch_quantiles_in_small_groups():
+    sketches = SketchSet(["学校"], pass_lines=PASS_LINES)
+    sketches.update(zip(SCHOOLS, PHYSICS), [0], {"物理": 1})
+    records = {(record["level"], record["group"]): record for record in sketches.statistics().records}
+
+    for (level, group), record in records.items():
+        scores = sorted(score for school, score in zip(SCHOOLS, PHYSICS)
+                        if type(score) in (int, float) and (not group or _key(school) == group[0]))
+        assert record["count"] == len(scores)
+        assert record["mean"] == pytest.approx(statistics.fmean(scores))
+        assert record["std"] == pytest.approx(statistics.pstdev(scores))
+        assert record["pass_rate"] == pytest.approx(sum(score >= 60 for score in scores) / len(scores))
+        for quantile in DEFAULT_QUANTILES:
+            # 小分组没有压缩，分位数是按名次直接取出的值
+            name = "median" if quantile == 50 else f"p{quantile}"
+            assert record[name] == scores[max(math.ceil(quantile / 100 * len(scores)), 1) - 1], (group, name)
+    assert ("学校", (MISSING_KEY,)) in records
@@ -0,0 +1,83 @@
+"""
+列类型推断：编号列、前导0、抽样之后出现的小数、混有“缺考”的成绩列及--column-type，安装与未安装NumPy时结果相同
+"""
+import pytest
+
+from extract_types import ColumnTypes, parse_column_types, sample_column_types
+
+HEADERS = ["考号", "序列", "姓名", "物理", "化学"]
+ROWS = [["2023001", "007", "甲", "80", "85.5"],
+        ["2023002", "012", "乙", "缺考", "90"],
+        ["2023003", "020", "丙", "92", "缺考"]]
+
+
+@pytest.fixture(params=["numpy", "python"])
+def backend(request):
+    if request.param == "python":
+        request.getfixturevalue("no_numpy")
+    return request.param
+
+
+def _convert(types: ColumnTypes, rows: list) -> list:
+    columns = [[row[index] for row in rows] for index in range(len(types.kinds))]
+    return [types.convert_column(index, column) for index, column in enumerate(columns)]
+
+
+def _typed(column: list) -> list:
+    return [(type(value).__name__, value) for value in column]
+
+
+def test_id_header_and_leading_zeros(backend):
+    types, rows = sample_column_types(HEADERS, ROWS)
+    assert types.kinds == [ColumnTypes.ID, ColumnTypes.ID, ColumnTypes.TEXT, ColumnTypes.INT, ColumnTypes.FLOAT]
+    assert types.sources == ["header", "sample", "sample", "sample", "sample"]
+    columns = _convert(types, rows)
+    assert columns[0] == ["2023001", "2023002", "2023003"]
+    assert columns[1] == ["007", "012", "020"]
+
+
+def test_missing_exam_stays_text(backend):
+    types, rows = sample_column_types(HEADERS, ROWS)
+    columns = _convert(types, rows)
+    assert _typed(columns[3]) == [("int", 80), ("str", "缺考"), ("int", 92)]
+    assert _typed(columns[4]) == [("float", 85.5), ("float", 90.0), ("str", "缺考")]
+    assert types.converted[3:] == [2, 2]
+    assert types.kept[3:] == [1, 1]
+
+
+def test_floats_after_sample_in_int_column(backend, monkeypatch):
+    monkeypatch.setattr(ColumnTypes, "SAMPLE_SIZE", 2)
+    rows = iter([["80"], ["90"], ["85.5"], ["缺考"]])
+    types, rows = sample_column_types(["物理"], rows)
+    assert types.kinds == [ColumnTypes.INT]
+    column = _convert(types, list(rows))[0]
+    assert _typed(column) == [("int", 80), ("int", 90), ("float", 85.5), ("str", "缺考")]
+
+
+def test_long_digit_strings_are_ids():
+    types = ColumnTypes.infer(["电话号"], [["13800138000", "13900139000"]])
+    assert types.kinds == [ColumnTypes.ID]
+
+
+def test_column_type_override(backend):
+    types, rows = sample_column_types(HEADERS, ROWS, ["考号=int", "E=text", "b=float"])
+    assert types.kinds == [ColumnTypes.INT, ColumnTypes.FLOAT, ColumnTypes.TEXT, ColumnTypes.INT, ColumnTypes.TEXT]
+    assert types.sources[:2] == ["override", "override"] and types.sources[4] == "override"
+    columns = _convert(types, rows)
+    assert _typed(columns[0]) == [("int", 2023001), ("int", 2023002), ("int", 2023003)]
+    assert columns[1] == [7.0, 12.0, 20.0]
+    assert columns[4] == ["85.5", "90", "缺考"]
+
+
+def test_numpy_and_python_agree(request):
+    types, rows = sample_column_types(HEADERS, ROWS)
+    expected = [_typed(column) for column in _convert(types, rows)]
+    request.getfixturevalue("no_numpy")
+    types, rows = sample_column_types(HEADERS, ROWS)
+    assert [_typed(column) for column in _convert(types, rows)] == expected
+
+
+@pytest.mark.parametrize("item", ["考号", "考号=date", "=int"])
+def test_bad_column_type(item):
+    with pytest.raises(ValueError):
+        parse_column_types([item])
@@ -0,0 +1,82 @@
+"""
+成绩库：导入后读回相同的行，--history按考试日期取最近几次，重新导入不改变顺序
+"""
+import sqlite3
+
+import pytest
+
+from extract_warehouse import Warehouse, exam_date
+
+HEADERS = {"A": "考号", "B": "姓名", "C": "学校", "D": "班级", "E": "物理"}
+LAYOUT = {"title": "物理成绩", "sub_title_dict": HEADERS, "heading_three": []}
+
+
+def _rows(offset: int) -> list:
+    return [[f"{number:04d}", f"学生{number}", "一中" if number % 2 else "二中", number % 3 + 1, number + offset]
+            for number in range(6)]
+
+
+def _ingest(warehouse: Warehouse, exam: str, date: str = None, offset: int = 0) -> int:
+    return warehouse.ingest(exam, "物理", "Sheet1", "不存在.xlsx", "物理成绩", LAYOUT, _rows(offset), date)
+
+
+@pytest.fixture
+def warehouse(tmp_path):
+    with Warehouse(str(tmp_path / "scores.sqlite")) as warehouse:
+        yield warehouse
+
+
+def test_ingest_and_load(warehouse):
+    assert _ingest(warehouse, "期中", "2024-04-20") == 6
+    info, layout, rows = warehouse.load("期中", "物理")
+    assert info.exam_date == "2024-04-20" and info.row_count == 6
+    assert layout["sub_title_dict"] == HEADERS
+    assert rows == _rows(0)
+
+
+def test_history_orders_by_exam_date(warehouse):
+    # 较早的考试后导入
+    _ingest(warehouse, "期末", "2024-06-20", offset=20)
+    _ingest(warehouse, "月考", "2024-03-15", offset=0)
+    _ingest(warehouse, "期中", "2024-04-20", offset=10)
+    assert [info.exam for info in warehouse.exams("物理")] == ["月考", "期中", "期末"]
+
+    headers, rows, exams = warehouse.history("物理", "物理", 2)
+    assert headers == ["考号", "姓名", "学校", "班级", "期中", "期末"]
+    assert rows[0][4:] == [10, 20]
+
+
+def test_reingest_keeps_date(warehouse):
+    _ingest(warehouse, "月考", "2024-03-15")
+    _ingest(warehouse, "期中", "2024-04-20")
+    _ingest(warehouse, "月考", offset=5)
+    assert [info.exam for info in warehouse.exams("物理")] == ["月考", "期中"]
+    assert warehouse.history("物理", "物理", 1)[2][0].exam == "期中"
+    assert warehouse.load("月考", "物理")[2] == _rows(5)
+
+
+def test_history_filters_school(warehouse):
+    _ingest(warehouse, "期中", "2024-04-20")
+    headers, rows, exams = warehouse.history("物理", "物理", 3, school="一中")
+    assert {row[2] for row in rows} == {"一中"} and len(rows) == 3
+
+
+def test_old_database_gets_exam_date(tmp_path):
+    path = str(tmp_path / "old.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE exams (id INTEGER PRIMARY KEY, exam TEXT NOT NULL, subject TEXT NOT NULL, "
+                       "sheet TEXT NOT NULL, source TEXT, title TEXT, headers TEXT NOT NULL, heading_three TEXT NOT NULL, "
+                       "layout TEXT NOT NULL, row_count INTEGER NOT NULL DEFAULT 0, ingested_at REAL NOT NULL, "
+                       "UNIQUE (exam, subject, sheet))")
+    connection.execute("INSERT INTO exams (exam, subject, sheet, headers, heading_three, layout, ingested_at) "
+                       "VALUES ('期中', '物理', 'Sheet1', '[]', '[]', '{}', 1718841600)")
+    connection.commit()
+    connection.close()
+    with Warehouse(path) as warehouse:
+        assert warehouse.exams("物理")[0].exam_date.startswith("2024-06-")
+
+
+def test_exam_date_format():
+    assert exam_date("2024-06-20") == "2024-06-20"
+    with pytest.raises(ValueError):
+        exam_date("6月20日")
@@ -0,0 +1,35 @@
+"""
+监视模式：写入完成的判断，以及按行哈希判断整个输出是否需要重新写出
+"""
+import os, subprocess, sys
+
+from extract_watch import FolderWatcher, compare_rows, row_hashes
+
+
+def test_poll_waits_for_settle(tmp_path):
+    path = tmp_path / "物理成绩.xlsx"
+    path.write_bytes(b"x")
+    (tmp_path / "~$物理成绩.xlsx").write_bytes(b"x")
+    watcher = FolderWatcher(str(tmp_path), "物理", settle=2.0)
+    mtime = os.stat(path).st_mtime
+    assert watcher.poll(now=mtime + 1) == []
+    assert watcher.poll(now=mtime + 3) == [str(path)]
+    watcher.mark_processed(str(path))
+    assert watcher.poll(now=mtime + 4) == []
+
+
+def test_compare_rows():
+    rows = [["一中", 3, 80], ["二中", 5, 90]]
+    assert compare_rows(None, row_hashes(rows)).added == 2
+    assert compare_rows(row_hashes(rows), row_hashes([list(row) for row in rows])).unchanged
+    changes = compare_rows(row_hashes(rows), row_hashes([rows[0], ["二中", 5, 95], ["三中", 1, 70]]))
+    assert (changes.added, changes.removed, changes.unchanged) == (2, 1, False)
+
+
+def test_row_hashes_stable_across_processes():
+    rows = [["一中", "张三", 3, 80.5, None]]
+    code = "import sys; sys.path.insert(0, '.'); from extract_watch import row_hashes; print(row_hashes(%r)[0].hex())" % rows
+    outputs = {subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              env={**os.environ, "PYTHONHASHSEED": seed}).stdout.strip() for seed in ("1", "2")}
+    assert outputs == {row_hashes(rows)[0].hex()}
@@ -0,0 +1,70 @@
+"""
+--where表达式的解析、求值，以及在学校、班级索引上求值的结果与逐行求值一致
+"""
+import pytest
+
+from extract_where import BoolOp, Condition, WhereFilter, parse_where
+
+HEADERS = ["考号", "姓名", "学校名称", "班级", "物理", "备注"]
+ROWS = [
+    ["1", "甲", "第一中学", "3班", 90, None],
+    ["2", "乙", "第一中学", "5班", "缺考", "转入"],
+    ["3", "丙", "第二中学", "3班", 59.5, ""],
+    ["4", "丁", "第二中学", "7班", "60", "  "],
+    ["5", "戊", "第三中学", None, 100, "转出"],
+]
+
+
+def _names(expression: str) -> list:
+    where = WhereFilter(expression, HEADERS)
+    return [row[1] for row in ROWS if where(row)]
+
+
+def test_precedence():
+    tree = parse_where("a = 1 or b = 2 and not c = 3")
+    assert isinstance(tree, BoolOp) and tree.op == "or"
+    assert tree.items[0] == Condition("a", "=", tree.items[0].values)
+    assert tree.items[1].op == "and" and tree.items[1].items[1].op == "not"
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("物理 >= 60", ["甲", "丁", "戊"]),
+    ("物理 < 60", ["丙"]),
+    ("物理 != 90", ["丙", "丁", "戊"]),
+    ("学校 contains 一中", ["甲", "乙"]),
+    ("班级 in (3, 7)", ["甲", "丙", "丁"]),
+    ("班级 not in (3, 7)", ["乙", "戊"]),
+    ("备注 is empty", ["甲", "丙", "丁"]),
+    ("备注 is not empty", ["乙", "戊"]),
+    ("备注 = \"转入\" or (学校 contains 二中 and not 物理 > 59.5)", ["乙", "丙"]),
+    ("`物理` = 100", ["戊"]),
+])
+def test_conditions(expression, expected):
+    assert _names(expression) == expected
+
+
+@pytest.mark.parametrize("expression", ["物理 >=", "物理 > 60 and", "(物理 > 60", "物理 like 6", "班级 in 3", "物理 > 60)"])
+def test_syntax_errors(expression):
+    with pytest.raises(ValueError):
+        parse_where(expression)
+
+
+def test_unknown_column():
+    with pytest.raises(ValueError, match="表头中没有"):
+        WhereFilter("数学 > 60", HEADERS)
+
+
+@pytest.mark.parametrize("expression", ["学校 contains 一中 and 物理 >= 60", "班级 in (3) and 学校 contains 二中", "物理 > 0"])
+def test_select_with_indexes_matches_filter(expression):
+    where = WhereFilter(expression, HEADERS)
+    indexes = {}
+    for position in (2, 3):
+        index = indexes[position] = {}
+        for row, values in enumerate(ROWS):
+            index.setdefault(values[position], set()).add(row)
+
+    expected = [row for row, values in enumerate(ROWS) if where(values)]
+    assert where.select(ROWS) == expected
+    assert where.select(ROWS, indexes=indexes) == expected
+    assert where.select(ROWS, [0, 2, 3], indexes) == [row for row in expected if row in (0, 2, 3)]
+    assert list(where.filter(ROWS)) == [ROWS[row] for row in expected]